@@ -1,11 +1,27 @@
 import streamlit as st
 import pandas as pd
-import gspread
-import re
-import io
-from oauth2client.service_account import ServiceAccountCredentials
+import os
 from datetime import datetime
 import streamlit.components.v1 as components  # ★ JS埋め込み用
+from mirror import SheetMirror
+from search import DatasetCache, ResultQuery
+from normalize import TypedCache
+from indexes import ProductIndexCache
+from tolerance import TOLERANCE_COLUMNS, TOLERANCES, DeviationCache
+from sheets import SheetsClient
+from storage import GoogleSheetsStorage, SQLiteStorage
+from catalog import ideal_order_dict
+from exports import FORMATS, export
+from maintenance import reinit_headers
+from archive import ArchiveCheckpoint, ArchiveScheduler
+from partitions import ARCHIVE, CATALOG, CATALOG_COLUMNS, ArchiveCatalog
+from datetime import timedelta
+import uuid
+import metrics
+from metrics import MetricsLog, SessionStats, stage
+from journal import SAVE_ID, SaveJournal, SaveWorker
+from imports import (PRODUCT_KEYS, STANDARD_KEYS, check_measurements, diff_by_key, key_index, read_upload,
+                     replace_by_key, replaced_keys, save_diff, template_items, text_frame)
 
 # ページ設定は最初に！
 st.set_page_config(page_title="採寸データ管理", layout="wide")
@@ -31,60 +47,164 @@ if not st.session_state.authenticated:
             st.error("❌ ユーザー名またはパスワードが間違っています")
     st.stop()
 
-# ━━━━━ Google Sheets認証 ━━━━━
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-json_key = st.secrets["GOOGLE_CREDENTIALS"]
-creds = ServiceAccountCredentials.from_json_keyfile_dict(json_key, scope)
-client = gspread.authorize(creds)
-spreadsheet = client.open("採寸管理データ")
-
-# ━━━━━ キャッシュ付き読み込み関数 ━━━━━
-@st.cache_data(ttl=30, show_spinner=False)
-def load_master_data():
-    return pd.DataFrame(spreadsheet.worksheet("商品マスタ").get_all_records())
-
-@st.cache_data(ttl=30, show_spinner=False)
-def load_template_data():
-    return pd.DataFrame(spreadsheet.worksheet("採寸テンプレート").get_all_records())
-
-@st.cache_data(ttl=30, show_spinner=False)
-def load_result_data():
-    return pd.DataFrame(spreadsheet.worksheet("採寸結果").get_all_records())
-
-@st.cache_data(ttl=30, show_spinner=False)
-def load_archive_data():
-    return pd.DataFrame(spreadsheet.worksheet("採寸アーカイブ").get_all_records())
-
-@st.cache_data(ttl=30, show_spinner=False)
-def load_standard_data():
-    return pd.DataFrame(spreadsheet.worksheet("基準データ").get_all_records())
-
-# ━━━━━ 項目の表示順辞書 ━━━━━
-ideal_order_dict = {
-    "ジャケット": ["肩幅", "胸幅", "胴囲", "袖丈", "着丈"],
-    "パンツ": ["ウエスト", "股上", "股下", "ワタリ", "裾幅"],
-    "ダウン": ["肩幅", "胸幅", "袖丈", "着丈", "襟高"],
-    "ブルゾン": ["肩幅", "胸幅", "袖丈", "着丈", "襟高"],
-    "コート": ["肩幅", "胸幅", "胴囲", "袖丈", "着丈", "襟高"],
-    "ニット": ["肩幅", "胸幅", "袖丈", "着丈", "首高"],
-    "カットソー": ["肩幅", "胸幅", "袖丈", "着丈"],
-    "レザー": ["肩幅", "胸幅", "袖丈", "着丈", "襟高"],
-    "靴": ["全長", "最大幅"],
-    "巻物": ["全長", "横幅"],
-    "小物・その他": ["頭周り", "ツバ", "高さ", "横幅", "高さ", "マチ"],
-    "シャツ": ["肩幅", "裄丈", "胸幅", "胴囲", "袖丈", "着丈"],
-    "シャツジャケット": ["肩幅", "胸幅", "袖丈", "着丈"],
-    "スーツ": ["肩幅", "胸幅", "胴囲", "袖丈", "着丈", "ウエスト", "股上", "股下", "ワタリ", "裾幅"],
-    "ベルト": ["全長", "ベルト幅"],
-    "半袖": ["肩幅", "胸幅", "袖丈", "前丈", "後丈"],
-    "ラグラン": ["裄丈", "胸幅", "着丈"]
-}
+# ━━━━━ 保存先（ストレージ）の選択 ━━━━━
+# STORAGE_BACKEND = "sheets"（既定）: Googleスプレッドシート。認証・クライアントはプロセス内で1回だけ作り全セッションで共有、
+#   読み込みはディスク上のミラーから即座に返し、追加行だけを裏で差分同期する（複数シートは1回のbatchGetで）
+# STORAGE_BACKEND = "sqlite": ローカルのSQLite（SQLITE_PATH）。Googleに接続せずに動かす・計測する場合に使う
+MIRROR_PATH = "sheet_mirror.sqlite3"
+ENTRY_SHEETS = ["商品マスタ", "採寸テンプレート", "採寸結果", "基準データ", CATALOG]
+PAGE_SIZES = [50, 100, 500]  # 採寸検索の 1 ページの行数
+
+@st.cache_resource(show_spinner=False)
+def get_storage():
+    if st.secrets.get("STORAGE_BACKEND", "sheets") == "sqlite":
+        return SQLiteStorage(st.secrets.get("SQLITE_PATH", "measuring.sqlite3"))
+    sheets = SheetsClient.from_service_account(st.secrets["GOOGLE_CREDENTIALS"], "採寸管理データ")
+    return GoogleSheetsStorage(sheets, SheetMirror(MIRROR_PATH))
+
+store = get_storage()
+
+# 採寸結果 → 採寸アーカイブ の移動（プロセスに1つのスケジューラが裏で定期実行。チェックポイントから再開可能）
+ARCHIVE_STATE_PATH = "archive_jobs.sqlite3"
+
+@st.cache_resource(show_spinner=False)
+def get_archive_scheduler():
+    interval = float(st.secrets.get("ARCHIVE_INTERVAL_HOURS", 24)) * 3600
+    return ArchiveScheduler(store, ArchiveCheckpoint(ARCHIVE_STATE_PATH), days=30, interval=interval).start()
+
+archive_scheduler = get_archive_scheduler()
+
+# 採寸入力の保存はローカルの保存ジャーナルに書いてすぐ戻り、裏のスレッドがまとめてスプレッドシートへ送る
+SAVE_JOURNAL_PATH = st.secrets.get("SAVE_JOURNAL_PATH", "save_journal.sqlite3")
+
+@st.cache_resource(show_spinner=False)
+def get_save_worker():
+    return SaveWorker(store, SaveJournal(SAVE_JOURNAL_PATH)).start()
+
+save_worker = get_save_worker()
+save_journal = save_worker.journal
+
+# 採寸アーカイブは月別シート。目録（アーカイブ目録）の日付・管理番号の範囲で必要なシートだけ読む
+catalog = ArchiveCatalog(store)
+
+# 採寸結果＋選んだ月の採寸アーカイブの結合データ／表示用の型付きの表（プロセスで 1 つを全セッションで共有）。
+# シートのバージョンが変わった時、保存などで行が追加されただけなら追加分だけ継ぎ足し、それ以外は作り直す
+@st.cache_resource
+def get_dataset_cache():
+    return DatasetCache(store, catalog)
+
+@st.cache_resource
+def get_typed_cache():
+    return TypedCache(store)
+
+# 採寸入力の選択肢（ブランド → 管理番号、管理番号 → サイズ、ジャンル → 採寸項目）
+@st.cache_resource
+def get_product_index_cache():
+    return ProductIndexCache(get_typed_cache())
+
+# 基準値との差（許容差チェック）の結果。シートへの追加だけなら追加された行だけ計算する
+@st.cache_resource
+def get_deviation_cache():
+    return DeviationCache(store)
+
+def load_measurement_dataset(archive_titles):
+    titles = ["採寸結果"] + list(archive_titles)
+    store.read_many(titles)  # 古ければ裏で差分同期
+    return get_dataset_cache().get(titles)
+
+def read_typed(titles):
+    store.read_many(titles)  # 古ければ裏で差分同期
+    return {t: get_typed_cache().get(t) for t in titles}
+
+def period_filter(all_label):
+    """
+    期間（既定は直近 1 年、チェックで全期間）と管理番号の前方一致の入力。
+    (date_from, date_to, pid_prefix, keep_undated) を返す。期間を指定していなければ日付が空・読めない行も残す
+    """
+    today = datetime.now().date()
+    default_period = (today - timedelta(days=365), today)
+    all_period = st.checkbox(f"📅 {all_label}（アーカイブ全体を読み込むため時間がかかります）")
+    period = () if all_period else st.date_input("📅 期間", value=default_period)
+    date_from = period[0].strftime("%Y-%m-%d") if len(period) >= 1 else None
+    date_to = period[1].strftime("%Y-%m-%d") if len(period) >= 2 else None
+    pid_prefix = st.text_input("🔢 管理番号（前方一致）").strip()
+    return date_from, date_to, pid_prefix, tuple(period) in ((), default_period)
+
+def export_download(session_key, key, count, make_frame, label, file_stem):
+    """
+    出力形式の選択と出力ファイルの作成・ダウンロード。ファイルは押したときだけ make_frame() から作り、
+    key（データのバージョンと絞り込み）と形式が同じなら使い回す（古くなって消えていたら作り直す）
+    """
+    fmt = st.radio("📁 出力形式", list(FORMATS), format_func=lambda k: FORMATS[k].label, horizontal=True)
+    key = (key, fmt)
+    made = st.session_state.get(session_key)
+    if made and not os.path.exists(made["path"]):
+        made = st.session_state[session_key] = None
+    if made and made["key"] != key:
+        if os.path.exists(made["path"]):
+            os.remove(made["path"])
+        made = st.session_state[session_key] = None
+    if made is None and st.button(f"📦 {FORMATS[fmt].label}ファイルを作成（{count} 件）"):
+        with stage("出力"):
+            made = st.session_state[session_key] = {"key": key, "path": export(make_frame(), fmt)}
+    if made:
+        with open(made["path"], "rb") as f:
+            st.download_button(
+                label=f"📥 {label}を{FORMATS[fmt].label}でダウンロード",
+                data=f,
+                file_name=f"{file_stem}{FORMATS[fmt].extension}",
+                mime=FORMATS[fmt].mime
+            )
 
 # ━━━━━ サイドバーでページ切り替え ━━━━━
 page = st.sidebar.selectbox("ページを選択", [
-    "採寸入力", "採寸検索", "商品インポート", "基準値インポート", "採寸ヘッダー初期化", "アーカイブ管理"
+    "採寸入力", "採寸一括取り込み", "採寸検索", "許容差チェック", "商品インポート", "基準値インポート", "採寸ヘッダー初期化", "アーカイブ管理"
 ])
 
+# ━━━━━ 計測（段階別の処理時間・API呼び出し回数／バイト数） ━━━━━
+# 再実行ごとに METRICS_LOG（JSONL）へ1行追記し、セッション内の集計をサイドバーの計測パネルに出す
+@st.cache_resource
+def get_metrics_log():
+    return MetricsLog(st.secrets.get("METRICS_LOG", "metrics.jsonl"))
+
+def close_rerun():
+    rerun = st.session_state.pop("metrics_rerun", None)
+    if rerun is None:
+        return
+    rerun.finish(rerun.last)  # st.stop()/st.rerun() で途中終了した再実行は最後の段階までで確定
+    get_metrics_log().write(rerun.record())
+    st.session_state.metrics_stats.add(rerun)
+    st.session_state.metrics_last = rerun
+
+if "metrics_session" not in st.session_state:
+    st.session_state.metrics_session = uuid.uuid4().hex[:12]
+    st.session_state.metrics_stats = SessionStats()
+close_rerun()
+st.session_state.metrics_rerun = metrics.start(
+    page, st.session_state.metrics_session, st.session_state.get("username", "")
+)
+
+if st.sidebar.checkbox("⏱ 計測パネル", key="show_metrics"):
+    last = st.session_state.get("metrics_last")
+    session_stats = st.session_state.metrics_stats
+    with st.sidebar.expander("直前の再実行", expanded=True):
+        if last is None:
+            st.caption("まだ記録がありません")
+        else:
+            st.caption(
+                f"{last.page}：{last.total:.2f} 秒 / API {last.api_calls} 回 / "
+                f"受信 {last.bytes_received / 1024:.0f} KB・送信 {last.bytes_sent / 1024:.0f} KB"
+            )
+            st.dataframe(
+                pd.DataFrame({"段階": list(last.stages), "秒": [round(v, 3) for v in last.stages.values()]}),
+                hide_index=True, use_container_width=True
+            )
+    with st.sidebar.expander(f"このセッションの集計（{session_stats.reruns} 回 / API {session_stats.api_calls} 回）"):
+        st.markdown("**ページ別**")
+        st.dataframe(pd.DataFrame(session_stats.rows(session_stats.pages)), hide_index=True, use_container_width=True)
+        st.markdown("**段階別**")
+        st.dataframe(pd.DataFrame(session_stats.rows(session_stats.stages)), hide_index=True, use_container_width=True)
+
 # ---------------------
 # 採寸入力ページ
 # ---------------------
@@ -92,56 +212,46 @@ if page == "採寸入力":
     st.title("📱 採寸入力")
 
     # 1) 必要データの読み込み
-    master_df   = load_master_data()
-    template_df = load_template_data()
-    result_df   = load_result_data()
-    archive_df  = load_archive_data()
-    combined_df = pd.concat([result_df, archive_df], ignore_index=True)
-
-    # 2) 選択UI
-    custom_orders = {
-        "パンツ": ["ウエスト", "股上", "ワタリ", "股下", "裾幅"],
-        "シャツ": ["肩幅", "胸幅", "胴囲", "裄丈", "袖丈", "着丈"]
-    }
-
-    brand_options = master_df["ブランド"].dropna().unique().tolist()
+    with stage("読み込み"):
+        read_typed(ENTRY_SHEETS)  # 5シートを1回の往復で
+        product_index = get_product_index_cache().get()
+
+    # 2) 選択UI（選択肢は商品マスタ・採寸テンプレートの版ごとに 1 回だけ作った索引を引く）
+    brand_options = product_index.brands
     if not brand_options:
         st.info("商品マスタにブランドがありません。先に商品をインポートしてください。")
         st.stop()
 
     selected_brand = st.selectbox("ブランドを選択", brand_options, key="brand_select")
 
-    filtered_df = master_df[master_df["ブランド"] == selected_brand]
-    if filtered_df.empty:
+    # 保存済み（送信待ち）のサイズは、商品マスタから消える前でも選べないようにする
+    queued = save_journal.pending_master_keys()
+
+    pid_options = product_index.pids(selected_brand, queued)  # 管理番号の数値昇順
+    if not pid_options:
         st.info("このブランドの商品がありません。")
         st.stop()
 
-    # 管理番号を数値昇順に並べる
-    pid_options = filtered_df["管理番号"].dropna().unique().tolist()
-    pid_options = sorted(
-        pid_options,
-        key=lambda x: int(re.search(r"\d+", str(x)).group()) if re.search(r"\d+", str(x)) else float("inf")
-    )
     selected_pid = st.selectbox("管理番号を選択", pid_options, key="pid_select")
+    model_prefix = str(selected_pid)[:8]
 
-    product_group = filtered_df[filtered_df["管理番号"] == selected_pid]
-    product_row = product_group.iloc[0]
+    # 過去の採寸は、同じモデル（管理番号の先頭8文字）を含みうる月のアーカイブだけ読む
+    with stage("読み込み"):
+        dataset     = load_measurement_dataset(catalog.select(pid_prefix=model_prefix))
+        combined_df = dataset.frame
+
+    product_row = product_index.product(selected_brand, selected_pid)
     genre  = product_row["ジャンル"]
-    sizes  = product_group["サイズ"].astype(str).tolist()
+    sizes  = product_index.sizes(selected_brand, selected_pid, queued)
 
     st.write(f"**商品名：** {product_row['商品名']}　　**カラー：** {product_row['カラー']}")
 
     # 3) 採寸項目の確定
-    template_row = template_df[template_df["ジャンル"] == genre]
-    if template_row.empty:
+    items = product_index.items(genre)
+    if not items:
         st.warning("テンプレートが見つかりません")
         st.stop()
 
-    raw_items   = template_row.iloc[0]["採寸項目"].replace("、", ",").split(",")
-    all_items   = [re.sub(r'（.*?）', '', i).strip() for i in raw_items if i.strip()]
-    custom_order = custom_orders.get(genre, [])
-    items = [i for i in custom_order if i in all_items] + [i for i in all_items if i not in custom_order]
-
     # ---- 保存後は空表で出す仕組み ----
     def make_blank_df(sizes, items):
         base = {item: [""] * len(sizes) for item in items}
@@ -151,34 +261,23 @@ if page == "採寸入力":
         return df_blank.astype(str)
 
     reset_after_save = st.session_state.pop("reset_editor", False)
+    save_message = st.session_state.pop("save_message", None)
+    if save_message:
+        st.success(save_message)
 
     # 既存値か空表かを決めて df を作成
-    if reset_after_save:
-        df = make_blank_df(sizes, items)
-    else:
-        data = {item: [] for item in items}
-        remarks = []
-        for size in sizes:
-            row = combined_df[(combined_df["商品管理番号"] == selected_pid) &
-                              (combined_df["サイズ"].astype(str) == str(size))]
-            for item in items:
-                val = row[item].values[0] if not row.empty and item in row.columns else ""
-                data[item].append(val)
-            note = row["備考"].values[0] if not row.empty and "備考" in row.columns else ""
-            remarks.append(note)
-        data["備考"] = remarks
-        df = pd.DataFrame(data, index=[str(s) for s in sizes])
-        df.index.name = "サイズ"
-        df = df.astype(str)
+    with stage("初期値"):
+        if reset_after_save:
+            df = make_blank_df(sizes, items)
+        else:
+            # (商品管理番号, サイズ) のハッシュ索引から最新の採寸値を取り出す
+            df = dataset.lookup.rows(selected_pid, sizes, items + ["備考"])
 
     # 4) 基準値の表示
     st.markdown("### 📐 該当商品の基準値")
     try:
-        standard_df = load_standard_data()
-        std_row = standard_df[
-            (standard_df["商品管理番号"] == selected_pid) &
-            (standard_df["サイズ"].astype(str).isin([str(s) for s in sizes]))
-        ]
+        with stage("基準値"):
+            std_row = store.find("基準データ", {"商品管理番号": selected_pid, "サイズ": [str(s) for s in sizes]})
         if std_row.empty:
             st.info("この商品には基準値データが登録されていません。")
         else:
@@ -191,15 +290,28 @@ if page == "採寸入力":
 
     # 5) 採寸エディタ（formなし・A案）
     st.markdown("### ✍ 採寸")
-    edited_df = st.data_editor(
-        df,
-        use_container_width=True,
-        num_rows="dynamic",
-        key="measured_editor"
-    )
+    with stage("エディタ描画"):
+        edited_df = st.data_editor(
+            df,
+            use_container_width=True,
+            num_rows="dynamic",
+            key="measured_editor"
+        )
 
     do_save = st.button("保存する", key="save_btn")
 
+    counts = save_journal.counts()
+    if counts["failed"]:
+        st.warning(f"⚠ 送信に失敗した保存が {counts['failed']} 件あります（自動で再送します）: {save_journal.last_error()}")
+        if st.button("🔁 今すぐ再送", key="retry_saves"):
+            save_journal.retry_now()
+            save_worker.trigger()
+    if counts["pending"]:
+        st.caption(f"⏳ スプレッドシートへの送信待ち: {counts['pending']} 件")
+    last_sent = save_journal.last_sent()
+    if last_sent:
+        st.caption(f"📡 直近の送信: {last_sent}")
+
     # Enterキーで「セル確定→保存」するJS（採寸入力ページ内に配置すること）
     components.html(
         """
@@ -250,9 +362,7 @@ if page == "採寸入力":
     # 6) 保存処理
     if do_save:
         try:
-            result_sheet = spreadsheet.worksheet("採寸結果")
-            headers = result_sheet.row_values(1)
-            saved_sizes = []
+            save_rows = []
 
             for size in edited_df.index:
                 size_str = str(size).strip()
@@ -276,27 +386,18 @@ if page == "採寸入力":
                 for item in items:
                     save_data[item] = edited_df.loc[size, item] if item in edited_df.columns else ""
 
-                new_row = ["" if save_data.get(h) is None else str(save_data.get(h)) for h in headers]
-                result_sheet.append_row(new_row)
-                saved_sizes.append(size_str)
-
-            # 商品マスタ更新
-            master_sheet = spreadsheet.worksheet("商品マスタ")
-            full_master_df = pd.DataFrame(master_sheet.get_all_records())
-            full_master_df["サイズ"] = full_master_df["サイズ"].astype(str)
-            updated_master_df = full_master_df[~(
-                (full_master_df["管理番号"] == selected_pid) &
-                (full_master_df["サイズ"].isin(saved_sizes))
-            )]
-            master_sheet.clear()
-            master_sheet.update([updated_master_df.columns.tolist()] + updated_master_df.fillna("").values.tolist())
-
-            # 保存後：キャッシュクリア＆エディタ初期化 → 空表に更新
-            load_result_data.clear()
-            load_master_data.clear()
+                save_rows.append(save_data)
+
+            # 保存ジャーナルに書いてすぐ戻る（採寸結果への追加＋商品マスタからの削除は裏でまとめて送る）
+            saved_sizes = [row["サイズ"] for row in save_rows]
+            with stage("保存"):
+                save_journal.enqueue(save_rows, [(selected_pid, size) for size in saved_sizes])
+            save_worker.trigger()
+
+            # 保存後：エディタ初期化 → 空表に更新
             st.session_state.pop("measured_editor", None)  # data_editorの内部状態を削除
             st.session_state["reset_editor"] = True        # 次回描画は空表
-            st.success("✅ 採寸データを保存しました。")
+            st.session_state["save_message"] = f"✅ 採寸データを保存しました（{len(saved_sizes)}サイズ・スプレッドシートへは裏で送信）"
             st.rerun()  # すぐに空表へ切り替える
 
         except Exception as e:
@@ -305,11 +406,11 @@ if page == "採寸入力":
     # 7) 参考テーブル
     st.markdown("### 👕 同じモデルの過去採寸データ（比較用）")
     try:
-        model_prefix = selected_pid[:8]
-        model_df = combined_df[
-            (combined_df["商品管理番号"].astype(str).str[:8] == model_prefix) &
-            (combined_df["商品管理番号"] != selected_pid)
-        ]
+        with stage("同モデル抽出"):
+            model_df = combined_df[
+                dataset.range_mask(pid_prefix=model_prefix) &
+                (combined_df["商品管理番号"] != selected_pid).to_numpy()
+            ]
         base_cols = ["日付", "商品管理番号", "サイズ"]
         show_cols = base_cols + [c for c in model_df.columns if c in items]
         show_df = model_df[show_cols].sort_values(by=["日付", "サイズ"], ascending=[False, True])
@@ -331,47 +432,92 @@ if page == "採寸入力":
     except Exception as e:
         st.warning(f"今日の採寸データを表示できませんでした: {e}")
 
+# ---------------------
+# 採寸一括取り込みページ
+# ---------------------
+elif page == "採寸一括取り込み":
+    st.title("📥 採寸一括取り込み")
+    st.caption(
+        "1 行が 1 商品・1 サイズの Excel／CSV（列: 商品管理番号・サイズ・採寸項目、任意で 日付・備考）。"
+        "ブランド・商品名などは商品マスタから引き継ぎ、取り込んだ行は商品マスタから消します。"
+    )
+    uploaded_file = st.file_uploader("Excel／CSVファイルをアップロード", type=["xlsx", "csv"])
+    if uploaded_file:
+        try:
+            upload = read_upload(uploaded_file)
+            with stage("読み込み"):
+                texts = store.read_many(["商品マスタ", "採寸テンプレート"])
+            # 保存済み（送信待ち）の行は商品マスタから消える前でも取り込まない
+            master = texts["商品マスタ"]
+            queued = save_journal.pending_master_keys()
+            if queued and set(PRODUCT_KEYS).issubset(master.columns):
+                master = master[~key_index(master, PRODUCT_KEYS).isin(list(queued))]
+            # 商品マスタ・採寸テンプレートと表全体で突き合わせる
+            with stage("検証"):
+                checked = check_measurements(
+                    upload, master, template_items(texts["採寸テンプレート"]),
+                    datetime.now().strftime("%Y-%m-%d"),
+                )
+        except Exception as e:
+            st.error(f"読み込みエラー: {e}")
+            st.stop()
+
+        for col, (label, count) in zip(st.columns(3), checked.counts().items()):
+            col.metric(label, f"{count} 件")
+        if checked.unknown_columns:
+            st.warning(f"採寸項目にない列は無視します: {', '.join(checked.unknown_columns)}")
+        if len(checked.errors):
+            with st.expander(f"取り込めない行（{len(checked.errors)} 件）", expanded=True):
+                st.dataframe(checked.errors, use_container_width=True, hide_index=True)
+        if len(checked.rows):
+            with st.expander("取り込む行"):
+                st.dataframe(checked.rows, use_container_width=True)
+
+        if st.button("採寸結果に保存", disabled=not len(checked.rows)):
+            # 採寸入力と同じ保存ジャーナルに IMPORT_CHUNK_ROWS 行ずつ記録し、送信は裏のスレッドに任せる
+            try:
+                with stage("保存"):
+                    for rows, master_keys in checked.batches():
+                        save_journal.enqueue(rows, master_keys)
+                save_worker.trigger()
+                st.success(f"✅ {len(checked.rows)} 行を保存しました（スプレッドシートへは裏で送信）")
+            except Exception as e:
+                st.error(f"保存エラー: {e}")
+
+        counts = save_journal.counts()
+        if counts["pending"] or counts["failed"]:
+            st.info(f"送信待ち {counts['pending']} 件・送信失敗 {counts['failed']} 件（採寸入力と共通の保存キュー）")
+        last_sent = save_journal.last_sent()
+        if last_sent:
+            st.caption(f"📡 直近の送信: {last_sent}")
+
 # ---------------------
 # 採寸検索ページ（アーカイブと統合検索）
 # ---------------------
 elif page == "採寸検索":
     st.title("🔍 採寸結果検索")
     try:
-        result_values = spreadsheet.worksheet("採寸結果").get_all_values()
-        archive_values = spreadsheet.worksheet("採寸アーカイブ").get_all_values()
-
-        def to_df(values):
-            if not values:
-                return pd.DataFrame()
-            headers = values[0]
-            data = [row + [''] * (len(headers) - len(row)) for row in values[1:]]
-            return pd.DataFrame(data, columns=headers)
-
-        result_df = to_df(result_values)
-        archive_df = to_df(archive_values)
-        combined_df = pd.concat([result_df, archive_df], ignore_index=True)
-
-        selected_brands = st.multiselect("🔸 ブランドを選択", sorted(combined_df["ブランド"].dropna().unique()))
-        filtered_df = combined_df[combined_df["ブランド"].isin(selected_brands)] if selected_brands else combined_df
-
-        pid_options = sorted(filtered_df["商品管理番号"].dropna().unique())
-        size_options = sorted(filtered_df["サイズ"].dropna().unique())
-        genre_options = sorted(filtered_df["ジャンル"].dropna().unique())
-
-        selected_pids = st.multiselect("🔹 管理番号を選択", pid_options)
-        selected_sizes = st.multiselect("🔺 サイズを選択", size_options)
-        keyword = st.text_input("🔍 キーワードで検索（商品名、管理番号など）")
-        genre_filter = st.selectbox("📂 ジャンルで表示項目を絞る", ["すべて表示"] + genre_options)
-
-        df = filtered_df.copy()
-        if selected_pids:
-            df = df[df["商品管理番号"].isin(selected_pids)]
-        if selected_sizes:
-            df = df[df["サイズ"].isin(selected_sizes)]
-        if keyword:
-            df = df[df.apply(lambda row: keyword.lower() in str(row.values).lower(), axis=1)]
-        if genre_filter != "すべて表示":
-            df = df[df["ジャンル"] == genre_filter]
+        # 期間・管理番号の前方一致に関係する月のアーカイブだけ読み込む
+        date_from, date_to, pid_prefix, keep_undated = period_filter("全期間を検索")
+
+        with stage("読み込み"):
+            dataset = load_measurement_dataset(catalog.select(date_from, date_to, pid_prefix or None))
+            result = ResultQuery(dataset)
+            if date_from or date_to or pid_prefix:
+                result = result.where(dataset.range_mask(date_from, date_to, pid_prefix, keep_undated))
+
+        selected_brands = st.multiselect("🔸 ブランドを選択", result.values("ブランド"))
+        result = result.isin("ブランド", selected_brands)
+
+        selected_pids = st.multiselect("🔹 管理番号を選択", result.values("商品管理番号"))
+        selected_sizes = st.multiselect("🔺 サイズを選択", result.values("サイズ"))
+        keyword = st.text_input("🔍 キーワードで検索（商品名、管理番号など／空白区切りで複数語、末尾*で前方一致）")
+        genre_filter = st.selectbox("📂 ジャンルで表示項目を絞る", ["すべて表示"] + result.values("ジャンル"))
+
+        with stage("絞り込み"):
+            result = result.isin("商品管理番号", selected_pids).isin("サイズ", selected_sizes).keyword(keyword)
+            if genre_filter != "すべて表示":
+                result = result.isin("ジャンル", [genre_filter])
 
         base_cols = ["日付", "商品管理番号", "ブランド", "ジャンル", "商品名", "カラー", "サイズ"]
 
@@ -379,7 +525,7 @@ elif page == "採寸検索":
         if genre_filter != "すべて表示":
             ideal_cols = ideal_order_dict.get(genre_filter, [])
         else:
-            present_genres = [g for g in df["ジャンル"].dropna().unique().tolist()]
+            present_genres = result.values("ジャンル")
             if len(present_genres) == 1:
                 ideal_cols = ideal_order_dict.get(present_genres[0], [])
             else:
@@ -391,44 +537,97 @@ elif page == "採寸検索":
                 ideal_cols = merged
         # ===========================================
 
+        all_cols = [c for c in dataset.frame.columns if c != SAVE_ID]  # 保存IDは送信の重複防止用
         ordered_cols = (
             base_cols
-            + [c for c in ideal_cols if c in df.columns]
-            + [c for c in df.columns if c not in base_cols + ideal_cols]
+            + [c for c in ideal_cols if c in all_cols]
+            + [c for c in all_cols if c not in base_cols + ideal_cols]
         )
 
-        df = df[ordered_cols]
-        df = df.loc[:, ~(df.isna() | (df == "")).all(axis=0)]
-
-        st.write(f"🔍 検索結果: {len(df)} 件")
+        with stage("列の整形"):
+            columns = result.nonempty_columns(ordered_cols)
+
+        st.write(f"🔍 検索結果: {len(result)} 件")
+
+        # 並べ替えと 1 ページ分の切り出しは位置の配列で行い、表示するページの行だけを送る
+        c1, c2, c3, c4 = st.columns([3, 1, 1, 1])
+        sort_col = c1.selectbox("↕ 並べ替え", ["（並べ替えなし）"] + columns)
+        descending = c2.checkbox("降順")
+        page_size = c3.selectbox("表示件数", PAGE_SIZES)
+        pages = max(1, -(-len(result) // page_size))
+        page_no = c4.number_input("ページ", min_value=1, max_value=pages, value=1, step=1)
+        if sort_col in columns:
+            with stage("並べ替え"):
+                result = result.sorted(sort_col, ascending=not descending)
+
+        with stage("表描画"):
+            st.data_editor(
+                result.page(page_no - 1, page_size, columns),
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "備考": st.column_config.TextColumn(
+                        "備考",
+                        help="備考は折り返さず全文表示されます",
+                        width="large",
+                        max_chars=None
+                    )
+                },
+                disabled=True
+            )
+        st.caption(f"{page_no} / {pages} ページ")
 
-        st.data_editor(
-            df,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "備考": st.column_config.TextColumn(
-                    "備考",
-                    help="備考は折り返さず全文表示されます",
-                    width="large",
-                    max_chars=None
-                )
-            },
-            disabled=True
-        )
+        if len(result):
+            # 同じ検索結果・形式なら作ったファイルを使い回す
+            export_download("export", (dataset.versions, tuple(columns), hash(result.positions.tobytes())),
+                            len(result), lambda: result.frame(columns), "検索結果", "採寸結果_検索結果")
+    except Exception as e:
+        st.error(f"読み込みエラー: {e}")
 
-        if not df.empty:
-            to_excel = io.BytesIO()
-            with pd.ExcelWriter(to_excel, engine="openpyxl") as writer:
-                df.to_excel(writer, index=False, sheet_name="採寸結果")
-                writer.sheets["採寸結果"].auto_filter.ref = writer.sheets["採寸結果"].dimensions
-            to_excel.seek(0)
-            st.download_button(
-                label="📥 検索結果をExcelでダウンロード",
-                data=to_excel,
-                file_name="採寸結果_検索結果.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+# ---------------------
+# 許容差チェックページ（全商品の採寸値と基準値の差）
+# ---------------------
+elif page == "許容差チェック":
+    st.title("📏 許容差チェック")
+    try:
+        with st.expander("⚙ 許容差（ジャンル・採寸項目が空なら全体に適用。指定のないものは 1.0）"):
+            current = store.read(TOLERANCES)
+            if current.empty:
+                current = pd.DataFrame(columns=TOLERANCE_COLUMNS)
+            edited = st.data_editor(current.reindex(columns=TOLERANCE_COLUMNS).astype(str),
+                                    num_rows="dynamic", use_container_width=True, key="tolerance_editor")
+            if st.button("許容差を保存"):
+                with stage("保存"):
+                    store.replace(TOLERANCES, edited[edited["許容差"].str.strip() != ""], TOLERANCE_COLUMNS)
+                st.success("✅ 許容差を保存しました")
+
+        date_from, date_to, pid_prefix, keep_undated = period_filter("全期間をチェック")
+
+        with stage("読み込み"):
+            dataset = load_measurement_dataset(catalog.select(date_from, date_to, pid_prefix or None))
+        with stage("許容差チェック"):
+            report = get_deviation_cache().get(dataset)
+            if date_from or date_to or pid_prefix:
+                report = report.where(dataset.range_mask(date_from, date_to, pid_prefix, keep_undated))
+
+        checked = "" if report.checked is None else f"（基準値と比べた {report.checked} 行中）"
+        st.write(f"⚠ 許容差を超えた行: {len(report)} 件{checked}")
+        if len(report):
+            st.markdown("### 📊 ジャンル×採寸項目ごとの件数")
+            st.dataframe(report.summary(), use_container_width=True, hide_index=True)
+
+            st.markdown("### 📋 超えた行（差 = 採寸値 − 基準値）")
+            report_df = report.frame()
+            c1, c2 = st.columns([1, 1])
+            page_size = c1.selectbox("表示件数", PAGE_SIZES)
+            pages = max(1, -(-len(report_df) // page_size))
+            page_no = c2.number_input("ページ", min_value=1, max_value=pages, value=1, step=1)
+            st.dataframe(report_df.iloc[(page_no - 1) * page_size:page_no * page_size],
+                         use_container_width=True, hide_index=True)
+            st.caption(f"{page_no} / {pages} ページ")
+
+            export_download("deviation_export", (report.versions, hash(report.positions.tobytes())),
+                            len(report), lambda: report_df, "許容差チェックの結果", "許容差チェック")
     except Exception as e:
         st.error(f"読み込みエラー: {e}")
 
@@ -448,14 +647,27 @@ elif page == "商品インポート":
         st.subheader("読み込んだデータ")
         st.dataframe(df, use_container_width=True)
 
-        if st.button("Googleスプレッドシートに保存"):
+        # (管理番号, サイズ) で商品マスタと突き合わせ、追加と変わったセルだけを書く
+        with stage("差分"):
+            diff = diff_by_key(store.read("商品マスタ"), df, PRODUCT_KEYS)
+        st.subheader("保存内容のプレビュー")
+        for col, (label, count) in zip(st.columns(3), diff.counts().items()):
+            col.metric(label, f"{count} 件")
+        if diff.unknown_columns:
+            st.warning(f"商品マスタにない列は既存行の更新では無視されます: {', '.join(diff.unknown_columns)}")
+        if len(diff.inserted):
+            with st.expander("追加される行"):
+                st.dataframe(diff.inserted, use_container_width=True)
+        if len(diff.updated):
+            with st.expander("更新される行（新しい値）"):
+                st.dataframe(diff.updated, use_container_width=True)
+
+        if st.button("Googleスプレッドシートに保存", disabled=not (len(diff.inserted) or diff.changes)):
             try:
-                product_sheet = spreadsheet.worksheet("商品マスタ")
-                existing = pd.DataFrame(product_sheet.get_all_records())
-                merged = pd.concat([existing, df], ignore_index=True).drop_duplicates()
-                product_sheet.clear()
-                product_sheet.update([merged.columns.tolist()] + merged.fillna("").values.tolist())
-                st.success("✅ 商品マスタに保存しました！")
+                with stage("保存"):
+                    saved = save_diff(store, "商品マスタ", df, PRODUCT_KEYS)
+                counts = "・".join(f"{label} {count} 件" for label, count in saved.counts().items())
+                st.success(f"✅ 商品マスタに保存しました！（{counts}）")
             except Exception as e:
                 st.error(f"保存エラー: {e}")
 
@@ -475,18 +687,17 @@ elif page == "基準値インポート":
             st.markdown("### 👀 アップロード内容（統合済）")
             st.dataframe(merged, use_container_width=True)
 
+            # 同じ (商品管理番号, サイズ) の既存行だけを消して、アップロードした行を追加する
+            merged = text_frame(merged)
+            with stage("差分"):
+                keys, removed, fresh = replaced_keys(store.read("基準データ"), merged, STANDARD_KEYS)
+            c1, c2 = st.columns(2)
+            c1.metric("置き換え", f"{len(keys)} 件", help=f"既存の {removed} 行を削除して追加")
+            c2.metric("新規", f"{fresh} 件")
+
             if st.button("Googleスプレッドシートに保存"):
-                try:
-                    sheet = spreadsheet.worksheet("基準データ")
-                except gspread.exceptions.WorksheetNotFound:
-                    sheet = spreadsheet.add_worksheet(title="基準データ", rows="100", cols="50")
-                exist = pd.DataFrame(sheet.get_all_records())
-                if not exist.empty:
-                    keys = set(zip(merged["商品管理番号"], merged["サイズ"]))
-                    exist = exist[~exist.apply(lambda r: (r["商品管理番号"], r["サイズ"]) in keys, axis=1)]
-                final = pd.concat([exist, merged], ignore_index=True)
-                sheet.clear()
-                sheet.update([final.columns.tolist()] + final.fillna("").values.tolist())
+                with stage("保存"):
+                    replace_by_key(store, "基準データ", merged, STANDARD_KEYS)
                 st.success("✅ 基準データを保存しました！")
         except Exception as e:
             st.error(f"読み込みエラー: {e}")
@@ -497,87 +708,66 @@ elif page == "基準値インポート":
 elif page == "採寸ヘッダー初期化":
     st.title("📋 採寸シート ヘッダー初期化（※データは残る）")
 
-    base_headers = [
-        "日付","商品管理番号","ブランド","ジャンル","商品名","カラー","サイズ",
-        "肩幅","胸幅","胴囲","袖丈","着丈","襟高","首高","ウエスト","股上","股下",
-        "ワタリ","裾幅","全長","最大幅","横幅","頭周り","ツバ","高さ","裄丈",
-        "ベルト幅","前丈","後丈","備考"
-    ]
-
     def reinit(name):
         try:
-            ws = spreadsheet.worksheet(name)
-            values = ws.get_all_values()
-
-            if not values:
-                ws.append_row(base_headers)
+            with stage("ヘッダー初期化"):
+                empty = reinit_headers(store, name)
+            if empty:
                 st.success(f"✅ 『{name}』を新しいヘッダーで初期化しました（空シート）")
-                return
-
-            old_headers = values[0]
-            rows = values[1:]
-
-            final_headers = old_headers[:]
-            for h in base_headers:
-                if h not in final_headers:
-                    final_headers.append(h)
-
-            new_rows = []
-            for r in rows:
-                r = r + [''] * (len(old_headers) - len(r))
-                row_dict = dict(zip(old_headers, r))
-                new_rows.append([row_dict.get(h, "") for h in final_headers])
-
-            ws.clear()
-            ws.append_row(final_headers)
-            if new_rows:
-                ws.append_rows(new_rows)
-
-            st.success(f"✅ 『{name}』のヘッダーを再構築しました！（備考も保持）")
-
+            else:
+                st.success(f"✅ 『{name}』のヘッダーを再構築しました！（備考も保持）")
         except Exception as e:
             st.error(f"処理エラー: {e}")
 
     if st.button("🧼 採寸結果シートの初期化"):
         reinit("採寸結果")
 
-    if st.button("🧼 採寸アーカイブシートの初期化"):
-        reinit("採寸アーカイブ")
+    if st.button("🧼 採寸アーカイブシートの初期化（月別シートすべて）"):
+        for name in catalog.select():
+            reinit(name)
 
 # ---------------------
 # アーカイブ管理ページ（30日超→移動）
 # ---------------------
 elif page == "アーカイブ管理":
     st.title("🗃️ 採寸データのアーカイブ管理")
-
-    def parse_date(s):
-        for f in ("%Y-%m-%d","%Y/%m/%d","%Y.%m.%d"):
-            try:
-                return datetime.strptime(s.strip(), f)
-            except:
-                pass
-        return None
-
-    if st.button("📦 30日以上前の採寸結果をアーカイブに移動"):
-        try:
-            res = spreadsheet.worksheet("採寸結果")
-            arc = spreadsheet.worksheet("採寸アーカイブ")
-            vals = res.get_all_values()
-            hdr, rows = vals[0], vals[1:]
-            old, recent = [], []
-            today = datetime.now()
-            for r in rows:
-                r += [''] * (len(hdr) - len(r))
-                d = parse_date(r[0])
-                (old if d and (today - d).days > 30 else recent).append(r)
-            if old:
-                if not arc.get_all_values():
-                    arc.append_row(hdr)
-                arc.append_rows(old)
-            res.clear()
-            res.append_row(hdr)
-            if recent:
-                res.append_rows(recent)
-            st.success(f"✅ {len(old)}件をアーカイブに移動しました！")
-        except Exception as e:
-            st.error(f"エラー: {e}")
+    st.caption(f"30日以上前の採寸結果を{archive_scheduler.chunk_rows}行ずつ裏で移動します（途中で止まっても続きから再開）")
+
+    if st.button("📦 今すぐアーカイブを実行"):
+        archive_scheduler.trigger()
+        st.success("✅ アーカイブ移動を開始しました（画面を離れても続きます）")
+
+    st.button("🔄 状態を更新")
+
+    with stage("ジョブ状態"):
+        jobs = archive_scheduler.checkpoint.latest()
+    if archive_scheduler.running:
+        st.info("⏳ 実行中です")
+    elif archive_scheduler.next_run:
+        st.write(f"次回の実行予定: {datetime.fromtimestamp(archive_scheduler.next_run):%Y-%m-%d %H:%M}")
+
+    if jobs:
+        status_labels = {"running": "実行中", "paused": "中断（再開待ち）", "done": "完了"}
+        fmt = lambda t: datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M") if t else ""
+        st.dataframe(pd.DataFrame([{
+            "開始": fmt(j["started_at"]),
+            "基準日（これより前を移動）": j["cutoff"],
+            "状態": status_labels.get(j["status"], j["status"]),
+            "移動件数": j["moved"],
+            "回数": j["chunks"],
+            "完了": fmt(j["finished_at"]),
+            "エラー": j["error"] or "",
+        } for j in jobs]), hide_index=True, use_container_width=True)
+    else:
+        st.info("まだアーカイブ移動は実行されていません。")
+    if archive_scheduler.last_error:
+        st.warning(f"前回の実行でエラーがありました（自動で再開します）: {archive_scheduler.last_error}")
+
+    st.markdown("### 📚 アーカイブ目録（月別シート）")
+    entries = catalog.entries()
+    if ARCHIVE in entries and entries[ARCHIVE]["件数"] != "0":
+        st.caption(f"旧形式の『{ARCHIVE}』は裏で月別シートへ分割中です（分割済み {entries[ARCHIVE]['分割済み行数'] or 0} 行）")
+    if entries:
+        st.dataframe(pd.DataFrame(list(entries.values()), columns=CATALOG_COLUMNS), hide_index=True, use_container_width=True)
+
+close_rerun()
@@ -0,0 +1,204 @@
+# ━━━━━ 採寸結果 → 採寸アーカイブ の移動ジョブ ━━━━━
+# 基準日より前の採寸結果を、決まった行数ずつ「月別アーカイブへ追加＋目録更新＋採寸結果から行削除」で移す。
+#   - 1 回分（チャンク）の追加と削除は 1 回のバッチ（Sheets は 1 回の batchUpdate）なので、途中で失敗しても重複・消失しない
+#   - 進み具合はチェックポイント（SQLite）に残し、クォータ超過やプロセスの停止後は同じ基準日で続きから再開する
+#   - ボタンで待たせず、プロセスに 1 つのスケジューラが裏のスレッドで定期実行する
+#     （旧形式の 1 枚の採寸アーカイブが残っていれば、続けて月別シートへの分割も進める）
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from partitions import ArchiveCatalog, needs_split, split_legacy
+from sheets import parse_dates
+
+SOURCE = "採寸結果"
+ARCHIVE_KEYS = ["日付", "商品管理番号", "サイズ"]  # 削除する行の特定に使う列
+CHUNK_ROWS = 500      # 1 回のバッチで移す行数の目安
+RETRY_DELAY = 300     # 失敗時（クォータ超過など）に再開するまでの秒数
+
+
+def cutoff_date(days=30, today=None):
+    """days 日より前（(今日 - 日付).days > days）の境界。日付がこれより前なら移動対象"""
+    today = today or datetime.now()
+    return (pd.Timestamp(today).normalize() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def next_chunk(df, cutoff, chunk_rows=CHUNK_ROWS):
+    """
+    移動対象の先頭から約 chunk_rows 行。同じキーの行は同じチャンクに入れる
+    （キー一致で削除するため、チャンクをまたぐと追加されないまま消える行が出る）。
+    """
+    if df.empty or not set(ARCHIVE_KEYS).issubset(df.columns):
+        return df.iloc[0:0]
+    dates = parse_dates(df["日付"])
+    old = df[(dates < pd.Timestamp(cutoff)).to_numpy()]
+    if old.empty:
+        return old
+    keys = pd.MultiIndex.from_frame(old[ARCHIVE_KEYS].astype(str))
+    return old[keys.isin(keys[:chunk_rows].unique())]
+
+
+class ArchiveCheckpoint:
+    """移動ジョブの記録。未完了（running / paused）のジョブがあれば次回はその続きから"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS archive_jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " cutoff TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " moved INTEGER NOT NULL DEFAULT 0,"
+            " chunks INTEGER NOT NULL DEFAULT 0,"
+            " started_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " finished_at REAL,"
+            " error TEXT)"
+        )
+        self.lock = threading.Lock()
+
+    COLUMNS = ["id", "cutoff", "status", "moved", "chunks", "started_at", "updated_at", "finished_at", "error"]
+
+    def _jobs(self, where="", args=(), limit=1):
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM archive_jobs {where} ORDER BY id DESC LIMIT ?",
+                (*args, limit),
+            ).fetchall()
+        return [dict(zip(self.COLUMNS, r)) for r in rows]
+
+    def job(self, job_id):
+        jobs = self._jobs("WHERE id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def open_job(self):
+        jobs = self._jobs("WHERE status IN ('running', 'paused')")
+        return jobs[0] if jobs else None
+
+    def latest(self, limit=5):
+        return self._jobs(limit=limit)
+
+    def last_finished_at(self):
+        jobs = self._jobs("WHERE status = 'done'")
+        return jobs[0]["finished_at"] if jobs else None
+
+    def start(self, cutoff):
+        now = time.time()
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO archive_jobs (cutoff, status, started_at, updated_at) VALUES (?, 'running', ?, ?)",
+                (cutoff, now, now),
+            )
+        return self.job(cur.lastrowid)
+
+    def _update(self, job_id, sql, args=()):
+        with self.lock:
+            self.conn.execute(f"UPDATE archive_jobs SET updated_at = ?, {sql} WHERE id = ?",
+                              (time.time(), *args, job_id))
+
+    def resume(self, job_id):
+        self._update(job_id, "status = 'running', error = NULL")
+
+    def progress(self, job_id, rows):
+        self._update(job_id, "moved = moved + ?, chunks = chunks + 1", (rows,))
+
+    def pause(self, job_id, error):
+        self._update(job_id, "status = 'paused', error = ?", (error,))
+
+    def finish(self, job_id):
+        self._update(job_id, "status = 'done', finished_at = ?, error = NULL", (time.time(),))
+
+
+def migrate(store, checkpoint, days=30, chunk_rows=CHUNK_ROWS, today=None, stop=None):
+    """
+    未完了のジョブがあれば同じ基準日で続きから、なければ新しいジョブを始めて最後まで移す。
+    stop（threading.Event）が立てばチャンクの切れ目で止める（ジョブは未完了のまま残る）。
+    失敗したらジョブを paused にして例外を投げ直す。終了時のジョブの記録を返す。
+    """
+    job = checkpoint.open_job()
+    if job is None:
+        job = checkpoint.start(cutoff_date(days, today))
+    else:
+        checkpoint.resume(job["id"])
+    try:
+        # ミラーが古いと移動済みの行をもう一度追加したり、編集前の値を移して編集後の行を消したりするので、
+        # 途中行の編集も含めて全件読み直してから移す
+        store.refresh([SOURCE], full=True)
+        catalog = ArchiveCatalog(store)
+        while stop is None or not stop.is_set():
+            chunk = next_chunk(store.read(SOURCE), job["cutoff"], chunk_rows)
+            if chunk.empty:
+                checkpoint.finish(job["id"])
+                break
+            keys = list(dict.fromkeys(map(tuple, chunk[ARCHIVE_KEYS].values.tolist())))
+            with store.batch():
+                catalog.append(chunk)
+                store.delete(SOURCE, ARCHIVE_KEYS, keys)
+            # ここで止まっても移動自体は完了している（件数の記録が少なくなるだけ）
+            checkpoint.progress(job["id"], len(chunk))
+    except Exception as e:
+        checkpoint.pause(job["id"], str(e))
+        raise
+    return checkpoint.job(job["id"])
+
+
+class ArchiveScheduler:
+    """
+    プロセスに 1 つ。前回の完了から interval 秒ごと、または trigger() で裏のスレッドから migrate を実行する。
+    失敗したジョブは retry_delay 秒後に続きから再開する。
+    """
+
+    def __init__(self, store, checkpoint, days=30, chunk_rows=CHUNK_ROWS, interval=86400, retry_delay=RETRY_DELAY):
+        self.store = store
+        self.checkpoint = checkpoint
+        self.days = days
+        self.chunk_rows = chunk_rows
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+        self.running = False
+        self.next_run = None
+        self.last_error = None  # 旧形式アーカイブの分割など、checkpoint に残らない失敗
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="archive-scheduler", daemon=True)
+            self.thread.start()
+        return self
+
+    def trigger(self):
+        """次の予定を待たずにすぐ実行する"""
+        self.wake.set()
+
+    def _first_delay(self):
+        if self.checkpoint.open_job() or needs_split(self.store):
+            return 0
+        finished = self.checkpoint.last_finished_at()
+        return 0 if finished is None else max(0, finished + self.interval - time.time())
+
+    def _loop(self):
+        delay = self._first_delay()
+        while not self.stop.is_set():
+            self.next_run = time.time() + delay
+            self.wake.wait(delay)
+            self.wake.clear()
+            if self.stop.is_set():
+                break
+            self.running = True
+            try:
+                migrate(self.store, self.checkpoint, self.days, self.chunk_rows, stop=self.stop)
+                if needs_split(self.store):
+                    split_legacy(self.store, stop=self.stop)
+                delay = self.interval
+                self.last_error = None
+            except Exception as e:
+                delay = self.retry_delay  # 移動ジョブの失敗は checkpoint の error にも残っている
+                self.last_error = str(e)
+            finally:
+                self.running = False
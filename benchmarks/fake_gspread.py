@@ -0,0 +1,177 @@
+# ━━━━━ gspread のメモリ上の代替 ━━━━━
+# SheetsClient が使う Spreadsheet / Worksheet の操作だけを再現する。
+# API 呼び出しの回数・読み書きしたセル数を数え、1 回ごとに遅延（latency 秒）を入れられる。
+import re
+import threading
+import time
+from collections import Counter
+
+from gspread.exceptions import WorksheetNotFound
+
+RANGE_RE = re.compile(r"'(.*)'(?:!(.*))?$")
+CELLS_RE = re.compile(r"([A-Z]*)(\d*):([A-Z]*)(\d*)$")
+
+
+def col_number(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def trim_row(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def cell_text(cell):
+    # 書き込まれた値は API の RAW 読み出しと同じく文字列で持つ（整数の numberValue は小数点なし）
+    value = cell.get("userEnteredValue", {})
+    for kind in ("stringValue", "numberValue", "boolValue"):
+        if kind in value:
+            v = value[kind]
+            if kind == "numberValue" and float(v).is_integer():
+                v = int(v)
+            elif kind == "boolValue":
+                v = "TRUE" if v else "FALSE"
+            return str(v)
+    return ""
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, sheet_id, rows=None, cols=26):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.rows = [[str(v) for v in r] for r in rows or []]
+        self.col_count = max([cols] + [len(r) for r in self.rows])
+
+    def get_all_values(self):
+        self.spreadsheet._call("get_all_values")
+        return [trim_row(r) for r in self.rows]
+
+    def append_rows(self, rows, **kwargs):
+        self.spreadsheet._call("append_rows")
+        self.spreadsheet.cells_written += sum(len(r) for r in rows)
+        self.rows += [[str(v) for v in r] for r in rows]
+
+
+class FakeSpreadsheet:
+    """
+    data: シート名 → 値の二次元リスト（1 行目がヘッダー）。
+    calls は API 呼び出しの種類ごとの回数、cells_read / cells_written は送受信したセル数。
+    """
+
+    def __init__(self, data=None, latency=0.0, title="採寸管理データ"):
+        self.title = title
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.sheets = {}
+        self.calls = Counter()
+        self.cells_read = 0
+        self.cells_written = 0
+        for name, rows in (data or {}).items():
+            self.sheets[name] = FakeWorksheet(self, name, len(self.sheets) + 1, rows)
+
+    # ---- 計測 ----
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.cells_read = self.cells_written = 0
+
+    # ---- メタデータ ----
+    def worksheets(self):
+        self._call("worksheets")
+        return list(self.sheets.values())
+
+    def worksheet(self, title):
+        self._call("worksheet")
+        if title not in self.sheets:
+            raise WorksheetNotFound(title)
+        return self.sheets[title]
+
+    def add_worksheet(self, title, rows, cols):
+        self._call("add_worksheet")
+        ws = self.sheets[title] = FakeWorksheet(self, title, len(self.sheets) + 1, cols=cols)
+        return ws
+
+    def _by_id(self, sheet_id):
+        return next(ws for ws in self.sheets.values() if ws.id == sheet_id)
+
+    # ---- values.batchGet ----
+    def _select(self, a1):
+        title, cells = RANGE_RE.match(a1).groups()
+        title = title.replace("''", "'")
+        if title not in self.sheets:
+            raise WorksheetNotFound(title)
+        values = self.sheets[title].rows
+        if cells is None:
+            selected = values
+        else:
+            c1, r1, c2, r2 = CELLS_RE.match(cells).groups()
+            r1 = int(r1) if r1 else 1
+            r2 = int(r2) if r2 else len(values)
+            c1 = col_number(c1) if c1 else 1
+            c2 = col_number(c2) if c2 else None
+            selected = [row[c1 - 1:c2] for row in values[r1 - 1:r2]]
+        selected = [trim_row(r) for r in selected]
+        while selected and not selected[-1]:
+            selected.pop()
+        return selected
+
+    def values_batch_get(self, ranges, params=None):
+        self._call("values_batch_get")
+        out = []
+        for a1 in ranges:
+            selected = self._select(a1)
+            self.cells_read += sum(len(r) for r in selected)
+            out.append({"range": a1, "values": selected} if selected else {"range": a1})
+        return {"valueRanges": out}
+
+    # ---- batchUpdate ----
+    def batch_update(self, body):
+        self._call("batch_update")
+        for request in body["requests"]:
+            (kind, args), = request.items()
+            if kind == "appendCells":
+                ws = self._by_id(args["sheetId"])
+                while ws.rows and not any(ws.rows[-1]):
+                    ws.rows.pop()
+                rows = [[cell_text(c) for c in r.get("values", [])] for r in args["rows"]]
+                self.cells_written += sum(len(r) for r in rows)
+                ws.rows += rows
+            elif kind == "updateCells" and "range" in args:
+                # fields=userEnteredValue の範囲クリア
+                ws = self._by_id(args["range"]["sheetId"])
+                ws.rows = [[] for _ in ws.rows]
+            elif kind == "updateCells":
+                ws = self._by_id(args["start"]["sheetId"])
+                r0, c0 = args["start"]["rowIndex"], args["start"]["columnIndex"]
+                for i, r in enumerate(args["rows"]):
+                    while len(ws.rows) <= r0 + i:
+                        ws.rows.append([])
+                    row = ws.rows[r0 + i]
+                    values = r.get("values", [])
+                    if len(row) < c0 + len(values):
+                        row.extend([""] * (c0 + len(values) - len(row)))
+                    row[c0:c0 + len(values)] = [cell_text(c) for c in values]
+                    self.cells_written += len(values)
+            elif kind == "deleteDimension":
+                rng = args["range"]
+                del self._by_id(rng["sheetId"]).rows[rng["startIndex"]:rng["endIndex"]]
+            elif kind == "appendDimension":
+                self._by_id(args["sheetId"]).col_count += args["length"]
+            else:
+                raise ValueError(f"未対応のリクエスト: {kind}")
+        return {"replies": [{} for _ in body["requests"]]}
@@ -0,0 +1,310 @@
+# ━━━━━ オフライン計測 ━━━━━
+# Google に接続せず、メモリ上の gspread 代替（または SQLite）に合成データを載せて主要な処理を計測する。
+# シナリオごとに 実行時間・ピークメモリ（tracemalloc）・API 呼び出し回数 を表示する。
+#
+#   python -m benchmarks.run                       # 1,000 行
+#   python -m benchmarks.run --rows 1000 100000 1000000 --latency 0.2
+#   python -m benchmarks.run --json bench.json     # 結果を保存
+#   python -m benchmarks.run --baseline bench.json # 保存した結果と比べ、悪化していれば終了コード 1
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from benchmarks import synth
+from benchmarks.fake_gspread import FakeSpreadsheet
+from archive import ArchiveCheckpoint, migrate
+from exports import export
+from indexes import ProductIndexCache
+from imports import (PRODUCT_KEYS, STANDARD_KEYS, check_measurements, replace_by_key, replaced_keys, save_diff,
+                     template_items, text_frame)
+from journal import SaveJournal, flush
+from maintenance import reinit_headers
+from mirror import SheetMirror
+from normalize import TypedCache
+from partitions import ArchiveCatalog, CATALOG, split_legacy
+from scheduler import SheetsScheduler
+from search import DatasetCache, ResultQuery
+from sheets import SheetsClient
+from storage import GoogleSheetsStorage, SQLiteStorage
+from tolerance import DeviationCache
+
+ENTRY_SHEETS = ["商品マスタ", "採寸テンプレート", "採寸結果", "基準データ", CATALOG]
+RECENT_DAYS = 90
+KEYWORD = "カシミヤ ジャケ"
+
+
+class Bench:
+    """1 つのデータ規模・保存先でのシナリオ一式（シナリオは定義順に実行し、前の結果を引き継ぐ）"""
+
+    def __init__(self, rows, backend="sheets", latency=0.0, workdir=None, seed=0):
+        self.rows = rows
+        self.workdir = workdir
+        self.workbook = synth.workbook(rows, seed)
+        self.spreadsheet = None
+        if backend == "sheets":
+            self.spreadsheet = FakeSpreadsheet(
+                {title: synth.to_values(df) for title, df in self.workbook.items()}, latency=latency
+            )
+            # 計測では流量制限で待たないよう上限を外す
+            scheduler = SheetsScheduler(reads_per_minute=10 ** 9, writes_per_minute=10 ** 9, burst=10 ** 9)
+            sheets = SheetsClient(self.spreadsheet, scheduler)
+            self.store = GoogleSheetsStorage(sheets, SheetMirror(os.path.join(workdir, "mirror.sqlite3")))
+        else:
+            self.store = SQLiteStorage(os.path.join(workdir, "measuring.sqlite3"))
+            for title, df in self.workbook.items():
+                self.store.replace(title, df)
+        self.catalog = ArchiveCatalog(self.store)
+        self.datasets = DatasetCache(self.store, self.catalog)
+        self.deviations = DeviationCache(self.store)
+        self.products = ProductIndexCache(TypedCache(self.store))
+        self.journal = SaveJournal(os.path.join(workdir, "save_journal.sqlite3"))
+        self.search = None
+        self.hits = None
+        master = self.workbook["商品マスタ"]
+        self.pid = master["管理番号"].iloc[0]
+        self.sizes = master.loc[master["管理番号"] == self.pid, "サイズ"].tolist()
+
+    def api_calls(self):
+        return self.spreadsheet.total_calls if self.spreadsheet else 0
+
+    def dataset(self, archive_titles):
+        titles = ["採寸結果"] + list(archive_titles)
+        self.store.read_many(titles)  # アプリと同じく、同期してからバージョンを見る
+        return self.datasets.get(titles)
+
+    # ---- シナリオ ----
+    def load(self):
+        """初回表示：入力用シートの読み込みと、全期間の検索用データ（結合・索引）の作成"""
+        self.store.read_many(ENTRY_SHEETS)
+        self.search = self.dataset(self.catalog.select())
+        return len(self.search.frame)
+
+    def entry_select(self):
+        """採寸入力の選択肢：索引（初回だけ作成）から全商品のサイズ・採寸項目を引く"""
+        index = self.products.get()
+        sizes = 0
+        for brand in index.brands:
+            for pid in index.pids(brand):
+                index.items(index.product(brand, pid)["ジャンル"])
+                sizes += len(index.sizes(brand, pid))
+        return sizes
+
+    def entry_prefill(self):
+        """採寸入力：選んだ商品のサイズ別の初期値と基準値"""
+        genre = self.workbook["商品マスタ"]["ジャンル"].iloc[0]
+        items = list(dict.fromkeys(synth.ideal_order_dict[genre]))
+        table = self.search.lookup.rows(self.pid, self.sizes, items + ["備考"])
+        self.store.find("基準データ", {"商品管理番号": self.pid, "サイズ": self.sizes})
+        return len(table)
+
+    def save(self):
+        """採寸入力の保存：採寸結果への追加＋商品マスタからの削除"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        product = self.workbook["商品マスタ"].iloc[0]
+        rows = [{
+            "日付": today, "商品管理番号": self.pid, "ブランド": product["ブランド"], "ジャンル": product["ジャンル"],
+            "商品名": product["商品名"], "カラー": product["カラー"], "サイズ": size, "肩幅": "45.5", "備考": "",
+        } for size in self.sizes]
+        with self.store.batch():
+            self.store.append("採寸結果", rows)
+            self.store.delete("商品マスタ", ["管理番号", "サイズ"], [(self.pid, size) for size in self.sizes])
+        return len(rows)
+
+    def queued_save(self):
+        """採寸入力の保存（保存キュー）：ジャーナルへの記録だけ（画面が待つのはここまで）"""
+        master = self.workbook["商品マスタ"]
+        pid = master["管理番号"].iloc[-1]
+        product = master.iloc[-1]
+        sizes = master.loc[master["管理番号"] == pid, "サイズ"].tolist()
+        today = datetime.now().strftime("%Y-%m-%d")
+        rows = [{
+            "日付": today, "商品管理番号": pid, "ブランド": product["ブランド"], "ジャンル": product["ジャンル"],
+            "商品名": product["商品名"], "カラー": product["カラー"], "サイズ": size, "肩幅": "45.5", "備考": "",
+        } for size in sizes]
+        self.journal.enqueue(rows, [(pid, size) for size in sizes])
+        return self.journal.counts()["pending"]
+
+    def save_flush(self):
+        """保存キューの送信：採寸結果の同じキーの削除＋追加＋商品マスタからの削除を 1 回のバッチで"""
+        return flush(self.store, self.journal)
+
+    def keyword_search(self):
+        """採寸検索：保存後のデータを読み直して（追加分だけ継ぎ足し）キーワード検索"""
+        self.search = self.dataset(self.catalog.select())
+        self.hits = self.search.frame.iloc[self.search.keyword_positions(KEYWORD)]
+        return len(self.hits)
+
+    def search_page(self):
+        """採寸検索の表示：全件から空列の判定・肩幅で並べ替え・先頭 1 ページの切り出し"""
+        result = ResultQuery(self.search)
+        columns = result.nonempty_columns(self.search.frame.columns.tolist())
+        return len(result.sorted("肩幅").page(0, 100, columns))
+
+    def deviation_report(self):
+        """許容差チェック：全期間の採寸値と基準データの差を全行まとめて計算"""
+        return len(self.deviations.get(self.search))
+
+    def excel_export(self):
+        """検索結果の Excel 出力（write_only で一時ファイルへ）"""
+        return os.path.getsize(export(self.hits, "xlsx", self.workdir))
+
+    def csv_export(self):
+        """検索結果の CSV 出力"""
+        return os.path.getsize(export(self.hits, "csv", self.workdir))
+
+    def archive_move(self):
+        """30 日より前の採寸結果を採寸アーカイブへ移動（チャンクごとのバッチ）"""
+        checkpoint = ArchiveCheckpoint(os.path.join(self.workdir, "archive_jobs.sqlite3"))
+        return migrate(self.store, checkpoint, days=30)["moved"]
+
+    def archive_split(self):
+        """旧形式の 1 枚の採寸アーカイブを月別シートへ分割"""
+        return split_legacy(self.store)
+
+    def recent_load(self):
+        """月別シート化の後、直近 RECENT_DAYS 日だけを検索対象として読み込み"""
+        date_from = (datetime.now() - timedelta(days=RECENT_DAYS)).strftime("%Y-%m-%d")
+        self.search = self.dataset(self.catalog.select(date_from=date_from))
+        return len(self.search.frame)
+
+    def header_reinit(self):
+        """採寸結果のヘッダー再構築（データは保持）"""
+        reinit_headers(self.store, "採寸結果")
+        return len(self.store.read("採寸結果"))
+
+    def product_import(self):
+        """商品インポート：既存の半分（うち半分はカラー変更）＋同数の新商品を差分で保存"""
+        master = self.workbook["商品マスタ"]
+        existing = master.iloc[len(master) // 2:].copy()
+        existing.loc[existing.index[::2], "カラー"] = "ネイビー"
+        fresh = synth.master(len(existing), seed=99)
+        diff = save_diff(self.store, "商品マスタ", pd.concat([existing, fresh], ignore_index=True), PRODUCT_KEYS)
+        return diff.counts()
+
+    def standard_import(self):
+        """基準値インポート：基準データの 1 割を置き換え（該当行の削除＋追加）"""
+        current = self.store.read("基準データ")
+        upload = text_frame(current.iloc[: max(1, len(current) // 10)])
+        keys, removed, fresh = replaced_keys(current, upload, STANDARD_KEYS)
+        replace_by_key(self.store, "基準データ", upload, STANDARD_KEYS)
+        return removed
+
+    def measurement_import(self):
+        """採寸一括取り込み：商品マスタの半分の採寸を検証し、保存ジャーナル経由で採寸結果へ（商品マスタから削除）"""
+        texts = self.store.read_many(["商品マスタ", "採寸テンプレート"])
+        master = texts["商品マスタ"].iloc[: len(texts["商品マスタ"]) // 2]
+        items = template_items(texts["採寸テンプレート"])
+        upload = master[PRODUCT_KEYS].rename(columns={"管理番号": "商品管理番号"})
+        for item in dict.fromkeys(i for genre_items in items.values() for i in genre_items):
+            measured = master["ジャンル"].map(lambda g: item in items.get(g, []))
+            upload[item] = measured.map({True: "45.5", False: ""})
+        checked = check_measurements(upload, texts["商品マスタ"], items, datetime.now().strftime("%Y-%m-%d"))
+        for rows, master_keys in checked.batches():
+            self.journal.enqueue(rows, master_keys)
+        while flush(self.store, self.journal):
+            pass
+        return checked.counts()
+
+    def deviation_update(self):
+        """許容差チェックの再計算：一括取り込みの後の採寸データの継ぎ足し＋追加された行だけの差の計算"""
+        return len(self.deviations.get(self.dataset(self.catalog.select())))
+
+    SCENARIOS = ["load", "entry_select", "entry_prefill", "save", "queued_save", "save_flush", "keyword_search", "search_page",
+                 "deviation_report", "excel_export", "csv_export", "archive_move", "archive_split", "recent_load",
+                 "header_reinit", "product_import", "standard_import", "measurement_import", "deviation_update"]
+
+    def run(self, scenario, trace_memory=True):
+        calls = self.api_calls()
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            result = getattr(self, scenario)()
+            seconds = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+        return {
+            "rows": self.rows,
+            "scenario": scenario,
+            "seconds": round(seconds, 4),
+            "peak_mb": None if peak is None else round(peak / 2 ** 20, 2),
+            "api_calls": self.api_calls() - calls,
+            "result": result,
+        }
+
+
+def run_all(rows_list, backend="sheets", latency=0.0, scenarios=None, trace_memory=True, out=sys.stdout):
+    results = []
+    for rows in rows_list:
+        with tempfile.TemporaryDirectory() as workdir:
+            print(f"\n■ {rows:,} 行（{backend}）", file=out, flush=True)
+            bench = Bench(rows, backend, latency, workdir)
+            print(f"{'シナリオ':<20}{'秒':>10}{'ピークMB':>10}{'API':>6}  結果", file=out)
+            for scenario in Bench.SCENARIOS:
+                if scenarios and scenario not in scenarios and scenario != "load":
+                    continue
+                r = bench.run(scenario, trace_memory)
+                r["backend"] = backend
+                results.append(r)
+                peak = "-" if r["peak_mb"] is None else f"{r['peak_mb']:.1f}"
+                print(f"{scenario:<20}{r['seconds']:>10.3f}{peak:>10}{r['api_calls']:>6}  {r['result']}",
+                      file=out, flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2, min_seconds=0.05):
+    """
+    baseline と比べて悪化したシナリオを返す。
+    実行時間は tolerance（割合）を超えた増加、API 呼び出しは 1 回でも増えたら悪化とみなす。
+    """
+    before = {(b["backend"], b["rows"], b["scenario"]): b for b in baseline}
+    regressions = []
+    for r in results:
+        b = before.get((r["backend"], r["rows"], r["scenario"]))
+        if b is None:
+            continue
+        if r["seconds"] > max(b["seconds"] * (1 + tolerance), min_seconds):
+            regressions.append(f"{r['scenario']}（{r['rows']:,} 行）: {b['seconds']:.3f} → {r['seconds']:.3f} 秒")
+        if r["api_calls"] > b["api_calls"]:
+            regressions.append(f"{r['scenario']}（{r['rows']:,} 行）: API {b['api_calls']} → {r['api_calls']} 回")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="採寸データ管理のオフライン計測")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000],
+                        help="採寸アーカイブの行数（採寸結果・商品マスタはその 1/10）")
+    parser.add_argument("--backend", choices=["sheets", "sqlite"], default="sheets")
+    parser.add_argument("--latency", type=float, default=0.0, help="API 呼び出し 1 回あたりの遅延（秒）")
+    parser.add_argument("--scenario", nargs="+", choices=Bench.SCENARIOS, help="実行するシナリオ（load は常に実行）")
+    parser.add_argument("--no-memory", action="store_true", help="tracemalloc を使わない（実行時間のみ正確に測る）")
+    parser.add_argument("--json", help="結果を JSON で保存するパス")
+    parser.add_argument("--baseline", help="比較対象の JSON（悪化があれば終了コード 1）")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="実行時間の許容増加率")
+    args = parser.parse_args(argv)
+
+    results = run_all(args.rows, args.backend, args.latency, args.scenario, not args.no_memory)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n⚠ 悪化したシナリオ", *regressions, sep="\n- ")
+            return 1
+        print("\n✅ 基準からの悪化なし")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
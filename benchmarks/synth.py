@@ -0,0 +1,110 @@
+# ━━━━━ 計測用の合成データ ━━━━━
+# ideal_order_dict の全ジャンルにわたる 商品マスタ / 採寸テンプレート / 採寸結果 / 採寸アーカイブ / 基準データ を作る。
+# 値はシートから読んだときと同じく文字列。乱数の種を固定しているので同じ引数なら同じデータになる。
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from catalog import ideal_order_dict
+from maintenance import BASE_HEADERS
+
+GENRES = list(ideal_order_dict)
+BRANDS = ["ARTISAN", "BEAMS", "COMME", "DIOR", "EDIFICE", "FENDI", "GUCCI", "HERMES",
+          "ISSEY", "JUNYA", "KAPITAL", "LOEWE", "MARNI", "NEEDLES", "ORSLOW", "PRADA"]
+COLORS = ["ブラック", "ネイビー", "グレー", "ホワイト", "ベージュ", "ブラウン", "カーキ", "レッド"]
+SIZES = ["XS", "S", "M", "L", "XL", "44", "46", "48", "50"]
+WORDS = ["ウール", "コットン", "リネン", "シルク", "カシミヤ", "デニム", "ナイロン", "ツイード",
+         "ストライプ", "チェック", "ヘリンボーン", "ダブル", "シングル", "ワイド", "テーパード"]
+MASTER_COLUMNS = ["管理番号", "ブランド", "ジャンル", "商品名", "カラー", "サイズ"]
+SIZES_PER_PRODUCT = 3
+
+
+def product_ids(models, rng):
+    # 先頭 8 文字が同じモデル（採寸入力の「同じモデルの過去採寸データ」用）
+    model = rng.integers(0, max(1, models // 4), size=models)
+    return pd.Series([f"A{m:07d}{i % 100:02d}" for i, m in enumerate(model)])
+
+
+def products(n, seed=0):
+    """n 行分の商品（1 商品につき SIZES_PER_PRODUCT サイズ）"""
+    rng = np.random.default_rng(seed)
+    count = max(1, -(-n // SIZES_PER_PRODUCT))
+    pids = product_ids(count, rng)
+    genre = np.asarray(GENRES)[rng.integers(0, len(GENRES), size=count)]
+    brand = np.asarray(BRANDS)[rng.integers(0, len(BRANDS), size=count)]
+    color = np.asarray(COLORS)[rng.integers(0, len(COLORS), size=count)]
+    w1 = np.asarray(WORDS)[rng.integers(0, len(WORDS), size=count)]
+    w2 = np.asarray(WORDS)[rng.integers(0, len(WORDS), size=count)]
+    name = pd.Series(w1).str.cat([pd.Series(w2), pd.Series(genre)], sep=" ")
+    first = rng.integers(0, len(SIZES) - SIZES_PER_PRODUCT + 1, size=count)
+    df = pd.DataFrame({
+        "管理番号": np.repeat(pids.to_numpy(), SIZES_PER_PRODUCT),
+        "ブランド": np.repeat(brand, SIZES_PER_PRODUCT),
+        "ジャンル": np.repeat(genre, SIZES_PER_PRODUCT),
+        "商品名": np.repeat(name.to_numpy(), SIZES_PER_PRODUCT),
+        "カラー": np.repeat(color, SIZES_PER_PRODUCT),
+        "サイズ": np.asarray(SIZES)[(np.repeat(first, SIZES_PER_PRODUCT)
+                                     + np.tile(np.arange(SIZES_PER_PRODUCT), count))],
+    })
+    return df.iloc[:n].reset_index(drop=True)
+
+
+def master(n, seed=0):
+    return products(n, seed)[MASTER_COLUMNS]
+
+
+def template():
+    return pd.DataFrame({
+        "ジャンル": GENRES,
+        "採寸項目": ["、".join(dict.fromkeys(items)) for items in ideal_order_dict.values()],
+    })
+
+
+def measurements(n, seed=0, today=None, days=365):
+    """
+    n 行分の採寸データ。日付は today から days 日前までに散らす。
+    ジャンルの採寸項目だけ値を入れ、その他の項目は空欄。
+    """
+    rng = np.random.default_rng(seed)
+    today = today or datetime.now()
+    base = products(n, seed).rename(columns={"管理番号": "商品管理番号"})
+    offsets = rng.integers(0, days + 1, size=len(base))
+    dates = pd.Series(pd.to_datetime(today.date()) - pd.to_timedelta(offsets, unit="D")).dt.strftime("%Y-%m-%d")
+    df = pd.DataFrame("", index=base.index, columns=BASE_HEADERS, dtype=object)
+    df["日付"] = dates
+    for col in base.columns:
+        df[col] = base[col]
+    values = rng.integers(200, 900, size=len(base)) / 10
+    for genre, items in ideal_order_dict.items():
+        mask = (base["ジャンル"] == genre).to_numpy()
+        if not mask.any():
+            continue
+        for offset, item in enumerate(dict.fromkeys(items)):
+            if item in df.columns:
+                df.loc[mask, item] = (values[mask] + offset * 3.5).round(1).astype(str)
+    remarks = np.where(rng.random(len(base)) < 0.1, "ほつれあり", "")
+    df["備考"] = remarks
+    return df
+
+
+def to_values(df):
+    """シートの値（1 行目がヘッダーの二次元リスト）"""
+    return [df.columns.tolist()] + df.astype(str).values.tolist()
+
+
+def workbook(rows, seed=0, today=None):
+    """
+    採寸アーカイブ rows 行を基準に、採寸結果・商品マスタ・基準データは 1/10 の行数で作る。
+    採寸結果は直近 60 日（アーカイブ管理で約半分が移動対象）、アーカイブは 1 年分。
+    商品マスタ・基準データは採寸結果と同じ商品（初期値・基準値の表示が該当ありになる）。
+    """
+    today = today or datetime.now()
+    small = max(SIZES_PER_PRODUCT * 10, rows // 10)
+    return {
+        "商品マスタ": master(small, seed),
+        "採寸テンプレート": template(),
+        "採寸結果": measurements(small, seed, today, days=60),
+        "採寸アーカイブ": measurements(rows, seed + 1, today - timedelta(days=60), days=365),
+        "基準データ": measurements(small, seed, today, days=0),
+    }
@@ -0,0 +1,29 @@
+# ━━━━━ 採寸項目の定義 ━━━━━
+# ジャンルごとの採寸項目の表示順。採寸入力・採寸検索のほか、計測用のデータ生成からも参照する。
+
+# ━━━━━ 項目の表示順辞書 ━━━━━
+ideal_order_dict = {
+    "ジャケット": ["肩幅", "胸幅", "胴囲", "袖丈", "着丈"],
+    "パンツ": ["ウエスト", "股上", "股下", "ワタリ", "裾幅"],
+    "ダウン": ["肩幅", "胸幅", "袖丈", "着丈", "襟高"],
+    "ブルゾン": ["肩幅", "胸幅", "袖丈", "着丈", "襟高"],
+    "コート": ["肩幅", "胸幅", "胴囲", "袖丈", "着丈", "襟高"],
+    "ニット": ["肩幅", "胸幅", "袖丈", "着丈", "首高"],
+    "カットソー": ["肩幅", "胸幅", "袖丈", "着丈"],
+    "レザー": ["肩幅", "胸幅", "袖丈", "着丈", "襟高"],
+    "靴": ["全長", "最大幅"],
+    "巻物": ["全長", "横幅"],
+    "小物・その他": ["頭周り", "ツバ", "高さ", "横幅", "高さ", "マチ"],
+    "シャツ": ["肩幅", "裄丈", "胸幅", "胴囲", "袖丈", "着丈"],
+    "シャツジャケット": ["肩幅", "胸幅", "袖丈", "着丈"],
+    "スーツ": ["肩幅", "胸幅", "胴囲", "袖丈", "着丈", "ウエスト", "股上", "股下", "ワタリ", "裾幅"],
+    "ベルト": ["全長", "ベルト幅"],
+    "半袖": ["肩幅", "胸幅", "袖丈", "前丈", "後丈"],
+    "ラグラン": ["裄丈", "胸幅", "着丈"]
+}
+
+# 採寸入力で先頭に並べる項目（テンプレートの並びより優先）
+custom_orders = {
+    "パンツ": ["ウエスト", "股上", "ワタリ", "股下", "裾幅"],
+    "シャツ": ["肩幅", "胸幅", "胴囲", "裄丈", "袖丈", "着丈"]
+}
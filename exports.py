@@ -0,0 +1,106 @@
+# ━━━━━ 検索結果のダウンロード ━━━━━
+# 出力ファイルは「作成」を押したときだけ一時ファイルに書き出す（再実行のたびには作らない）。
+# 行は EXPORT_CHUNK_ROWS 行ずつ書くので、メモリに載るのは表とチャンク 1 つ分だけ。
+#   - xlsx: openpyxl の write_only モード（オートフィルタ付き）
+#   - csv: Excel で開けるよう BOM 付き UTF-8
+#   - parquet: pyarrow がある場合のみ（大量の取り出し向け）
+# 一時ファイルは名前に EXPORT_PREFIX を付け、作るたびに EXPORT_MAX_AGE 秒より古いものを消す
+# （セッションが終わって呼び出し側が消せなかったものも残らない）。
+import os
+import tempfile
+import time
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow がなければ parquet は選べない
+    pa = pq = None
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_PREFIX = "measuring-export-"
+EXPORT_MAX_AGE = 3600  # 秒
+
+
+def chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def write_xlsx(df, path, sheet_name="採寸結果", chunk_rows=EXPORT_CHUNK_ROWS):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.auto_filter.ref = f"A1:{get_column_letter(max(1, len(df.columns)))}{len(df) + 1}"
+    ws.append([str(c) for c in df.columns])
+    for chunk in chunks(df, chunk_rows):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(path)
+
+
+def write_csv(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        for i, chunk in enumerate(chunks(df, chunk_rows)):
+            chunk.to_csv(f, index=False, header=i == 0)
+        if df.empty:
+            df.to_csv(f, index=False)
+
+
+def write_parquet(df, path, chunk_rows=EXPORT_CHUNK_ROWS):
+    # 列の型がチャンクごとに変わらないよう文字列に揃える（シートの値はもともと文字列）
+    schema = pa.schema([(str(c), pa.string()) for c in df.columns])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks(df, chunk_rows):
+            text = chunk.astype("string").set_axis(schema.names, axis=1)
+            writer.write_table(pa.Table.from_pandas(text, schema, preserve_index=False))
+
+
+class Format:
+    def __init__(self, label, extension, mime, writer):
+        self.label = label
+        self.extension = extension
+        self.mime = mime
+        self.writer = writer
+
+
+FORMATS = {
+    "xlsx": Format("Excel", ".xlsx", XLSX_MIME, write_xlsx),
+    "csv": Format("CSV", ".csv", "text/csv", write_csv),
+}
+if pq is not None:
+    FORMATS["parquet"] = Format("Parquet", ".parquet", "application/vnd.apache.parquet", write_parquet)
+
+
+def sweep(directory=None, max_age=EXPORT_MAX_AGE):
+    """directory（省略時は一時ディレクトリ）の出力ファイルのうち max_age 秒より古いものを消す"""
+    directory = directory or tempfile.gettempdir()
+    limit = time.time() - max_age
+    for entry in os.scandir(directory):
+        if not entry.name.startswith(EXPORT_PREFIX):
+            continue
+        try:
+            if entry.stat().st_mtime < limit:
+                os.remove(entry.path)
+        except OSError:
+            pass  # ほかのプロセスが先に消した
+
+
+def export(df, fmt="xlsx", directory=None):
+    """
+    df を一時ファイルに書き出してパスを返す（不要になったら呼び出し側で消す。
+    消されなかったものも EXPORT_MAX_AGE 秒後の次の export で消える）
+    """
+    sweep(directory)
+    spec = FORMATS[fmt]
+    fd, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix=spec.extension, dir=directory)
+    os.close(fd)
+    try:
+        spec.writer(df, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,251 @@
+# ━━━━━ Excel インポートの差分計算 ━━━━━
+# アップロードされた表を、シートの現在の内容とキー列で突き合わせて
+#   追加（キーがシートにない行）／更新（キーはあるが値が変わった行）／変更なし
+# に分ける。シートは丸ごと書き直さず、追加は append、更新は変わったセルだけを patch で書く。
+# 画面のプレビューはミラーの内容で分けるが、保存（save_diff）は他の書き込みを止めて全件を読み直してから分け直す
+# （ミラーが古いと、シートにあるキーを追加に分けて同じ商品の行が重複するため）。
+# 基準値のようにキー単位で丸ごと置き換えるものは、該当キーの行だけ delete してから append する
+# （消すキーはミラーから選ばずアップロードの全キーを渡す。delete が書き込みの直前にキー列を読み直す）。
+# 採寸の一括取り込みは、商品マスタ・採寸テンプレートと表全体で突き合わせて検証し、取り込めない行を理由付きで返す。
+import re
+
+import numpy as np
+import pandas as pd
+
+from catalog import custom_orders
+from sheets import key_str
+from storage import to_text
+
+PRODUCT_KEYS = ["管理番号", "サイズ"]         # 商品マスタの 1 行を特定する列
+STANDARD_KEYS = ["商品管理番号", "サイズ"]     # 基準データで置き換える単位
+MEASUREMENT_KEYS = ["商品管理番号", "サイズ"]  # 一括取り込みのファイルで商品マスタの行を指す列
+PRODUCT_COLUMNS = ["ブランド", "ジャンル", "商品名", "カラー"]  # 一括取り込みで商品マスタから引き継ぐ列
+IMPORT_CHUNK_ROWS = 2000  # 一括取り込みで 1 回のバッチに載せる行数
+
+
+def read_upload(file):
+    """アップロードされた xlsx / csv を文字列の表として読む（空欄は ""）"""
+    if file.name.lower().endswith(".csv"):
+        try:
+            return pd.read_csv(file, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        except UnicodeDecodeError:  # Excel で保存した Shift_JIS の CSV
+            file.seek(0)
+            return pd.read_csv(file, dtype=str, keep_default_na=False, encoding="cp932")
+    return pd.read_excel(file, dtype=str, keep_default_na=False)
+
+
+def template_items(template_df):
+    """ジャンル → 採寸項目（採寸テンプレートの並び。custom_orders の項目を先頭に）"""
+    items = {}
+    for genre, raw in zip(template_df["ジャンル"].astype(str), template_df["採寸項目"].astype(str)):
+        if genre in items:
+            continue
+        all_items = [re.sub(r"（.*?）", "", i).strip() for i in raw.replace("、", ",").split(",") if i.strip()]
+        order = custom_orders.get(genre, [])
+        items[genre] = [i for i in order if i in all_items] + [i for i in all_items if i not in order]
+    return items
+
+
+def text_frame(df):
+    """保存するときと同じ文字列に揃える（1.0 → "1"、欠損 → ""）"""
+    return df.apply(lambda col: col.map(to_text)).astype(object) if len(df.columns) else df
+
+
+def key_index(df, key_cols):
+    """キー列の MultiIndex（1.0 と "1" は同じキー）"""
+    return pd.MultiIndex.from_arrays([df[c].map(key_str) for c in key_cols], names=key_cols)
+
+
+class ImportDiff:
+    """diff_by_key の結果"""
+
+    def __init__(self, inserted, updated, changes, unchanged, unknown_columns):
+        self.inserted = inserted      # 追加する行（DataFrame）
+        self.updated = updated        # 更新される行の新しい値（プレビュー用の DataFrame）
+        self.changes = changes        # patch に渡す行（キー列＋変わった列だけ）
+        self.unchanged = unchanged    # 変更なしの行数
+        self.unknown_columns = unknown_columns  # シートにない列（既存行の更新では無視される）
+
+    def counts(self):
+        return {"追加": len(self.inserted), "更新": len(self.updated), "変更なし": self.unchanged}
+
+
+def diff_by_key(current, incoming, key_cols):
+    """
+    current（シートの内容）と incoming（アップロード）をキー列で突き合わせる。
+    アップロード内で同じキーが重なった行は後の行を使う。
+    """
+    incoming = text_frame(incoming)
+    incoming = incoming[~key_index(incoming, key_cols).duplicated(keep="last")].reset_index(drop=True)
+    if current.empty or not set(key_cols).issubset(current.columns):
+        return ImportDiff(incoming, incoming.iloc[0:0], [], 0, [])
+
+    current_keys = key_index(current, key_cols)
+    first = ~current_keys.duplicated()
+    current, current_keys = current[first], current_keys[first]
+    positions = current_keys.get_indexer(key_index(incoming, key_cols))
+    found = positions >= 0
+
+    columns = [c for c in incoming.columns if c not in key_cols and c in current.columns]
+    matched = incoming[found]
+    new_values = matched[columns].to_numpy(dtype=object)
+    old_values = current[columns].iloc[positions[found]].fillna("").astype(str).to_numpy(dtype=object)
+    changed = new_values != old_values
+    rows = changed.any(axis=1)
+
+    changes = []
+    for i in np.flatnonzero(rows):
+        record = {c: matched[c].iat[i] for c in key_cols}
+        record.update((columns[j], new_values[i, j]) for j in np.flatnonzero(changed[i]))
+        changes.append(record)
+    unknown = [c for c in incoming.columns if c not in current.columns]
+    return ImportDiff(incoming[~found], matched[rows], changes, int((~rows).sum()), unknown)
+
+
+def save_diff(store, title, incoming, key_cols):
+    """
+    title を全件読み直した内容と incoming を突き合わせ直し、追加と変わったセルだけを書く。
+    読み直してから書き込むまで title への他の書き込みを止める。保存した ImportDiff を返す。
+    """
+    with store.hold([title]):
+        store.refresh([title], full=True)
+        diff = diff_by_key(store.read(title), incoming, key_cols)
+        with store.batch():
+            store.append(title, diff.inserted)
+            store.patch(title, key_cols, diff.changes)
+    return diff
+
+
+def replaced_keys(current, incoming, key_cols):
+    """
+    incoming のキーのうち current にあるもの（置き換えで消す行のキー）を MultiIndex の突き合わせで求める。
+    (消すキーのリスト, 消える current の行数, 新しいキーの数) を返す。プレビューの件数用
+    （current はミラーの内容なので、保存は replace_by_key で全キーを渡す）。
+    """
+    incoming_keys = key_index(incoming, key_cols).unique()
+    if current.empty or not set(key_cols).issubset(current.columns):
+        return [], 0, len(incoming_keys)
+    current_keys = key_index(current, key_cols)
+    hit = incoming_keys.isin(current_keys)
+    removed = int(current_keys.isin(incoming_keys).sum())
+    return incoming_keys[hit].tolist(), removed, int((~hit).sum())
+
+
+def replace_by_key(store, title, incoming, key_cols):
+    """incoming の全キーの行を消してから incoming を追加する（1 回のバッチ。シートにないキーは delete が無視する）"""
+    with store.batch():
+        store.delete(title, key_cols, key_index(incoming, key_cols).unique().tolist())
+        store.append(title, incoming)
+
+
+class MeasurementImport:
+    """check_measurements の結果"""
+
+    def __init__(self, rows, master_keys, errors, skipped, unknown_columns):
+        self.rows = rows                # 採寸結果に追加する行（DataFrame）
+        self.master_keys = master_keys  # 商品マスタから消す (管理番号, サイズ)（rows と同じ並び）
+        self.errors = errors            # 取り込めない行（行・商品管理番号・サイズ・理由）
+        self.skipped = skipped          # 採寸値が 1 つもなく飛ばした行数
+        self.unknown_columns = unknown_columns  # 採寸項目でも商品の列でもない列（無視する）
+
+    def counts(self):
+        return {"取り込み": len(self.rows), "エラー": len(self.errors), "空行": self.skipped}
+
+    def batches(self, chunk_rows=IMPORT_CHUNK_ROWS):
+        """(追加する行, 商品マスタから消すキー) を chunk_rows 行ずつ"""
+        for start in range(0, len(self.rows), chunk_rows):
+            yield (self.rows.iloc[start:start + chunk_rows].to_dict("records"),
+                   self.master_keys[start:start + chunk_rows])
+
+
+def check_measurements(upload, master, items_by_genre, today):
+    """
+    一括取り込みのファイル（商品管理番号・サイズ＋採寸項目の列）を検証する。
+    商品マスタとは (管理番号, サイズ) の MultiIndex で、採寸項目はジャンル×列の表で一度に突き合わせる。
+    ブランド・ジャンル・商品名・カラーは商品マスタの値を使う。日付の列がなければ／空なら today。
+    """
+    upload = text_frame(upload)
+    upload.columns = [str(c).strip() for c in upload.columns]
+    upload = upload.loc[:, upload.columns != ""]
+    if "商品管理番号" not in upload.columns and "管理番号" in upload.columns:
+        upload = upload.rename(columns={"管理番号": "商品管理番号"})
+    missing = [c for c in MEASUREMENT_KEYS if c not in upload.columns]
+    if missing:
+        raise ValueError(f"必要な列がありません: {', '.join(missing)}")
+    upload = upload.apply(lambda col: col.str.strip()).reset_index(drop=True)
+
+    known_items = dict.fromkeys(i for items in items_by_genre.values() for i in items)
+    item_cols = [c for c in upload.columns if c in known_items]
+    unknown = [c for c in upload.columns
+               if c not in known_items and c not in MEASUREMENT_KEYS + PRODUCT_COLUMNS + ["日付", "備考"]]
+    values = upload[item_cols].to_numpy(dtype=object)
+    filled = values != ""
+    measured = filled.any(axis=1)
+
+    # 商品マスタとの突き合わせ
+    master_index = key_index(master, PRODUCT_KEYS) if set(PRODUCT_KEYS).issubset(master.columns) else None
+    if master_index is None or master.empty:
+        positions = np.full(len(upload), -1)
+    else:
+        first = ~master_index.duplicated()
+        master, master_index = master[first], master_index[first]
+        positions = master_index.get_indexer(key_index(upload, MEASUREMENT_KEYS))
+    found = positions >= 0
+    genres = np.full(len(upload), "", dtype=object)
+    if found.any():
+        genres[found] = master["ジャンル"].astype(str).to_numpy(dtype=object)[positions[found]]
+
+    # ジャンルごとの採寸項目（最後の行はテンプレートのないジャンル用の全 False）
+    genre_list = list(items_by_genre)
+    allowed_table = np.array(
+        [[c in items_by_genre[g] for c in item_cols] for g in genre_list] + [[False] * len(item_cols)], dtype=bool
+    )
+    codes = pd.Index(genre_list, dtype=object).get_indexer(genres)
+    outside = filled & ~allowed_table[codes]
+
+    numbers = pd.to_numeric(pd.Series(values[filled], dtype=object), errors="coerce").to_numpy(dtype=float)
+    not_number = np.zeros_like(filled)
+    not_number[filled] = np.isnan(numbers)
+
+    if "日付" in upload.columns:
+        raw_dates = upload["日付"]
+        parsed = pd.to_datetime(raw_dates.where(raw_dates != ""), errors="coerce", format="mixed")
+        bad_date = ((raw_dates != "") & parsed.isna()).to_numpy()
+        dates = parsed.dt.strftime("%Y-%m-%d").where(parsed.notna(), today).to_numpy(dtype=object)
+    else:
+        bad_date = np.zeros(len(upload), dtype=bool)
+        dates = np.full(len(upload), today, dtype=object)
+
+    no_key = ((upload["商品管理番号"] == "") | (upload["サイズ"] == "")).to_numpy()
+    duplicated = key_index(upload, MEASUREMENT_KEYS).duplicated(keep="last") & measured & ~no_key
+    checks = [
+        (no_key, "商品管理番号・サイズが空"),
+        (duplicated, "ファイル内の後の行と同じ商品・サイズ"),
+        (~found, "商品マスタにない（採寸済み、または未登録）"),
+        (codes < 0, "ジャンルの採寸テンプレートがない"),
+        (bad_date, "日付が読めない"),
+        (outside.any(axis=1), "テンプレートにない項目"),
+        (not_number.any(axis=1), "数値でない値"),
+    ]
+    failed = np.select([c & measured for c, _ in checks], list(range(len(checks))), default=-1)
+
+    errors = []
+    for i in np.flatnonzero(failed >= 0):
+        reason = checks[failed[i]][1]
+        bad_cols = outside[i] if reason == "テンプレートにない項目" else not_number[i]
+        if reason in ("テンプレートにない項目", "数値でない値"):
+            reason += ": " + ", ".join(c for c, bad in zip(item_cols, bad_cols) if bad)
+        errors.append({"行": i + 2, "商品管理番号": upload["商品管理番号"].iat[i], "サイズ": upload["サイズ"].iat[i],
+                       "理由": reason})
+    errors = pd.DataFrame(errors, columns=["行", "商品管理番号", "サイズ", "理由"])
+
+    ok = measured & (failed < 0)
+    products = master.iloc[positions[ok]].reindex(columns=PRODUCT_KEYS + PRODUCT_COLUMNS, fill_value="")
+    rows = {"日付": dates[ok], "商品管理番号": products["管理番号"].to_numpy(dtype=object)}
+    rows.update((c, products[c].to_numpy(dtype=object)) for c in PRODUCT_COLUMNS)
+    rows["サイズ"] = products["サイズ"].to_numpy(dtype=object)
+    rows["備考"] = upload["備考"].to_numpy(dtype=object)[ok] if "備考" in upload.columns else ""
+    rows.update((c, values[ok, j]) for j, c in enumerate(item_cols))
+    rows = pd.DataFrame(rows, index=pd.RangeIndex(int(ok.sum())))
+    master_keys = list(zip(rows["商品管理番号"], rows["サイズ"]))
+    return MeasurementImport(rows, master_keys, errors, int((~measured).sum()), unknown)
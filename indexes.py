@@ -0,0 +1,286 @@
+# ━━━━━ 検索・参照用インデックス ━━━━━
+# 毎回の再実行で DataFrame 全体を走査しないための前計算済みインデックス。
+import re
+import threading
+import unicodedata
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from imports import template_items
+from normalize import widened
+from sheets import parse_dates
+from storage import to_text
+
+# キーワード検索の対象列
+SEARCH_COLUMNS = ["商品名", "商品管理番号", "ブランド", "カラー", "備考"]
+FIELD_SEP = "\x1f"  # 列の区切り（前方一致の判定にも使う）
+DIGITS = re.compile(r"\d+")
+PRODUCT_COLUMNS = ["ジャンル", "商品名", "カラー"]  # 採寸入力で使う商品の列
+
+
+def normalize_text(s):
+    # 全角・半角や大文字・小文字の違いを吸収
+    return unicodedata.normalize("NFKC", s).lower()
+
+
+def stripped(col):
+    """列を前後の空白を除いた文字列の配列に（カテゴリ型は種類ごとに 1 回だけ変換）"""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        categories = np.asarray(col.cat.categories.astype(str).str.strip(), dtype=object)
+        return np.append(categories, "")[col.cat.codes.to_numpy()]
+    return np.asarray(col.astype(str).str.strip(), dtype=object)
+
+
+def parse_query(query):
+    """空白区切りで複数語（AND）。末尾 * はいずれかの列の前方一致"""
+    terms = []
+    for word in normalize_text(query).split():
+        if word.endswith("*") and len(word) > 1:
+            terms.append((word[:-1], True))
+        elif word != "*":
+            terms.append((word, False))
+    return terms
+
+
+def row_texts(df, columns=SEARCH_COLUMNS):
+    """対象列を正規化して区切り文字でつないだ行テキスト（先頭・末尾にも区切りを付ける）"""
+    cols = [c for c in columns if c in df.columns]
+    if not cols or df.empty:
+        return [FIELD_SEP] * len(df)
+    parts = [df[c].astype(str).str.normalize("NFKC").str.lower() for c in cols]
+    joined = parts[0].str.cat(parts[1:], sep=FIELD_SEP) if len(parts) > 1 else parts[0]
+    return (FIELD_SEP + joined + FIELD_SEP).tolist()
+
+
+def text_matches(text, terms):
+    return all((FIELD_SEP + t) in text if prefix else t in text for t, prefix in terms)
+
+
+# ━━━━━ 文字 n-gram 転置インデックス ━━━━━
+class NGramIndex:
+    """
+    日本語のように単語の区切りがないテキストでも部分一致できるよう、文字 n-gram ごとに行番号を持つ。
+    行は追加順（DataFrame の行位置）で管理し、末尾への追加は差分だけ索引する。
+    """
+
+    def __init__(self, columns=SEARCH_COLUMNS, n=2):
+        self.columns = columns
+        self.n = n
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.postings = {}  # n-gram → 行番号の array（昇順）
+        self.texts = []     # 正規化済みの行テキスト（候補の確認用）
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, df):
+        texts = row_texts(df, self.columns)
+        n = self.n
+        start = len(self.texts)
+        for row_id, text in enumerate(texts, start):
+            for gram in {text[i:i + n] for i in range(len(text) - n + 1)}:
+                if FIELD_SEP in gram:
+                    continue
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array("I")
+                posting.append(row_id)
+        self.texts.extend(texts)
+
+    def sync(self, df):
+        """df が索引済みの行の末尾追加であれば差分だけ追加し、そうでなければ作り直す"""
+        with self.lock:
+            indexed = len(self.texts)
+            if indexed and (
+                indexed > len(df)
+                or row_texts(df.iloc[[0, indexed - 1]], self.columns) != [self.texts[0], self.texts[-1]]
+            ):
+                self.reset()
+                indexed = 0
+            if len(df) > indexed:
+                self.add(df.iloc[indexed:])
+
+    def _candidates(self, term):
+        grams = {term[i:i + self.n] for i in range(len(term) - self.n + 1)}
+        postings = []
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.uint32)
+            postings.append(np.frombuffer(posting, dtype=np.uint32) if len(posting) else np.empty(0, dtype=np.uint32))
+        postings.sort(key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, posting, assume_unique=True)
+        return result
+
+    def search(self, query):
+        """一致した行番号（昇順の numpy 配列）を返す"""
+        terms = parse_query(query)
+        with self.lock:
+            if not terms:
+                return np.arange(len(self.texts))
+            # n 文字以上の語は n-gram の積集合で候補を絞り、短い語だけ候補内を確認
+            long_terms = [t for t, _ in terms if len(t) >= self.n]
+            if long_terms:
+                candidates = None
+                for term in sorted(long_terms, key=len, reverse=True):
+                    hits = self._candidates(term)
+                    candidates = hits if candidates is None else np.intersect1d(candidates, hits, assume_unique=True)
+                    if not len(candidates):
+                        break
+            else:
+                candidates = np.arange(len(self.texts))
+            texts = self.texts
+            return np.array(
+                [i for i in candidates.tolist() if text_matches(texts[i], terms)], dtype=np.int64
+            )
+
+
+# ━━━━━ (商品管理番号, サイズ) → 最新の採寸行 ━━━━━
+class MeasurementLookup:
+    """
+    採寸入力の初期値用。同じ (商品管理番号, サイズ) が複数あれば日付が最新の行を採用する
+    （同日なら元の並び順で先の行）。データ再読み込み時に作り直し、行の挿入だけなら extended で更新する。
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.positions = {}
+        if frame.empty or not {"商品管理番号", "サイズ"}.issubset(frame.columns):
+            return
+        keys = pd.Series(stripped(frame["商品管理番号"]) + FIELD_SEP + stripped(frame["サイズ"]))
+        if "日付" in frame.columns:
+            dates = parse_dates(frame["日付"]).reset_index(drop=True)
+            keys = keys.iloc[dates.sort_values(ascending=False, na_position="last", kind="stable").index]
+        first = keys[~keys.duplicated(keep="first")]
+        self.positions = dict(zip(first.tolist(), first.index.tolist()))
+
+    def extended(self, frame, at, count):
+        """
+        frame（self.frame の at の位置に count 行を挿入したもの）用の新しい索引。
+        既存の位置をずらし、挿入した行のキーだけ採用するかを比べる。
+        """
+        lookup = MeasurementLookup.__new__(MeasurementLookup)
+        lookup.frame = frame
+        lookup.positions = {k: p + count if p >= at else p for k, p in self.positions.items()}
+        if not count or not {"商品管理番号", "サイズ"}.issubset(frame.columns):
+            return lookup
+        new = frame.iloc[at:at + count]
+        keys = stripped(new["商品管理番号"]) + FIELD_SEP + stripped(new["サイズ"])
+        candidates = {}
+        for i, key in enumerate(keys):
+            candidates.setdefault(key, []).append(at + i)
+            if key in lookup.positions:
+                candidates[key].append(lookup.positions[key])
+        if "日付" in frame.columns:
+            positions = sorted({p for ps in candidates.values() for p in ps})
+            dates = dict(zip(positions, parse_dates(frame["日付"].iloc[positions])))
+        else:
+            dates = {}
+
+        def rank(p):  # 日付が新しい（NaT は最後）→ 元の並び順で先
+            d = dates.get(p, pd.NaT)
+            return (pd.isna(d), -(d.value if not pd.isna(d) else 0), p)
+
+        for key, ps in candidates.items():
+            lookup.positions[key] = min(ps, key=rank)
+        return lookup
+
+    def position(self, pid, size):
+        return self.positions.get(str(pid).strip() + FIELD_SEP + str(size).strip())
+
+    def rows(self, pid, sizes, columns):
+        """サイズごとの行を columns だけ取り出した表（該当なしは空文字）"""
+        columns = list(dict.fromkeys(columns))
+        positions = [self.position(pid, size) for size in sizes]
+        table = pd.DataFrame("", index=[str(s) for s in sizes], columns=columns, dtype=object)
+        table.index.name = "サイズ"
+        hit = [i for i, p in enumerate(positions) if p is not None]
+        cols = [c for c in columns if c in self.frame.columns]
+        if hit and cols:
+            picked = widened(self.frame.iloc[[positions[i] for i in hit]][cols]).astype(object).map(to_text)
+            table.iloc[hit, [columns.index(c) for c in cols]] = picked.values
+        return table.astype(str)
+
+
+def natural_key(pid):
+    """管理番号の並び順（最初の数字の並びの数値順。数字がなければ最後）"""
+    found = DIGITS.search(pid)
+    return int(found.group()) if found else float("inf")
+
+
+class ProductIndex:
+    """
+    採寸入力の選択肢用。商品マスタ・採寸テンプレートから 1 回だけ作り、選択のたびには辞書を引くだけにする。
+      brands: ブランド（商品マスタの並び）
+      ブランド → 管理番号（数値順）、(ブランド, 管理番号) → サイズ・商品の列、ジャンル → 採寸項目
+    """
+
+    def __init__(self, master, template):
+        self.brands = []
+        self.pid_lists = {}
+        self.size_lists = {}
+        self.products = {}
+        self.genre_items = template_items(template) if {"ジャンル", "採寸項目"}.issubset(template.columns) else {}
+        if master.empty or not {"ブランド", "管理番号", "サイズ"}.issubset(master.columns):
+            return
+        master = master.dropna(subset=["ブランド", "管理番号"])
+        brand = master["ブランド"].astype(str).to_numpy(dtype=object)
+        pid = master["管理番号"].astype(str).to_numpy(dtype=object)
+        for key, size in zip(zip(brand, pid), master["サイズ"].astype(str).to_numpy(dtype=object)):
+            self.size_lists.setdefault(key, []).append(size)
+
+        first = ~pd.MultiIndex.from_arrays([brand, pid]).duplicated()
+        columns = [master[c].astype(object).to_numpy() if c in master.columns else np.full(len(master), "", object)
+                   for c in PRODUCT_COLUMNS]
+        for b, p, *values in zip(brand[first], pid[first], *[c[first] for c in columns]):
+            self.products[(b, p)] = dict(zip(PRODUCT_COLUMNS, values))
+            self.pid_lists.setdefault(b, []).append(p)
+        self.brands = list(self.pid_lists)
+        for b, pids in self.pid_lists.items():
+            pids.sort(key=natural_key)
+
+    def pids(self, brand, hidden=()):
+        """brand の管理番号（hidden の (管理番号, サイズ) で全サイズが隠れる商品は除く）"""
+        pids = self.pid_lists.get(brand, [])
+        if hidden:
+            gone = {p for p, _ in hidden if all((p, s) in hidden for s in self.size_lists.get((brand, p), []))}
+            pids = [p for p in pids if p not in gone]
+        return pids
+
+    def sizes(self, brand, pid, hidden=()):
+        return [s for s in self.size_lists.get((brand, pid), []) if (pid, s) not in hidden]
+
+    def product(self, brand, pid):
+        return self.products[(brand, pid)]
+
+    def items(self, genre):
+        return self.genre_items.get(str(genre), [])
+
+
+class ProductIndexCache:
+    """ProductIndex（プロセスで 1 つを全セッションで共有）。商品マスタ・採寸テンプレートのバージョンが変わったら作り直す"""
+
+    def __init__(self, typed):
+        self.typed = typed  # normalize.TypedCache
+        self.cached = (None, None)
+        self.lock = threading.Lock()
+
+    def get(self):
+        store = self.typed.store
+        versions = (store.version("商品マスタ"), store.version("採寸テンプレート"))
+        with self.lock:
+            cached_versions, index = self.cached
+        if cached_versions != versions:
+            index = ProductIndex(self.typed.get("商品マスタ"), self.typed.get("採寸テンプレート"))
+            with self.lock:
+                self.cached = (versions, index)
+        return index
@@ -0,0 +1,253 @@
+# ━━━━━ 採寸の保存キュー（ローカルの保存ジャーナル） ━━━━━
+# 採寸入力の保存は、まずローカルの SQLite（WAL）に書いてすぐに完了とし、
+# 裏のスレッドがまとめて 採寸結果への追加＋商品マスタからの削除 を 1 回のバッチで送る。
+# 採寸の一括取り込みも IMPORT_CHUNK_ROWS 行ずつのジョブとして同じキューに入れる。
+#   - DUPLICATE_SEC 秒以内の同じ内容の保存（Enter の二度押しなど）は 1 件にしかならない
+#   - 行の「保存ID」列にジョブのキーを書く。送ったかどうか分からないジョブ（送信中に止まった・失敗した）を
+#     再送するときは、同じ保存IDの行だけを消してから追加するので重複しない（ほかの行には触らない）
+#   - 失敗したジョブは retry_delay 秒ごとに再送する。件数と最後のエラーは画面に出す
+#   - 送信にかかった API 呼び出し回数と時間（ApiStats.summary）をジョブに残し、直近の送信として画面に出す
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from storage import to_text
+
+SAVE_ID = "保存ID"     # 採寸結果の行を書いたジョブのキー
+DUPLICATE_SEC = 10    # 同じ内容の保存を 1 件にまとめる期間
+FLUSH_JOBS = 20       # 1 回のバッチで送るジョブ数の上限
+FLUSH_ROWS = 2000     # 1 回のバッチで送る行数の上限（一括取り込みの大きなジョブは 1 件ずつ）
+FLUSH_INTERVAL = 5    # 裏のスレッドが送信待ちを確認する間隔（秒）
+RETRY_DELAY = 30      # 失敗したジョブを再送するまでの秒数
+KEEP_DONE_SEC = 86400  # 送信済みのジョブを残す期間
+
+
+def digest(rows):
+    """保存内容のハッシュ（二度押しの判定用）"""
+    return hashlib.sha1(json.dumps(rows, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SaveJournal:
+    """
+    保存ジョブの記録。status は pending（送信待ち）／sending（送信中）／failed（失敗・再送待ち）／done（送信済み）。
+    sending のまま残ったジョブは、送れたかどうか分からないものとして再送する。
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")  # 完了を返した保存は電源断でも消えないように
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS save_jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " key TEXT NOT NULL UNIQUE,"
+            " digest TEXT NOT NULL DEFAULT '',"
+            " rows TEXT NOT NULL,"
+            " master_keys TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_try REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " error TEXT,"
+            " sent_stats TEXT)"
+        )
+        columns = [r[1] for r in self.conn.execute("PRAGMA table_info(save_jobs)")]
+        # 以前の版のジャーナルに足りない列
+        for name, definition in [("digest", "TEXT NOT NULL DEFAULT ''"), ("sent_stats", "TEXT")]:
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE save_jobs ADD COLUMN {name} {definition}")
+        self.lock = threading.Lock()
+
+    def enqueue(self, rows, master_keys):
+        """
+        rows: 採寸結果に追加する行、master_keys: 商品マスタから消す (管理番号, サイズ)。
+        ジャーナルに書いた時点で戻る。DUPLICATE_SEC 秒以内に同じ内容があれば何もしない。ジョブのキーを返す。
+        """
+        rows = [{c: to_text(v) for c, v in row.items()} for row in rows]
+        master_keys = [[to_text(v) for v in k] for k in master_keys]
+        content = digest([rows, master_keys])
+        now = time.time()
+        with self.lock:
+            same = self.conn.execute(
+                "SELECT key FROM save_jobs WHERE digest = ? AND created_at >= ?", (content, now - DUPLICATE_SEC)
+            ).fetchone()
+            if same:
+                return same[0]
+            key = uuid.uuid4().hex
+            rows = [row | {SAVE_ID: key} for row in rows]
+            self.conn.execute(
+                "INSERT INTO save_jobs (key, digest, rows, master_keys, status, next_try, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)",
+                (key, content, json.dumps(rows, ensure_ascii=False), json.dumps(master_keys, ensure_ascii=False),
+                 now, now, now),
+            )
+        return key
+
+    def due(self, limit=FLUSH_JOBS, max_rows=FLUSH_ROWS):
+        """送る順（古い順）に、今送ってよいジョブ（行数が max_rows を超えない分。最初の 1 件は必ず含める）"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, key, status, rows, master_keys, attempts FROM save_jobs"
+                " WHERE status != 'done' AND next_try <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        jobs, total = [], 0
+        for r in rows:
+            job = {"id": r[0], "key": r[1], "status": r[2], "rows": json.loads(r[3]),
+                   "master_keys": [tuple(k) for k in json.loads(r[4])], "attempts": r[5]}
+            total += len(job["rows"])
+            if jobs and total > max_rows:
+                break
+            jobs.append(job)
+        return jobs
+
+    def sending(self, ids):
+        """送る直前に記録する（ここから done までの間に止まったら、次は保存IDで消してから送る）"""
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE save_jobs SET status = 'sending', updated_at = ? WHERE id = ?", [(now, i) for i in ids]
+            )
+
+    def done(self, ids, stats=None):
+        """stats: 送ったバッチの ApiStats（同じバッチのジョブには同じ内容を残す）"""
+        now = time.time()
+        summary = f"{len(ids)} 件 / {stats.summary()}" if stats is not None else None
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE save_jobs SET status = 'done', updated_at = ?, error = NULL, sent_stats = ? WHERE id = ?",
+                [(now, summary, i) for i in ids],
+            )
+            self.conn.execute("DELETE FROM save_jobs WHERE status = 'done' AND updated_at < ?", (now - KEEP_DONE_SEC,))
+
+    def failed(self, ids, error, retry_delay=RETRY_DELAY):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE save_jobs SET status = 'failed', attempts = attempts + 1, next_try = ?,"
+                " updated_at = ?, error = ? WHERE id = ?",
+                [(now + retry_delay, now, error, i) for i in ids],
+            )
+
+    def retry_now(self):
+        """失敗したジョブを次の確認ですぐ送る"""
+        with self.lock:
+            self.conn.execute("UPDATE save_jobs SET next_try = 0 WHERE status = 'failed'")
+
+    def counts(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) FROM save_jobs WHERE status != 'done' GROUP BY status"
+            ).fetchall()
+        counts = {"pending": 0, "failed": 0} | dict(rows)
+        counts["pending"] += counts.pop("sending", 0)
+        return counts
+
+    def last_error(self):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT error FROM save_jobs WHERE status = 'failed' ORDER BY updated_at DESC LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    def last_sent(self):
+        """直近に送ったバッチの API 呼び出し回数と時間（まだなければ None）"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sent_stats FROM save_jobs WHERE status = 'done' AND sent_stats IS NOT NULL"
+                " ORDER BY updated_at DESC LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    def pending_master_keys(self):
+        """送信待ち・失敗のジョブが商品マスタから消す予定の (管理番号, サイズ)"""
+        with self.lock:
+            rows = self.conn.execute("SELECT master_keys FROM save_jobs WHERE status != 'done'").fetchall()
+        return {tuple(k) for (keys,) in rows for k in json.loads(keys)}
+
+
+def flush(store, journal, limit=FLUSH_JOBS):
+    """
+    送信待ちのジョブをまとめて 1 回のバッチで送る。バッチが失敗したらジョブを 1 件ずつ送り直し、
+    送れなかったものだけ失敗にする。送ったジョブ数を返す。
+    """
+    jobs = journal.due(limit)
+    if not jobs:
+        return 0
+    journal.sending([j["id"] for j in jobs])
+    try:
+        journal.done([j["id"] for j in jobs], send(store, jobs))
+        return len(jobs)
+    except Exception as e:
+        if len(jobs) == 1:
+            journal.failed([jobs[0]["id"]], str(e))
+            return 0
+    sent = 0
+    for job in jobs:
+        job["status"] = "sending"  # 失敗したバッチが書けていた場合に備えて保存IDで消してから送る
+        try:
+            journal.done([job["id"]], send(store, [job]))
+            sent += 1
+        except Exception as e:
+            journal.failed([job["id"]], str(e))
+    return sent
+
+
+def send(store, jobs):
+    """ジョブをまとめて 1 回のバッチで送る（初めて送るジョブは追加だけ）。バッチの ApiStats を返す"""
+    with store.batch() as stats:
+        write_measurements(
+            store,
+            [row for job in jobs for row in job["rows"]],
+            [k for job in jobs for k in job["master_keys"]],
+            [job["key"] for job in jobs if job["status"] != "pending"],
+        )
+    return stats
+
+
+def write_measurements(store, rows, master_keys, resend=()):
+    """
+    採寸結果に rows を追加し、商品マスタから master_keys を消す（1 回のバッチ）。
+    resend（再送するジョブのキー）があれば、先に採寸結果からその保存IDの行を消す。
+    """
+    master_keys = list(dict.fromkeys(tuple(k) for k in master_keys))
+    with store.batch():
+        if resend:
+            store.delete("採寸結果", [SAVE_ID], [(k,) for k in resend])
+        store.append("採寸結果", rows)
+        store.delete("商品マスタ", ["管理番号", "サイズ"], master_keys)
+
+
+class SaveWorker:
+    """プロセスに 1 つ。interval 秒ごと、または trigger() で裏のスレッドから flush する"""
+
+    def __init__(self, store, journal, interval=FLUSH_INTERVAL):
+        self.store = store
+        self.journal = journal
+        self.interval = interval
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="save-worker", daemon=True)
+            self.thread.start()
+        return self
+
+    def trigger(self):
+        self.wake.set()
+
+    def _loop(self):
+        while not self.stop.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                while flush(self.store, self.journal):
+                    pass
+            except Exception:
+                pass  # ジャーナルが読めないなど。次の確認で再試行
@@ -0,0 +1,35 @@
+# ━━━━━ シートの保守処理 ━━━━━
+# 採寸ヘッダー初期化ページの処理本体（画面から切り離して計測にも使う）。
+# アーカイブ管理（採寸結果 → 採寸アーカイブ の移動）は archive.py。
+
+# 採寸結果・採寸アーカイブの標準ヘッダー
+BASE_HEADERS = [
+    "日付","商品管理番号","ブランド","ジャンル","商品名","カラー","サイズ",
+    "肩幅","胸幅","胴囲","袖丈","着丈","襟高","首高","ウエスト","股上","股下",
+    "ワタリ","裾幅","全長","最大幅","横幅","頭周り","ツバ","高さ","裄丈",
+    "ベルト幅","前丈","後丈","備考"
+]
+
+
+def reinit_headers(store, name, base_headers=BASE_HEADERS):
+    """
+    既存の列とデータを残したまま標準ヘッダーの不足分を末尾に足す。
+    空シートなら標準ヘッダーだけ書いて True を返す。
+    シート全体を書き直すので、他の書き込みを止めてから全件を読み直し、その内容で置き換える
+    （ミラーの古い内容や、読み込みから書き込みまでの間の保存を消さないように）。
+    """
+    with store.hold([name]):
+        store.refresh([name], full=True)
+        current = store.read(name)
+
+        if current.columns.empty:
+            store.replace(name, [], columns=base_headers)
+            return True
+
+        final_headers = current.columns.tolist()
+        for h in base_headers:
+            if h not in final_headers:
+                final_headers.append(h)
+
+        store.replace(name, current.reindex(columns=final_headers, fill_value=""), columns=final_headers)
+        return False
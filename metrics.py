@@ -0,0 +1,146 @@
+# ━━━━━ 再実行ごとの処理時間の計測 ━━━━━
+# ページの処理を名前付きの段階（読み込み・初期値・保存・検索・出力など）で区切って時間を測り、
+# 同じ再実行の中で発生した Sheets API の呼び出し回数・送受信バイト数と合わせて記録する。
+#   - 記録は 1 再実行 1 行の JSONL（METRICS_LOG）に追記
+#   - セッションごとの集計（段階・ページ別の回数／合計／最大）はサイドバーの計測パネルで表示
+# 再実行はスレッドごとに 1 つ（Streamlit はセッションのスクリプトを 1 スレッドで実行する）。
+# 裏で動くミラー同期などのスレッドの API 呼び出しは、どの再実行にも数えない。
+import contextlib
+import json
+import threading
+import time
+from datetime import datetime
+
+_local = threading.local()
+
+
+class Rerun:
+    """1 回の再実行の計測結果"""
+
+    def __init__(self, page, session="", user=""):
+        self.page = page
+        self.session = session
+        self.user = user
+        self.started_at = time.time()
+        self.started = self.last = time.perf_counter()
+        self.stages = {}   # 段階名 → 秒（同じ名前は合算）
+        self.api_calls = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.last = time.perf_counter()
+            self.stages[name] = self.stages.get(name, 0.0) + self.last - started
+
+    def finish(self, at=None):
+        """
+        再実行の合計時間を確定する。st.stop() などで最後まで実行されなかった再実行は、
+        次の再実行の開始時に at=rerun.last（最後に記録した段階の終わり）で確定する。
+        """
+        if self.total is None:
+            self.total = (at or time.perf_counter()) - self.started
+        return self.total
+
+    def record(self):
+        return {
+            "ts": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "session": self.session,
+            "user": self.user,
+            "page": self.page,
+            "total_sec": round(self.finish(), 4),
+            "stages": {name: round(sec, 4) for name, sec in self.stages.items()},
+            "api_calls": self.api_calls,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+def start(page, session="", user=""):
+    rerun = _local.rerun = Rerun(page, session, user)
+    return rerun
+
+
+def current():
+    return getattr(_local, "rerun", None)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """with stage("読み込み"): の中の時間を現在の再実行に記録する（再実行外では何もしない）"""
+    rerun = current()
+    if rerun is None or rerun.total is not None:
+        yield
+        return
+    with rerun.stage(name):
+        yield
+
+
+def record_api(calls=0, bytes_sent=0, bytes_received=0):
+    rerun = current()
+    if rerun is None or rerun.total is not None:
+        return
+    rerun.api_calls += calls
+    rerun.bytes_sent += bytes_sent
+    rerun.bytes_received += bytes_received
+    rerun.last = time.perf_counter()
+
+
+def count_response_bytes(response, *args, **kwargs):
+    """requests のレスポンスフック。Sheets API との送受信バイト数を現在の再実行に加える"""
+    body = response.request.body if response.request is not None else None
+    record_api(bytes_sent=len(body or b""), bytes_received=len(response.content or b""))
+
+
+# ━━━━━ 集計・出力 ━━━━━
+class SessionStats:
+    """1 セッション分の集計。段階名・ページ名ごとに 回数・合計秒・最大秒"""
+
+    def __init__(self):
+        self.reruns = 0
+        self.api_calls = 0
+        self.bytes_received = 0
+        self.stages = {}
+        self.pages = {}
+
+    @staticmethod
+    def _add(table, name, sec):
+        count, total, peak = table.get(name, (0, 0.0, 0.0))
+        table[name] = (count + 1, total + sec, max(peak, sec))
+
+    def add(self, rerun):
+        self.reruns += 1
+        self.api_calls += rerun.api_calls
+        self.bytes_received += rerun.bytes_received
+        self._add(self.pages, rerun.page, rerun.finish())
+        for name, sec in rerun.stages.items():
+            self._add(self.stages, name, sec)
+
+    def rows(self, table):
+        """表示用（合計秒の大きい順）"""
+        return [
+            {"名前": name, "回数": count, "合計秒": round(total, 3),
+             "平均秒": round(total / count, 3), "最大秒": round(peak, 3)}
+            for name, (count, total, peak) in sorted(table.items(), key=lambda kv: -kv[1][1])
+        ]
+
+
+class MetricsLog:
+    """再実行ごとの記録を JSONL に追記する（複数セッションから同時に書いても 1 行ずつ）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        if not self.path:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
@@ -0,0 +1,384 @@
+# ━━━━━ ワークシートのローカルミラー（SQLite） ━━━━━
+# 各シートの内容をディスク上の SQLite に保持し、前回同期以降に追加された行だけを取得する。
+# ヘッダーや最終行（アンカー行）が変わっていれば編集・削除があったとみなして全件再同期する。
+# 内容が変わるたびにシートのバージョンを上げ、その変わり方（末尾への追加だけか）を ChangeLog に残す。
+# 読み込み側のキャッシュは、追加だけなら追加された行を継ぎ足し、それ以外のときだけ作り直す。
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+from gspread.exceptions import APIError
+
+from sheets import a1, col_letter, quote_title
+
+FULL_RESYNC_SEC = 600  # 途中行の編集も拾えるよう、この間隔で全件再同期
+MAX_AGE_SEC = 10       # これより古ければ裏で差分を確認（ヘッダー行・アンカー行・末尾だけの取得）
+
+
+def row_hash(row):
+    return hashlib.sha1(json.dumps(row, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def pad_row(row, width):
+    return (list(row) + [""] * (width - len(row)))[:width]
+
+
+def pad_rows(rows, width):
+    """行ごとに長さの違う values をヘッダー幅にそろえる（DataFrame 生成でまとめて埋める）"""
+    if not rows or width == 0:
+        return [[] for _ in rows]
+    frame = pd.DataFrame(rows).reindex(columns=range(width))
+    return frame.fillna("").astype(str).values.tolist()
+
+
+class ChangeLog:
+    """
+    シートのバージョンごとの変わり方（プロセス内の記録）。
+    末尾への追加なら追加前の行数、それ以外（上書き・削除・全件再同期）なら None を残す。
+    """
+    KEEP = 64  # シートごとに残す件数
+
+    def __init__(self):
+        self.entries = {}  # title → {version: 追加前の行数 or None}
+        self.lock = threading.Lock()
+
+    def record(self, title, version, appended_from=None):
+        with self.lock:
+            log = self.entries.setdefault(title, {})
+            log[version] = appended_from
+            for old in sorted(log)[:-self.KEEP]:
+                del log[old]
+
+    def appended_since(self, title, version, current):
+        """version から current までの変更が末尾への追加だけなら、追加が始まった行位置（0 始まり）。それ以外は None"""
+        if current <= version:
+            return None
+        with self.lock:
+            log = self.entries.get(title, {})
+            starts = [log.get(v) for v in range(version + 1, current + 1)]
+        return None if any(s is None for s in starts) else starts[0]
+
+
+class SheetMirror:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " title TEXT PRIMARY KEY,"
+            " headers TEXT NOT NULL,"
+            " row_count INTEGER NOT NULL,"
+            " anchor_hash TEXT,"
+            " synced_at REAL NOT NULL,"
+            " full_synced_at REAL NOT NULL,"
+            " version INTEGER NOT NULL)"
+        )
+        self.lock = threading.RLock()
+        self.sync_locks = {}
+        self.frames = {}       # title → (version, DataFrame)
+        self.changes = ChangeLog()
+        self.background = set()
+
+    # ---- 状態 ----
+    def _table(self, title):
+        return '"sheet:' + title.replace('"', '""') + '"'
+
+    def state(self, title):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT headers, row_count, anchor_hash, synced_at, full_synced_at, version"
+                " FROM sync_state WHERE title = ?", (title,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "headers": json.loads(row[0]),
+            "row_count": row[1],
+            "anchor_hash": row[2],
+            "synced_at": row[3],
+            "full_synced_at": row[4],
+            "version": row[5],
+        }
+
+    def version(self, title):
+        state = self.state(title)
+        return state["version"] if state else 0
+
+    def invalidate(self, title):
+        # 次回の読み込みで全件再同期させる
+        with self.lock:
+            self.conn.execute(
+                "UPDATE sync_state SET synced_at = 0, full_synced_at = 0 WHERE title = ?", (title,)
+            )
+
+    def _sync_lock(self, title):
+        with self.lock:
+            return self.sync_locks.setdefault(title, threading.Lock())
+
+    # ---- 同期 ----
+    def delta_ranges(self, title, state):
+        """差分同期に必要な範囲：ヘッダー行・アンカー行（前回の最終行）・それ以降の行"""
+        n = state["row_count"]
+        last_col = col_letter(max(len(state["headers"]), 1))
+        ranges = [a1(title, "1:1")]
+        if n > 0:
+            ranges.append(a1(title, f"A{n + 1}:{last_col}{n + 1}"))
+        ranges.append(a1(title, f"A{n + 2}:{last_col}"))
+        return ranges
+
+    def apply_delta(self, title, state, value_ranges):
+        """差分を反映する。編集を検知した場合は False を返す（全件再同期が必要）"""
+        headers = state["headers"]
+        width = len(headers)
+        fetched_headers = (value_ranges[0].get("values") or [[]])[0]
+        if fetched_headers != headers:
+            return False
+        if state["row_count"] > 0:
+            anchor = pad_row((value_ranges[1].get("values") or [[]])[0], width)
+            if row_hash(anchor) != state["anchor_hash"]:
+                return False
+        tail = pad_rows(value_ranges[-1].get("values", []), width)
+
+        now = time.time()
+        with self.lock:
+            if tail:
+                start = state["row_count"] + 1
+                self._insert(title, width, start, tail)
+                self.conn.execute(
+                    "UPDATE sync_state SET row_count = ?, anchor_hash = ?, synced_at = ?,"
+                    " version = version + 1 WHERE title = ?",
+                    (state["row_count"] + len(tail), row_hash(tail[-1]), now, title),
+                )
+                self.changes.record(title, state["version"] + 1, state["row_count"])
+            else:
+                self.conn.execute("UPDATE sync_state SET synced_at = ? WHERE title = ?", (now, title))
+        return True
+
+    def apply_full(self, title, values):
+        headers = values[0] if values else []
+        width = len(headers)
+        rows = pad_rows(values[1:], width)
+        table = self._table(title)
+        now = time.time()
+        with self.lock:
+            version = self.version(title) + 1
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                cols = "".join(f", c{i} TEXT" for i in range(width))
+                self.conn.execute(f"CREATE TABLE {table} (row INTEGER PRIMARY KEY{cols})")
+                self._insert(title, width, 1, rows)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sync_state"
+                    " (title, headers, row_count, anchor_hash, synced_at, full_synced_at, version)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (title, json.dumps(headers, ensure_ascii=False), len(rows),
+                     row_hash(rows[-1]) if rows else None, now, now, version),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.changes.record(title, version)
+
+    def apply_updates(self, title, updates):
+        """
+        自分で上書きしたセル [(行番号, 開始列（1始まり）, 値のリスト), ...] をミラーにも反映する
+        （途中行の上書きは差分同期では検知できないため）。ミラーにない行・列を含む場合は何もしない。
+        """
+        state = self.state(title)
+        if state is None or not updates:
+            return
+        width = len(state["headers"])
+        if any(not 2 <= r <= state["row_count"] + 1 or c < 1 or c - 1 + len(v) > width for r, c, v in updates):
+            return
+        table = self._table(title)
+        cols = ", ".join(f"c{i}" for i in range(width))
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for row, col, values in updates:
+                    sets = ", ".join(f"c{col - 1 + i} = ?" for i in range(len(values)))
+                    self.conn.execute(f"UPDATE {table} SET {sets} WHERE row = ?", [str(v) for v in values] + [row - 1])
+                last = self.conn.execute(f"SELECT {cols} FROM {table} ORDER BY row DESC LIMIT 1").fetchone()
+                self.conn.execute(
+                    "UPDATE sync_state SET anchor_hash = ?, version = version + 1 WHERE title = ?",
+                    (row_hash(list(last)) if last else None, title),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.changes.record(title, state["version"] + 1)
+
+    def apply_deletes(self, title, row_numbers):
+        """
+        自分で削除したシートの行（行番号は 2 行目がデータの先頭）をミラーにも反映する。
+        削除のたびに全件再同期しないため。ミラーにない行を含む場合は何もしない
+        （次の同期でアンカー行の不一致を検知して全件再同期になる）。
+        """
+        state = self.state(title)
+        rows = sorted(set(row_numbers))
+        if state is None or not rows or rows[0] < 2 or rows[-1] - 1 > state["row_count"]:
+            return
+        table = self._table(title)
+        width = len(state["headers"])
+        cols = ", ".join(f"c{i}" for i in range(width)) or "row"
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                # 削除してから、残った行を 1 回で詰め直す（主キーの衝突を避けるため一度負数にしてから戻す）
+                self.conn.executemany(f"DELETE FROM {table} WHERE row = ?", [(r - 1,) for r in rows])
+                self.conn.execute(
+                    f"UPDATE {table} SET row = -m.rn FROM"
+                    f" (SELECT row AS old, ROW_NUMBER() OVER (ORDER BY row) AS rn FROM {table}) AS m"
+                    f" WHERE {table}.row = m.old AND m.old >= ?", (rows[0] - 1,)
+                )
+                self.conn.execute(f"UPDATE {table} SET row = -row WHERE row < 0")
+                last = self.conn.execute(f"SELECT {cols} FROM {table} ORDER BY row DESC LIMIT 1").fetchone()
+                self.conn.execute(
+                    "UPDATE sync_state SET row_count = ?, anchor_hash = ?, version = version + 1 WHERE title = ?",
+                    (state["row_count"] - len(rows), row_hash(list(last)) if last and width else None, title),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.changes.record(title, state["version"] + 1)
+
+    def _insert(self, title, width, start, rows):
+        if not rows:
+            return
+        placeholders = ", ".join(["?"] * (width + 1))
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO {self._table(title)} VALUES ({placeholders})",
+            [[start + i] + r for i, r in enumerate(rows)],
+        )
+
+    def sync_many(self, sheets, titles):
+        """
+        複数シートの差分（初回は全件）を 1 回の values batchGet でまとめて取得する。
+        編集を検知したシートだけ、もう 1 回の batchGet で全件再同期する。
+        """
+        titles = list(dict.fromkeys(titles))
+        locks = [self._sync_lock(t) for t in sorted(titles)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            plan = []
+            for title in titles:
+                state = self.state(title)
+                if state is not None and time.time() - state["full_synced_at"] < FULL_RESYNC_SEC:
+                    plan.append((title, state, self.delta_ranges(title, state)))
+                else:
+                    plan.append((title, None, [quote_title(title)]))
+            try:
+                value_ranges = sheets.values_batch_get(
+                    [r for _, _, ranges in plan for r in ranges]
+                )["valueRanges"]
+            except APIError:
+                if len(titles) == 1:
+                    raise
+                # 存在しないシートがあると batchGet 全体が失敗するので 1 シートずつやり直す
+                for lock in locks:
+                    lock.release()
+                locks = []
+                errors = []
+                for title in titles:
+                    try:
+                        self.sync_many(sheets, [title])
+                    except APIError as e:
+                        errors.append(e)
+                if errors:
+                    raise errors[0]
+                return
+
+            resync = []
+            pos = 0
+            for title, state, ranges in plan:
+                part = value_ranges[pos:pos + len(ranges)]
+                pos += len(ranges)
+                if state is None:
+                    self.apply_full(title, part[0].get("values", []))
+                elif not self.apply_delta(title, state, part):
+                    resync.append(title)
+            if resync:
+                value_ranges = sheets.values_batch_get([quote_title(t) for t in resync])["valueRanges"]
+                for title, value_range in zip(resync, value_ranges):
+                    self.apply_full(title, value_range.get("values", []))
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def sync_in_background(self, sheets, titles):
+        with self.lock:
+            titles = [t for t in titles if t not in self.background]
+            if not titles:
+                return
+            self.background.update(titles)
+
+        def run():
+            try:
+                self.sync_many(sheets, titles)
+            except Exception:
+                pass  # 次回の読み込みで再試行
+            finally:
+                with self.lock:
+                    self.background.difference_update(titles)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    # ---- 読み込み ----
+    def appended_since(self, title, version):
+        return self.changes.appended_since(title, version, self.version(title))
+
+    def read(self, title):
+        """
+        ミラーの内容を DataFrame で。前回読んだ版からの変更が末尾への追加だけなら、
+        追加された行だけを読んで継ぎ足す。
+        """
+        state = self.state(title)
+        if state is None:
+            return pd.DataFrame()
+        with self.lock:
+            cached = self.frames.get(title)
+            if cached and cached[0] == state["version"]:
+                return cached[1]
+            width = len(state["headers"])
+            cols = ", ".join(f"c{i}" for i in range(width)) or "row"
+            start = self.changes.appended_since(title, cached[0], state["version"]) if cached and width else None
+            if start is not None and start == len(cached[1]):
+                rows = self.conn.execute(
+                    f"SELECT {cols} FROM {self._table(title)} WHERE row > ? ORDER BY row", (start,)
+                ).fetchall()
+            else:
+                cached = None
+                rows = self.conn.execute(f"SELECT {cols} FROM {self._table(title)} ORDER BY row").fetchall()
+        df = pd.DataFrame(rows, columns=state["headers"]) if width else pd.DataFrame()
+        if cached:
+            df = pd.concat([cached[1], df], ignore_index=True)
+        with self.lock:
+            self.frames[title] = (state["version"], df)
+        return df
+
+    def load_many(self, sheets, titles, max_age=MAX_AGE_SEC):
+        """
+        ミラーから即座に返す。古ければ裏で差分同期し、ミラーが空のときだけ同期を待つ。
+        同期が必要なシートはまとめて 1 回の batchGet で取得する。
+        """
+        now = time.time()
+        missing, stale = [], []
+        for title in titles:
+            state = self.state(title)
+            if state is None or state["synced_at"] == 0:
+                missing.append(title)
+            elif now - state["synced_at"] > max_age:
+                stale.append(title)
+        if missing:
+            self.sync_many(sheets, missing)
+        if stale:
+            self.sync_in_background(sheets, stale)
+        return {title: self.read(title) for title in titles}
@@ -0,0 +1,143 @@
+# ━━━━━ シートの値の型そろえ ━━━━━
+# シートの値はすべて文字列で届く。表示・検索に使う表はプロセスで 1 回だけ型をそろえ、全セッションで共有する。
+#   - 採寸値（肩幅・着丈など、空以外がすべて数値の列）は float32（空は NaN）
+#   - 値の種類が少ない ブランド・ジャンル・サイズ・(商品)管理番号 はカテゴリ型
+#   - それ以外（日付・商品名・備考など）は文字列のまま
+# 共有した DataFrame は読み取り専用として扱う（pandas 3 では Copy-on-Write が常に有効なので、
+# 絞り込んだ結果に書き込んでも元の DataFrame は変わらない。requirements.txt で pandas>=3 に固定）。
+# 書き込み（インポートの差分・保存）はシートと同じ文字列の表（store.read）を使う。
+# 画面・出力・保存に渡すときは widened で float64 に戻す（45.3 が 45.29999923706055 にならないように）。
+# 前回の版から末尾への追加だけなら、追加された行だけ同じ型にそろえて継ぎ足す（TypedCache）。
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CATEGORY_COLS = ["ブランド", "ジャンル", "サイズ", "商品管理番号", "管理番号"]
+TEXT_COLS = ["日付", "商品名", "カラー", "備考", "採寸項目", "基準ID", "保存ID"]
+
+
+def as_measurement(values):
+    """
+    空以外がすべて数値として読める列なら float32 の配列、そうでなければ None（空だけの列も None）。
+    採寸値の列は空が多いので、数値に変換するのは空でないセルだけ。
+    """
+    filled = values != ""
+    if not filled.any():
+        return None
+    numbers = pd.to_numeric(values[filled], errors="coerce")
+    if np.isnan(numbers).any():
+        return None
+    typed = np.full(len(values), np.nan, dtype="float32")
+    typed[filled] = numbers
+    return typed
+
+
+def widen(values):
+    """
+    float32 の配列を、同じ float32 に戻る最短の小数の float64 に（np.float32(45.3) → 45.3）。
+    採寸値は小数 1〜2 桁がほとんどなので、桁数を増やしながら丸めて一致したものを採る。
+    """
+    narrow = np.asarray(values, dtype="float32")
+    wide = narrow.astype("float64")
+    todo = np.flatnonzero(np.isfinite(narrow))
+    for decimals in range(10):
+        if not len(todo):
+            break
+        rounded = np.round(wide[todo], decimals)
+        same = rounded.astype("float32") == narrow[todo]
+        wide[todo[same]] = rounded[same]
+        todo = todo[~same]
+    for i in todo:
+        wide[i] = float(np.format_float_positional(narrow[i], unique=True))
+    return wide
+
+
+def widened(df):
+    """float32 の列を widen した DataFrame（float32 の列がなければ df のまま）"""
+    columns = {c: widen(df[c].to_numpy()) for c in df.columns if df[c].dtype == np.float32}
+    return df.assign(**columns) if columns else df
+
+
+def normalize(df, like=None):
+    """
+    文字列の DataFrame を型付きの新しい DataFrame に（見出しが空の列は落とす）。
+    like を渡すと like と同じ列・型にそろえる（like にない列がある・型が合わないときは None）。
+    """
+    df = df.loc[:, df.columns != ""]
+    if like is not None:
+        if not set(df.columns).issubset(like.columns):
+            return None
+        df = df.reindex(columns=like.columns)
+    columns = {}
+    for col in df.columns:
+        values = np.asarray(df[col].array, dtype=object)
+        values = np.where(pd.isna(values), "", values)  # シートにない列（結合で欠けた列）は空
+        if like is not None:
+            typed = conform(values, like[col])
+            if typed is None:
+                return None
+            columns[col] = typed
+        elif col in CATEGORY_COLS:
+            columns[col] = pd.Categorical(values)
+        elif col in TEXT_COLS or (typed := as_measurement(values)) is None:
+            columns[col] = values
+        else:
+            columns[col] = typed
+    return pd.DataFrame(columns, index=df.index)
+
+
+def conform(values, like):
+    """values を like（型付きの列）と同じ型に。全体を型付けし直すと型が変わる場合は None"""
+    if isinstance(like.dtype, pd.CategoricalDtype):
+        return pd.Categorical(values)
+    if like.dtype == np.float32:
+        if not (values != "").any():
+            return np.full(len(values), np.nan, dtype="float32")
+        return as_measurement(values)
+    if like.name not in TEXT_COLS and as_measurement(values) is not None and not (like.to_numpy() != "").any():
+        return None  # 空だけの列に数値が入った（全体では採寸値の列になる）
+    return values
+
+
+def concat_typed(frames):
+    """同じ列の型付きの表を縦につなぐ（カテゴリ型は種類を合わせてカテゴリ型のまま）"""
+    columns = {}
+    for col in frames[0].columns:
+        parts = [f[col] for f in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals([p.array for p in parts])
+        else:
+            columns[col] = np.concatenate([p.to_numpy() for p in parts])
+    return pd.DataFrame(columns)
+
+
+class TypedCache:
+    """
+    シートごとの型付きの表（プロセスで 1 つを全セッションで共有）。
+    シートのバージョンが変わったとき、末尾への追加だけなら追加された行だけを型付けして継ぎ足す。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.frames = {}  # title → (version, DataFrame)
+        self.lock = threading.Lock()
+
+    def get(self, title):
+        version = self.store.version(title)
+        with self.lock:
+            cached = self.frames.get(title)
+        if cached and cached[0] == version:
+            return cached[1]
+        raw = self.store.read(title)
+        typed = None
+        if cached and self.store.appended_since(title, cached[0]) == len(cached[1]):
+            rows = normalize(raw.iloc[len(cached[1]):], like=cached[1])
+            if rows is not None:
+                typed = concat_typed([cached[1], rows])
+        if typed is None:
+            typed = normalize(raw)
+        with self.lock:
+            self.frames[title] = (version, typed)
+        return typed
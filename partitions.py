@@ -0,0 +1,159 @@
+# ━━━━━ 採寸アーカイブの月別パーティション ━━━━━
+# 採寸アーカイブを月ごとのワークシート（採寸アーカイブ_YYYY-MM）に分け、
+# 目録シート（アーカイブ目録）に各シートの 件数・日付の範囲・管理番号の範囲 を持つ。
+# 読み込む側は目録で 日付の範囲／管理番号の前方一致 に関係するシートだけを選んで読む。
+#
+# 分割前からある 1 枚の「採寸アーカイブ」は旧形式として扱い、裏で月別シートへ少しずつ移す。
+# 移した行数は目録の「分割済み行数」に、月別シートへの追加と同じバッチで記録する
+# （読み込み時は分割済みの行を飛ばすので、途中でも重複しない）。
+import pandas as pd
+
+from sheets import parse_dates
+
+ARCHIVE = "採寸アーカイブ"            # 旧形式（1 枚）のアーカイブ
+PARTITION_PREFIX = "採寸アーカイブ_"
+UNDATED = "日付不明"
+CATALOG = "アーカイブ目録"
+CATALOG_COLUMNS = ["シート名", "月", "件数", "最小日付", "最大日付", "最小管理番号", "最大管理番号", "分割済み行数"]
+SPLIT_CHUNK_ROWS = 2000
+
+
+def partition_title(month):
+    return PARTITION_PREFIX + month
+
+
+def months_of(df):
+    """行ごとの月（YYYY-MM）。日付が読めない行は 日付不明"""
+    dates = parse_dates(df["日付"]) if "日付" in df.columns else pd.Series(pd.NaT, index=df.index)
+    return dates.dt.strftime("%Y-%m").fillna(UNDATED).set_axis(df.index)
+
+
+def to_int(v):
+    try:
+        return int(float(v))
+    except (TypeError, ValueError):
+        return 0
+
+
+def merged_stats(entry, df):
+    """目録の 1 行（dict）に df の行を足した後の 件数・範囲"""
+    entry = dict(entry)
+    dates = parse_dates(df["日付"]).dropna() if "日付" in df.columns else pd.Series(dtype="datetime64[ns]")
+    pids = df["商品管理番号"].astype(str).str.strip() if "商品管理番号" in df.columns else pd.Series(dtype=object)
+    pids = pids[pids != ""]
+    entry["件数"] = str(to_int(entry.get("件数")) + len(df))
+    if len(dates):
+        lo, hi = dates.min().strftime("%Y-%m-%d"), dates.max().strftime("%Y-%m-%d")
+        entry["最小日付"] = min(filter(None, [entry.get("最小日付"), lo]))
+        entry["最大日付"] = max(filter(None, [entry.get("最大日付"), hi]))
+    if len(pids):
+        entry["最小管理番号"] = min(filter(None, [entry.get("最小管理番号"), pids.min()]))
+        entry["最大管理番号"] = max(filter(None, [entry.get("最大管理番号"), pids.max()]))
+    return entry
+
+
+def may_contain(entry, date_from=None, date_to=None, pid_prefix=None):
+    """目録の範囲から、条件に合う行がありうるか（範囲が空＝不明なら読む）"""
+    if entry.get("件数") not in (None, "") and to_int(entry["件数"]) - to_int(entry.get("分割済み行数")) <= 0:
+        return False
+    lo, hi = entry.get("最小日付") or "", entry.get("最大日付") or ""
+    if date_from and hi and hi < date_from:
+        return False
+    if date_to and lo and lo > date_to:
+        return False
+    if pid_prefix:
+        lo, hi = entry.get("最小管理番号") or "", entry.get("最大管理番号") or ""
+        n = len(pid_prefix)
+        if (lo and pid_prefix < lo[:n]) or (hi and pid_prefix > hi[:n]):
+            return False
+    return True
+
+
+class ArchiveCatalog:
+    """目録の読み書き。書き込みは呼び出し側の store.batch() にまとめる"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def entries(self):
+        """シート名 → 目録の行（dict）。目録にない旧形式のアーカイブは範囲不明として含める"""
+        df = self.store.read(CATALOG)
+        entries = {}
+        if not df.empty and "シート名" in df.columns:
+            for record in df.to_dict("records"):
+                entries[record["シート名"]] = {c: str(record.get(c, "") or "") for c in CATALOG_COLUMNS}
+        if ARCHIVE not in entries and self.store.has(ARCHIVE):
+            entries[ARCHIVE] = {c: "" for c in CATALOG_COLUMNS} | {"シート名": ARCHIVE}
+        return entries
+
+    def select(self, date_from=None, date_to=None, pid_prefix=None):
+        """条件に関係するアーカイブのシート名（日付は YYYY-MM-DD の文字列）"""
+        return [
+            title for title, entry in sorted(self.entries().items())
+            if may_contain(entry, date_from, date_to, pid_prefix) and self.store.has(title)
+        ]
+
+    def read(self, titles):
+        """シート名 → DataFrame。旧形式のアーカイブは分割済みの行を除く"""
+        frames = self.store.read_many(titles)
+        if ARCHIVE in frames:
+            done = to_int(self.entries().get(ARCHIVE, {}).get("分割済み行数"))
+            if done:
+                frames[ARCHIVE] = frames[ARCHIVE].iloc[done:].reset_index(drop=True)
+        return frames
+
+    def versions(self, titles):
+        return tuple((t, self.store.version(t)) for t in [CATALOG] + list(titles))
+
+    def append(self, df, extra=None):
+        """
+        df の行を月別シートへ追加し、目録の件数・範囲を更新する。
+        extra: シート名 → 目録に上書きする値（分割済み行数など）
+        """
+        entries = self.entries()
+        updates = {}
+        for month, rows in df.groupby(months_of(df), sort=True):
+            rows = rows.loc[:, rows.columns != ""]
+            title = partition_title(month)
+            self.store.append(title, rows)
+            base = entries.get(title) or {c: "" for c in CATALOG_COLUMNS} | {"シート名": title, "月": month}
+            updates[title] = merged_stats(base, rows)
+        for title, values in (extra or {}).items():
+            base = updates.get(title) or entries.get(title) or {c: "" for c in CATALOG_COLUMNS} | {"シート名": title}
+            updates[title] = {**base, **values}
+        if updates:
+            self.store.upsert(CATALOG, list(updates.values()), ["シート名"])
+
+
+def split_legacy(store, chunk_rows=SPLIT_CHUNK_ROWS, stop=None):
+    """
+    旧形式の 採寸アーカイブ を先頭から chunk_rows 行ずつ月別シートへ移す。
+    追加と「分割済み行数」の更新は 1 回のバッチ。最後まで移したら旧シートを見出しだけにする。
+    移した行数を返す。
+    """
+    if not store.has(ARCHIVE):
+        return 0
+    catalog = ArchiveCatalog(store)
+    store.refresh([CATALOG, ARCHIVE])
+    moved = 0
+    while stop is None or not stop.is_set():
+        legacy = store.read(ARCHIVE)
+        entry = catalog.entries().get(ARCHIVE, {})
+        done = to_int(entry.get("分割済み行数"))
+        chunk = legacy.iloc[done:done + chunk_rows]
+        with store.batch():
+            if chunk.empty:
+                if not legacy.empty:
+                    store.replace(ARCHIVE, [], columns=legacy.columns.tolist())
+                catalog.append(legacy.iloc[0:0], extra={ARCHIVE: {"件数": "0", "分割済み行数": "0"}})
+                break
+            catalog.append(chunk, extra={ARCHIVE: {"分割済み行数": str(done + len(chunk))}})
+        moved += len(chunk)
+    return moved
+
+
+def needs_split(store):
+    if not store.has(ARCHIVE):
+        return False
+    entry = ArchiveCatalog(store).entries().get(ARCHIVE, {})
+    return entry.get("件数") != "0" or not store.read(ARCHIVE).empty
@@ -0,0 +1,136 @@
+# ━━━━━ Sheets API リクエストスケジューラ ━━━━━
+# 複数の作業者が同時に保存しても Google Sheets の分間クォータを超えないよう、
+# すべての読み書きをここに通す。
+#   - 読み込み・書き込みそれぞれトークンバケットで流量を制限
+#   - 429（クォータ超過）などは指数バックオフ＋ジッターで再試行
+#   - 同じ内容の読み込みが同時に来たら 1 回だけ実行して結果を共有
+#   - 書き込みはワークシートごとに順番に実行（hold で読み込みから書き込みまで続けて押さえられる）
+import contextlib
+import random
+import threading
+import time
+
+from gspread.exceptions import APIError
+
+import metrics
+
+# 読み込みは一時的なサーバーエラーも再試行。書き込みは未実行が確実な 429 のみ再試行する
+READ_RETRY_STATUS = {429, 500, 502, 503, 504}
+WRITE_RETRY_STATUS = {429}
+
+
+def error_status(e):
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None) or getattr(e, "code", None)
+
+
+class TokenBucket:
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self.cond.wait((1 - self.tokens) / self.rate)
+
+    def drain(self):
+        # 429 を受けたら手持ちを捨て、他のスレッドもしばらく待たせる
+        with self.cond:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class _Pending:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SheetsScheduler:
+    def __init__(self, reads_per_minute=60, writes_per_minute=60, burst=10,
+                 max_retries=6, base_delay=1.0, max_delay=32.0):
+        self.buckets = {
+            "read": TokenBucket(reads_per_minute, burst),
+            "write": TokenBucket(writes_per_minute, burst),
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.inflight = {}     # 読み込みキー → _Pending
+        self.write_locks = {}  # シート名 → RLock（hold の中から write しても待たない）
+
+    def _run(self, kind, retry_status, fn, *args, **kwargs):
+        bucket = self.buckets[kind]
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            metrics.record_api(calls=1)
+            try:
+                return fn(*args, **kwargs)
+            except APIError as e:
+                if error_status(e) not in retry_status or attempt == self.max_retries:
+                    raise
+                if error_status(e) == 429:
+                    bucket.drain()
+                cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+                time.sleep(random.uniform(cap / 2, cap))
+
+    def read(self, key, fn, *args, **kwargs):
+        """同じ key の読み込みが実行中ならその結果を待って共有する"""
+        with self.lock:
+            pending = self.inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self.inflight[key] = _Pending()
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+        try:
+            pending.result = self._run("read", READ_RETRY_STATUS, fn, *args, **kwargs)
+            return pending.result
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            pending.done.set()
+
+    @contextlib.contextmanager
+    def hold(self, titles):
+        """
+        titles のシートへの書き込みを止めておく（同じスレッドからの write はそのまま通る）。
+        行番号を読んでから書き込むまでの間に、他の書き込みで行がずれないようにするため。
+        """
+        if isinstance(titles, str):
+            titles = [titles]
+        with self.lock:
+            locks = [self.write_locks.setdefault(t, threading.RLock()) for t in sorted(set(titles))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def write(self, titles, fn, *args, **kwargs):
+        """titles のシートへの書き込みを、シートごとに 1 件ずつ順番に実行する"""
+        with self.hold(titles):
+            return self._run("write", WRITE_RETRY_STATUS, fn, *args, **kwargs)
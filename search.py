@@ -0,0 +1,237 @@
+# ━━━━━ 採寸検索用データ ━━━━━
+# 採寸結果と採寸アーカイブを 1 つの DataFrame にまとめる。
+# 生成はデータのバージョンが変わったときだけ行い、絞り込みはメモリ上で行う。
+# 検索結果は行位置の配列（ResultQuery）で持ち、DataFrame にするのは表示する 1 ページ分と出力時だけ。
+# 保存などで末尾に行が追加されただけなら、作り直さず追加された行だけ継ぎ足す（DatasetCache）。
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from indexes import MeasurementLookup, NGramIndex, parse_query, row_texts, text_matches
+from normalize import concat_typed, normalize, widened
+from sheets import parse_dates
+
+def combine_measurements(*frames):
+    """シートごとの表を 1 つにまとめて型をそろえる（採寸値は float32、ブランドなどはカテゴリ型）"""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return normalize(pd.concat(frames, ignore_index=True))
+
+
+class MeasurementDataset:
+    """
+    シートごとの DataFrame を結合したもの。frame の行位置は sources の順に並ぶ。
+    キーワード検索はシートごとの NGramIndex を使い、行位置を結合後の位置に読み替える。
+    """
+
+    def __init__(self, parts, indexes=None):
+        self.sources = []  # (シート名, 開始位置, 行数)
+        offset = 0
+        for title, df in parts:
+            self.sources.append((title, offset, len(df)))
+            offset += len(df)
+        self.indexes = indexes or {}
+        for title, df in parts:
+            if title in self.indexes:
+                self.indexes[title].sync(df)
+        self.frame = combine_measurements(*[df for _, df in parts])
+        self.lookup = MeasurementLookup(self.frame)
+        self.versions = None  # DatasetCache が付ける（catalog.versions）。出力ファイルの使い回しの判定用
+        self._dates = None
+        self._columns = {}  # 列名 → (値の配列, 空でない行の真偽配列)
+
+    def column(self, name):
+        """列の値（numpy 配列）と空でない行の真偽配列（初回だけ作る）"""
+        if name not in self._columns:
+            values = self.frame[name].to_numpy(dtype=object)
+            self._columns[name] = (values, self.frame[name].notna().to_numpy() & (values != ""))
+        return self._columns[name]
+
+    @property
+    def dates(self):
+        """日付列を datetime にしたもの（初回だけ変換）"""
+        if self._dates is None:
+            values = self.frame["日付"] if "日付" in self.frame.columns else [""] * len(self.frame)
+            self._dates = parse_dates(values).to_numpy()
+        return self._dates
+
+    def range_mask(self, date_from=None, date_to=None, pid_prefix=None, keep_undated=False):
+        """
+        日付の範囲（YYYY-MM-DD、両端を含む）と管理番号の前方一致で絞る行の真偽配列。
+        keep_undated なら日付が空・読めない行は日付の範囲に関係なく残す。
+        """
+        mask = np.ones(len(self.frame), dtype=bool)
+        undated = np.isnat(self.dates) if keep_undated else np.zeros(len(self.frame), dtype=bool)
+        if date_from:
+            mask &= (self.dates >= np.datetime64(date_from)) | undated
+        if date_to:
+            mask &= (self.dates <= np.datetime64(date_to)) | undated
+        if pid_prefix and "商品管理番号" in self.frame.columns:
+            pids = self.frame["商品管理番号"]
+            if isinstance(pids.dtype, pd.CategoricalDtype):
+                # 前方一致はカテゴリ（種類）ごとに 1 回だけ判定し、行へはコードで引く（-1＝欠損は末尾の False）
+                hit = np.asarray(pids.cat.categories.astype(str).str.startswith(pid_prefix), dtype=bool)
+                mask &= np.append(hit, False)[pids.cat.codes.to_numpy()]
+            else:
+                mask &= pids.astype(str).str.startswith(pid_prefix).to_numpy()
+        return mask
+
+    def extended(self, title, rows, sheet):
+        """
+        title の末尾に rows（frame と同じ列・型にそろえた行）を足した新しいデータセット（self は変えない）。
+        sheet: 追加後のシートの内容（キーワード索引の差分更新用）
+        """
+        at, count = None, len(rows)
+        sources = []
+        for t, offset, length in self.sources:
+            if at is not None:
+                offset += count
+            if t == title:
+                at, length = offset + length, length + count
+            sources.append((t, offset, length))
+        dataset = copy.copy(self)
+        dataset.sources = sources
+        dataset.frame = concat_typed([self.frame.iloc[:at], rows, self.frame.iloc[at:]])
+        dataset.lookup = self.lookup.extended(dataset.frame, at, count)
+        dataset._columns = {}
+        if self._dates is not None:
+            added = parse_dates(rows["日付"] if "日付" in rows.columns else [""] * count).to_numpy()
+            dataset._dates = np.concatenate([self._dates[:at], added, self._dates[at:]])
+        if title in self.indexes:
+            self.indexes[title].sync(sheet)
+        return dataset
+
+    def keyword_positions(self, keyword):
+        """キーワードに一致する frame の行位置"""
+        hits = []
+        for title, offset, length in self.sources:
+            index = self.indexes.get(title)
+            if index is None:
+                continue
+            found = index.search(keyword)
+            hits.append(found[found < length] + offset)
+        positions = np.concatenate(hits) if hits else np.empty(0, dtype=np.int64)
+        if len(positions):
+            # 他のセッションで索引が更新されている場合に備え、ヒット行だけ実データで確認
+            terms = parse_query(keyword)
+            texts = row_texts(self.frame.iloc[positions])
+            positions = positions[np.array([text_matches(t, terms) for t in texts], dtype=bool)]
+        return positions
+
+
+class DatasetCache:
+    """
+    シートの組み合わせごとの MeasurementDataset（プロセスで 1 つ、最近使った max_entries 通り）。
+    キーは catalog.versions（目録と各シートのバージョン）。前回から末尾への追加だけのシートは
+    追加された行だけ型付けして継ぎ足し、それ以外の変更があれば作り直す。
+    """
+
+    def __init__(self, store, catalog, max_entries=4):
+        self.store = store
+        self.catalog = catalog
+        self.max_entries = max_entries
+        self.indexes = {}  # シート名 → NGramIndex（組み合わせをまたいで共有）
+        self.entries = OrderedDict()  # シート名のタプル → (versions, MeasurementDataset)
+        self.lock = threading.Lock()
+
+    def get(self, titles):
+        titles = tuple(titles)
+        versions = self.catalog.versions(titles)
+        with self.lock:
+            cached = self.entries.get(titles)
+        if cached and cached[0] == versions:
+            dataset = cached[1]
+        else:
+            dataset = self._extend(cached, versions) if cached else None
+            if dataset is None:
+                frames = self.catalog.read(titles)
+                indexes = {t: self.indexes.setdefault(t, NGramIndex()) for t in titles}
+                dataset = MeasurementDataset([(t, frames[t]) for t in titles], indexes)
+        dataset.versions = versions
+        with self.lock:
+            self.entries[titles] = (versions, dataset)
+            self.entries.move_to_end(titles)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return dataset
+
+    def _extend(self, cached, versions):
+        """追加だけなら継ぎ足したデータセット、そうでなければ None"""
+        old_versions, dataset = cached
+        old = dict(old_versions)
+        lengths = {t: length for t, _, length in dataset.sources}
+        for title, version in versions:
+            if version == old.get(title):
+                continue
+            if title not in lengths or self.store.appended_since(title, old[title]) != lengths[title]:
+                return None  # 目録の変更・上書き・削除・全件再同期
+            sheet = self.catalog.read([title])[title]
+            rows = normalize(sheet.iloc[lengths[title]:], like=dataset.frame)
+            if rows is None:
+                return None
+            dataset = dataset.extended(title, rows, sheet)
+        return dataset
+
+
+class ResultQuery:
+    """
+    MeasurementDataset の検索結果。行位置の配列だけを持ち、絞り込み・件数・空列の判定・並べ替えは
+    位置の配列のまま行う（コストは全体ではなく一致した行数に比例）。
+    """
+
+    def __init__(self, dataset, positions=None):
+        self.dataset = dataset
+        n = len(dataset.frame)
+        self.positions = np.arange(n) if positions is None else np.asarray(positions, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _keep(self, keep):
+        return ResultQuery(self.dataset, self.positions[keep])
+
+    def where(self, mask):
+        """frame と同じ長さの真偽配列で絞る"""
+        return self._keep(np.asarray(mask, dtype=bool)[self.positions])
+
+    def isin(self, column, values):
+        if not values or column not in self.dataset.frame.columns:
+            return self
+        return self._keep(np.isin(self.dataset.column(column)[0][self.positions], [str(v) for v in values]))
+
+    def keyword(self, keyword):
+        if not keyword:
+            return self
+        return self._keep(np.isin(self.positions, self.dataset.keyword_positions(keyword)))
+
+    def values(self, column):
+        """列の値の一覧（空を除いて昇順）"""
+        if column not in self.dataset.frame.columns:
+            return []
+        values, filled = self.dataset.column(column)
+        return sorted(pd.unique(values[self.positions[filled[self.positions]]]))
+
+    def nonempty_columns(self, columns):
+        """columns のうち、結果の行に空でない値が 1 つでもある列"""
+        return [c for c in columns if c in self.dataset.frame.columns and self.dataset.column(c)[1][self.positions].any()]
+
+    def sorted(self, column, ascending=True):
+        """列で並べ替え（空でない値がすべて数値なら数値順）。空の行は最後"""
+        values, filled = self.dataset.column(column)
+        values, filled = pd.Series(values[self.positions]), filled[self.positions]
+        numbers = pd.to_numeric(values.where(filled), errors="coerce")
+        key = numbers if numbers.notna().sum() == filled.sum() else values.where(filled)
+        order = key.sort_values(ascending=ascending, na_position="last", kind="stable").index.to_numpy()
+        return ResultQuery(self.dataset, self.positions[order])
+
+    def page(self, number, size, columns):
+        """number ページ目（0 始まり）の DataFrame（採寸値は widened で float64 に）"""
+        return widened(self.dataset.frame.iloc[self.positions[number * size:(number + 1) * size]][columns])
+
+    def frame(self, columns):
+        """全件の DataFrame（出力用。採寸値は widened で float64 に）"""
+        return widened(self.dataset.frame.iloc[self.positions][columns])
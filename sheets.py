@@ -0,0 +1,287 @@
+# ━━━━━ Google Sheets 操作ヘルパー ━━━━━
+# app.py から使うシート書き込み・読み込みの共通処理。
+# 書き込みはできるだけ 1 回の batchUpdate にまとめて API 往復を減らす。
+import threading
+import time
+
+import gspread
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import numericise
+from requests.adapters import HTTPAdapter
+
+import metrics
+from scheduler import SheetsScheduler
+
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d")
+MISS_RELOAD_SEC = 5  # 無いシートを聞かれたとき、ハンドルをこの秒数より前に取ったものなら取り直す
+
+
+# ━━━━━ A1表記ヘルパー ━━━━━
+def col_letter(n):
+    """1始まりの列番号を A1 表記の列名に変換（1 → A, 27 → AA）"""
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def quote_title(title):
+    """シート名を A1 表記用にクォート（範囲省略時はシート全体を指す）"""
+    return "'" + title.replace("'", "''") + "'"
+
+
+def a1(title, cells):
+    """シート名付きの範囲文字列（'採寸結果'!A2:A）を作る"""
+    return quote_title(title) + "!" + cells
+
+
+def key_str(v):
+    """get_all_records と同じ数値化をしてから文字列で比較できる形にする（1.0 と "1" は同じキー）"""
+    if isinstance(v, str):
+        v = numericise(v.strip())
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip()
+
+
+def parse_dates(values):
+    """日付文字列の列をまとめて datetime に変換（対応形式以外は NaT）"""
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    parsed = pd.to_datetime(text, format=DATE_FORMATS[0], errors="coerce")
+    for fmt in DATE_FORMATS[1:]:
+        missing = parsed.isna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=fmt, errors="coerce")
+    return parsed
+
+
+# ━━━━━ プロセス共有のクライアント ━━━━━
+class SheetsClient:
+    """
+    認証済みクライアント・HTTP セッション・ワークシートのハンドルをプロセス内で共有する。
+    ハンドルは worksheets() 1 回でまとめて取得し、シート名で引く（毎回のメタデータ取得をなくす）。
+    API 呼び出しはすべて scheduler（流量制限・再試行・読み込みの合流）を通す。
+    """
+
+    def __init__(self, spreadsheet, scheduler=None):
+        self.spreadsheet = spreadsheet
+        self.scheduler = scheduler or SheetsScheduler()
+        self.lock = threading.Lock()
+        self.handles = {}
+        self.handles_at = 0.0
+        self.refresh_handles()
+
+    @classmethod
+    def from_service_account(cls, credentials_info, spreadsheet_name, pool_size=16, scheduler=None):
+        # google-auth のセッションはトークン期限切れ時に自動で再取得する
+        gc = gspread.service_account_from_dict(dict(credentials_info), scopes=SCOPES)
+        http_client = getattr(gc, "http_client", gc)  # gspread 6 は http_client、5 は Client 自体
+        session = getattr(http_client, "session", None)
+        if session is not None:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.hooks["response"].append(metrics.count_response_bytes)
+        scheduler = scheduler or SheetsScheduler()
+        spreadsheet = scheduler.read(("open", spreadsheet_name), gc.open, spreadsheet_name)
+        return cls(spreadsheet, scheduler)
+
+    # ---- ワークシートのハンドル ----
+    def refresh_handles(self):
+        worksheets = self.scheduler.read(("worksheets",), self.spreadsheet.worksheets)
+        handles = {ws.title: ws for ws in worksheets}
+        with self.lock:
+            self.handles = handles
+            self.handles_at = time.monotonic()
+
+    def has_worksheet(self, title, max_age=MISS_RELOAD_SEC):
+        """
+        無ければ 1 回だけ取り直して確かめる（起動後に手で追加されたシート・他のプロセスが作った月別シート）。
+        無いシートを毎回聞く画面で取り直しが続かないよう、max_age 秒以内に取ったハンドルならそのまま使う。
+        """
+        with self.lock:
+            if title in self.handles:
+                return True
+            recent = time.monotonic() - self.handles_at < max_age
+        if recent:
+            return False
+        self.refresh_handles()
+        with self.lock:
+            return title in self.handles
+
+    def worksheet(self, title):
+        with self.lock:
+            ws = self.handles.get(title)
+        if ws is None:
+            # 他の人が追加した直後などに備えて 1 回だけ取り直す
+            self.refresh_handles()
+            with self.lock:
+                ws = self.handles.get(title)
+        if ws is None:
+            raise WorksheetNotFound(title)
+        return ws
+
+    def add_worksheet(self, title, rows, cols):
+        ws = self.scheduler.write(title, self.spreadsheet.add_worksheet, title=title, rows=rows, cols=cols)
+        with self.lock:
+            self.handles[title] = ws
+        return ws
+
+    # ---- 読み込み ----
+    def values_batch_get(self, ranges, fresh=False):
+        """fresh: 実行中の同じ読み込みに合流しない（書き込みの直前に行番号を読むとき）"""
+        ranges = list(ranges)
+        key = ("values_batch_get", tuple(ranges)) + ((object(),) if fresh else ())
+        return self.scheduler.read(key, self.spreadsheet.values_batch_get, ranges)
+
+    # ---- 書き込み ----
+    def hold_writes(self, titles):
+        """with sheets.hold_writes(titles): の間、他のスレッドからの titles への書き込みを待たせる"""
+        return self.scheduler.hold(titles)
+
+    def batch_update(self, body, titles):
+        return self.scheduler.write(titles, self.spreadsheet.batch_update, body)
+
+    def append_rows(self, title, rows):
+        return self.scheduler.write(title, self.worksheet(title).append_rows, rows)
+
+
+# ━━━━━ API呼び出しの計測 ━━━━━
+class ApiStats:
+    def __init__(self):
+        self.calls = 0
+        self.started = time.perf_counter()
+
+    def call(self, fn, *args, **kwargs):
+        self.calls += 1
+        return fn(*args, **kwargs)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        return f"API呼び出し {self.calls} 回 / {self.elapsed:.2f} 秒"
+
+
+# ━━━━━ まとめ書き込み（1回の batchUpdate） ━━━━━
+def cell_value(v):
+    # update / append_row（RAW）と同じく、数値は数値・それ以外は文字列のまま書く
+    if isinstance(v, bool):
+        return {"userEnteredValue": {"boolValue": v}}
+    if isinstance(v, (int, float)) and v == v:
+        return {"userEnteredValue": {"numberValue": v}}
+    return {"userEnteredValue": {"stringValue": "" if v is None or v != v else str(v)}}
+
+
+class SheetBatch:
+    def __init__(self, sheets):
+        self.sheets = sheets
+        self.requests = []
+        self.titles = set()
+        self.resized = False
+
+    def _ensure_columns(self, ws, width):
+        # appendCells / updateCells は行は自動で増えるが列は増えないので先に足す
+        if width > ws.col_count:
+            self.requests.append({
+                "appendDimension": {"sheetId": ws.id, "dimension": "COLUMNS", "length": width - ws.col_count}
+            })
+            self.resized = True
+
+    def append_rows(self, ws, rows):
+        # appendCells はデータのある最終行の次から追加する
+        if not rows:
+            return
+        self.titles.add(ws.title)
+        self._ensure_columns(ws, max(len(row) for row in rows))
+        self.requests.append({
+            "appendCells": {
+                "sheetId": ws.id,
+                "rows": [{"values": [cell_value(v) for v in row]} for row in rows],
+                "fields": "userEnteredValue",
+            }
+        })
+
+    def update_cells(self, ws, row, col, rows):
+        """row 行 col 列（1始まり）を左上として rows を上書き"""
+        if not rows:
+            return
+        self.titles.add(ws.title)
+        self._ensure_columns(ws, col - 1 + max(len(r) for r in rows))
+        self.requests.append({
+            "updateCells": {
+                "start": {"sheetId": ws.id, "rowIndex": row - 1, "columnIndex": col - 1},
+                "rows": [{"values": [cell_value(v) for v in r]} for r in rows],
+                "fields": "userEnteredValue",
+            }
+        })
+
+    def clear_values(self, ws):
+        # 書式は残して値だけ消す（ws.clear() 相当）
+        self.titles.add(ws.title)
+        self.requests.append({
+            "updateCells": {"range": {"sheetId": ws.id}, "fields": "userEnteredValue"}
+        })
+
+    def delete_rows(self, ws, row_numbers):
+        # 行番号（1始まり）を連続区間にまとめ、下から順に削除して行ずれを防ぐ
+        for start, end in reversed(contiguous_ranges(row_numbers)):
+            self.titles.add(ws.title)
+            self.requests.append({
+                "deleteDimension": {
+                    "range": {
+                        "sheetId": ws.id,
+                        "dimension": "ROWS",
+                        "startIndex": start - 1,
+                        "endIndex": end,
+                    }
+                }
+            })
+
+    def commit(self, stats=None):
+        if not self.requests:
+            return None
+        body = {"requests": self.requests}
+        titles = sorted(self.titles)
+        self.requests = []
+        self.titles = set()
+        call = stats.call if stats is not None else (lambda fn, *args: fn(*args))
+        response = call(self.sheets.batch_update, body, titles)
+        if self.resized:
+            # 列数が変わったのでハンドル（col_count）を取り直す
+            self.resized = False
+            call(self.sheets.refresh_handles)
+        return response
+
+
+def contiguous_ranges(row_numbers):
+    """[2, 3, 4, 7] → [(2, 4), (7, 7)]"""
+    ranges = []
+    for r in sorted(set(row_numbers)):
+        if ranges and r == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], r)
+        else:
+            ranges.append((r, r))
+    return ranges
+
+
+def key_rows(key_columns, first_row=2):
+    """列ごとの値リスト（[[v], [v], ...] 形式）から、キー → 行番号のリスト"""
+    length = max((len(col) for col in key_columns), default=0)
+    flat = [[(c[i][0] if i < len(c) and c[i] else "") for i in range(length)] for c in key_columns]
+    rows = {}
+    for i, row_key in enumerate(zip(*flat)):
+        rows.setdefault(tuple(key_str(v) for v in row_key), []).append(first_row + i)
+    return rows
+
+
+def find_rows_by_key(key_columns, keys, first_row=2):
+    """キーに一致する行番号（昇順）"""
+    rows = key_rows(key_columns, first_row)
+    wanted = {tuple(key_str(v) for v in k) for k in keys}
+    return sorted(r for k in wanted for r in rows.get(k, []))
@@ -0,0 +1,589 @@
+# ━━━━━ ストレージ（保存先の切り替え） ━━━━━
+# 全ページのデータアクセスはこのインターフェースを通す。
+#   GoogleSheetsStorage : 「採寸管理データ」スプレッドシート（読み込みはローカルミラー経由）
+#   SQLiteStorage       : ローカルの SQLite（大量入力の拠点やオフラインでの代替・計測用）
+# ワークシート名をテーブル名として扱い、行は dict / DataFrame でやり取りする。
+import contextlib
+import json
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from mirror import ChangeLog
+from sheets import ApiStats, SheetBatch, a1, col_letter, find_rows_by_key, key_rows, key_str, quote_title
+
+# SQLite で索引を張る列
+INDEX_COLUMNS = ["商品管理番号", "管理番号", "サイズ", "日付"]
+
+
+def to_text(v):
+    """保存用の文字列に変換（Excel 由来の 1.0 は 1 に、欠損は空文字に）"""
+    if v is None or (isinstance(v, (float, np.floating)) and v != v):
+        return ""
+    if isinstance(v, (float, np.floating)) and v.is_integer():
+        return str(int(v))
+    if isinstance(v, np.float32):  # float32 の採寸値は最短の表記に（45.3 → "45.3"）
+        return np.format_float_positional(v, unique=True, trim="-")
+    return str(v)
+
+
+def to_records(rows):
+    if isinstance(rows, pd.DataFrame):
+        return rows.to_dict("records")
+    return list(rows)
+
+
+def columns_of(records):
+    return list(dict.fromkeys(c for r in records for c in r if c != ""))
+
+
+class Storage:
+    """ワークシート単位の読み込み・追加・キー指定の更新／削除・全置換"""
+
+    name = ""
+
+    def read(self, title):
+        return self.read_many([title])[title]
+
+    def read_many(self, titles):
+        raise NotImplementedError
+
+    def refresh(self, titles, full=False):
+        """
+        読み込みのキャッシュを最新にする（他の人の書き込みを必ず反映させたいとき）。
+        full なら途中行の編集も反映させる（全件を読み直す）。
+        """
+
+    def find(self, title, filters):
+        """filters: 列名 → 値（リストなら IN）。一致する行だけ返す"""
+        df = self.read(title)
+        if df.empty:
+            return df
+        mask = pd.Series(True, index=df.index)
+        for col, value in filters.items():
+            if col not in df.columns:
+                return df.iloc[0:0]
+            values = [to_text(v) for v in value] if isinstance(value, (list, tuple, set)) else [to_text(value)]
+            mask &= df[col].astype(str).isin(values)
+        return df[mask]
+
+    def version(self, title):
+        raise NotImplementedError
+
+    def appended_since(self, title, version):
+        """version からの変更が末尾への追加だけなら、追加が始まった行位置（0 始まり）。それ以外・不明なら None"""
+        return None
+
+    def has(self, title):
+        raise NotImplementedError
+
+    def ensure(self, title, headers=None):
+        raise NotImplementedError
+
+    def append(self, title, rows):
+        raise NotImplementedError
+
+    def delete(self, title, key_cols, keys):
+        raise NotImplementedError
+
+    def upsert(self, title, rows, key_cols):
+        raise NotImplementedError
+
+    def patch(self, title, key_cols, changes):
+        """
+        changes: キー列＋変更する列だけを持つ行。キーが一致する行の、その列のセルだけを書き換える
+        （キーが見つからない行・シートにない列は無視する）
+        """
+        raise NotImplementedError
+
+    def replace(self, title, rows, columns=None):
+        raise NotImplementedError
+
+    def batch(self):
+        """with store.batch() as stats: の中の書き込みをまとめて確定する"""
+        raise NotImplementedError
+
+    def hold(self, titles):
+        """
+        with store.hold(titles): の間、このプロセスの他のスレッドからの titles への書き込みを待たせる
+        （読んだ内容から全体を書き直すときに、その間の書き込みを上書きしないように）
+        """
+        return contextlib.nullcontext()
+
+
+# ━━━━━ Google スプレッドシート ━━━━━
+class GoogleSheetsStorage(Storage):
+    """
+    読み込みはローカルミラー、書き込みはバッチ確定時に
+    「必要な範囲の values batchGet 1 回（＋ヘッダー変更時のみ追加 1 回）→ batchUpdate 1 回」で行う。
+    """
+
+    name = "sheets"
+
+    def __init__(self, sheets, mirror):
+        self.sheets = sheets
+        self.mirror = mirror
+        self.local = threading.local()
+
+    def read_many(self, titles):
+        # 未作成のシート（基準データなど）は空の表として扱う
+        present = [t for t in titles if self.sheets.has_worksheet(t)]
+        frames = self.mirror.load_many(self.sheets, present)
+        return {t: frames.get(t, pd.DataFrame()) for t in titles}
+
+    def refresh(self, titles, full=False):
+        present = [t for t in titles if self.sheets.has_worksheet(t)]
+        if full:
+            for title in present:  # 差分同期は末尾の追加しか見ないので、途中行の編集は全件再同期でないと入らない
+                self.mirror.invalidate(title)
+        if present:
+            self.mirror.sync_many(self.sheets, present)
+
+    def version(self, title):
+        return self.mirror.version(title)
+
+    def appended_since(self, title, version):
+        return self.mirror.appended_since(title, version)
+
+    def has(self, title):
+        return self.sheets.has_worksheet(title)
+
+    def ensure(self, title, headers=None):
+        if self.sheets.has_worksheet(title, max_age=0):  # 作る前は必ず取り直す（既にあると作れない）
+            return
+        self.sheets.add_worksheet(title=title, rows=100, cols=max(26, len(headers or [])))
+        if headers:
+            self.sheets.append_rows(title, [headers])
+
+    # ---- 書き込み（バッチ中は溜めて確定時にまとめる） ----
+    def append(self, title, rows):
+        self._op(("append", title, to_records(rows)))
+
+    def delete(self, title, key_cols, keys):
+        self._op(("delete", title, list(key_cols), list(keys)))
+
+    def upsert(self, title, rows, key_cols):
+        self._op(("upsert", title, to_records(rows), list(key_cols)))
+
+    def patch(self, title, key_cols, changes):
+        self._op(("patch", title, list(key_cols), to_records(changes)))
+
+    def replace(self, title, rows, columns=None):
+        records = to_records(rows)
+        if columns is None:
+            columns = rows.columns.tolist() if isinstance(rows, pd.DataFrame) else columns_of(records)
+        self._op(("replace", title, records, list(columns)))
+
+    @contextlib.contextmanager
+    def batch(self):
+        if getattr(self.local, "ops", None) is not None:
+            yield self.local.stats  # 入れ子は外側のバッチにまとめる
+            return
+        ops, stats = [], ApiStats()
+        self.local.ops, self.local.stats = ops, stats
+        try:
+            yield stats
+        finally:
+            self.local.ops = None
+        self._commit(ops, stats)
+
+    def hold(self, titles):
+        return self.sheets.hold_writes(titles)
+
+    def _op(self, op):
+        ops = getattr(self.local, "ops", None)
+        if ops is not None:
+            ops.append(op)
+        else:
+            self._commit([op], ApiStats())
+
+    def _commit(self, ops, stats):
+        if not ops:
+            return
+        for kind, title, *_ in ops:
+            if kind not in ("delete", "patch"):
+                self.ensure(title)
+        titles = [t for t in dict.fromkeys(op[1] for op in ops) if self.has(t)]
+        ops = [op for op in ops if op[1] in titles]
+        # キー列から行番号を読んでから batchUpdate までの間に、このプロセスの他の書き込み
+        # （保存キュー・アーカイブ移動・他のセッション）で行がずれないよう、シートへの書き込みを止めておく
+        with self.sheets.hold_writes(titles):
+            self._commit_held(ops, titles, stats)
+
+    def _commit_held(self, ops, titles, stats):
+        # 1) ヘッダー・削除キー列・更新対象の全体を 1 回の batchGet で取得
+        hints = {t: (self.mirror.state(t) or {}).get("headers", []) for t in titles}
+        wanted = {}
+        for title in titles:
+            wanted[("header", title)] = a1(title, "1:1")
+        for kind, title, *rest in ops:
+            if kind in ("delete", "patch") and set(rest[0]).issubset(hints[title]):
+                for col in rest[0]:
+                    letter = col_letter(hints[title].index(col) + 1)
+                    wanted[("column", title, col)] = a1(title, f"{letter}2:{letter}")
+            elif kind == "upsert":
+                wanted[("all", title)] = quote_title(title)
+        fetched = dict(zip(
+            wanted,
+            stats.call(self.sheets.values_batch_get, list(wanted.values()), fresh=True)["valueRanges"],
+        ))
+        headers = {t: (fetched[("header", t)].get("values") or [[]])[0] for t in titles}
+
+        # ミラーのヘッダーと違っていたシートだけ、削除キー列を取り直す
+        missing = {}
+        for kind, title, *rest in ops:
+            if kind in ("delete", "patch") and headers[title] != hints[title] and set(rest[0]).issubset(headers[title]):
+                for col in rest[0]:
+                    letter = col_letter(headers[title].index(col) + 1)
+                    missing[("column", title, col)] = a1(title, f"{letter}2:{letter}")
+        if missing:
+            fetched.update(zip(
+                missing,
+                stats.call(self.sheets.values_batch_get, list(missing.values()), fresh=True)["valueRanges"],
+            ))
+
+        # 2) 置換 → 上書き → 削除（下から） → 追加 の順に 1 回の batchUpdate へ
+        batch = SheetBatch(self.sheets)
+        updates, patches, deletes, appends = [], [], {}, []  # deletes: シート名 → (ws, 行番号の集合)
+        for kind, title, *rest in ops:
+            ws = self.sheets.worksheet(title)
+            if kind == "replace":
+                records, columns = rest
+                batch.clear_values(ws)
+                batch.append_rows(ws, [columns] + [[r.get(c, "") for c in columns] for r in records])
+                headers[title] = columns
+            elif kind == "upsert":
+                records, key_cols = rest
+                values = fetched[("all", title)].get("values", [])
+                updates.append((ws, self._plan_upsert(ws, headers, title, values, records, key_cols)))
+            elif kind == "delete":
+                key_cols, keys = rest
+                if not set(key_cols).issubset(headers[title]):
+                    continue
+                columns = [fetched[("column", title, c)].get("values", []) for c in key_cols]
+                # 同じシートへの複数の削除は 1 つにまとめる（行番号は削除前の位置のまま）
+                deletes.setdefault(title, (ws, set()))[1].update(find_rows_by_key(columns, keys))
+            elif kind == "patch":
+                key_cols, records = rest
+                if not set(key_cols).issubset(headers[title]):
+                    continue
+                columns = [fetched[("column", title, c)].get("values", []) for c in key_cols]
+                patches.append((ws, self._plan_patch(headers[title], columns, key_cols, records)))
+            elif kind == "append":
+                appends.append((ws, title, rest[0]))
+
+        for ws, (new_cols, row_updates, new_records) in updates:
+            if new_cols:
+                batch.update_cells(ws, 1, len(headers[ws.title]) - len(new_cols) + 1, [new_cols])
+            for row_number, row in row_updates:
+                batch.update_cells(ws, row_number, 1, [row])
+            appends.insert(0, (ws, ws.title, new_records))
+        for ws, cells in patches:
+            for row_number, col, values in cells:
+                batch.update_cells(ws, row_number, col, [values])
+        for ws, rows in deletes.values():
+            batch.delete_rows(ws, rows)
+        widened = set()
+        for ws, title, records in appends:
+            if not records:
+                continue
+            rows = []
+            if not headers[title]:
+                headers[title] = columns_of(records)
+                rows.append(headers[title])
+            extra = [c for c in columns_of(records) if c not in headers[title]]
+            if extra:  # シートにない列は見出しの右端に足す
+                batch.update_cells(ws, 1, len(headers[title]) + 1, [extra])
+                headers[title] = headers[title] + extra
+                widened.add(title)
+            rows += [[to_text(r.get(h)) for h in headers[title]] for r in records]
+            batch.append_rows(ws, rows)
+        batch.commit(stats)
+
+        # 上書き・削除した行はミラーにも反映し（削除前の行番号なので上書きが先）、
+        # 書き込んだシートのミラーを更新（追加だけなら差分のみ取得）
+        rewritten = {op[1] for op in ops if op[0] == "replace"}
+        rewritten |= {ws.title for ws, (new_cols, _, _) in updates if new_cols}  # ヘッダーが変わると全件再同期
+        rewritten |= widened
+        for ws, (_, row_updates, _) in updates:
+            if ws.title not in rewritten:
+                self.mirror.apply_updates(ws.title, [(r, 1, row) for r, row in row_updates])
+        for ws, cells in patches:
+            if ws.title not in rewritten:
+                self.mirror.apply_updates(ws.title, cells)
+        for ws, rows in deletes.values():
+            if ws.title not in rewritten:
+                self.mirror.apply_deletes(ws.title, rows)
+        self.mirror.sync_many(self.sheets, titles)
+
+    def _plan_patch(self, header, key_columns, key_cols, records):
+        """書き換えるセルを [(行番号, 開始列, 値のリスト)] に。列が連続する部分は 1 つの範囲にまとめる"""
+        rows = key_rows(key_columns)
+        cells = []
+        for record in records:
+            targets = rows.get(tuple(key_str(record.get(k, "")) for k in key_cols), [])
+            positions = sorted(
+                (header.index(c) + 1, to_text(v)) for c, v in record.items() if c in header and c not in key_cols
+            )
+            runs = []
+            for col, value in positions:
+                if runs and col == runs[-1][0] + len(runs[-1][1]):
+                    runs[-1][1].append(value)
+                else:
+                    runs.append((col, [value]))
+            cells += [(row, col, values) for row in targets for col, values in runs]
+        return cells
+
+    def _plan_upsert(self, ws, headers, title, values, records, key_cols):
+        """既存キーの行は上書き、新しいキーは追加。ヘッダーにない列は右端に足す"""
+        current = headers[title]
+        new_cols = [c for c in columns_of(records) if c not in current] if current else []
+        headers[title] = current + new_cols
+        width = len(headers[title])
+        positions = {}
+        for i, row in enumerate(values[1:]):
+            row = (row + [""] * width)[:width]
+            key = tuple(key_str(row[headers[title].index(k)]) for k in key_cols if k in headers[title])
+            positions.setdefault(key, (i + 2, row))
+        row_updates, new_records = [], []
+        for record in records:
+            key = tuple(key_str(record.get(k, "")) for k in key_cols)
+            hit = positions.get(key) if current else None
+            if hit is None:
+                new_records.append(record)
+                continue
+            row_number, row = hit
+            merged = [to_text(record[h]) if h in record else row[i] for i, h in enumerate(headers[title])]
+            row_updates.append((row_number, merged))
+        return new_cols, row_updates, new_records
+
+
+# ━━━━━ ローカル SQLite ━━━━━
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class SQLiteStorage(Storage):
+    """
+    ワークシート 1 枚を 1 テーブルとして保存する。列はすべて TEXT。
+    商品管理番号・管理番号・サイズ・日付には索引を張り、find() は索引付きの SQL で絞り込む。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sheet_meta ("
+            " title TEXT PRIMARY KEY, headers TEXT NOT NULL, version INTEGER NOT NULL)"
+        )
+        self.lock = threading.RLock()
+        self.frames = {}  # title → (version, DataFrame)
+        self.changes = ChangeLog()
+        self.local = threading.local()
+
+    def _table(self, title):
+        return quote_ident("ws:" + title)
+
+    def _meta(self, title):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT headers, version FROM sheet_meta WHERE title = ?", (title,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, 0)
+
+    def headers(self, title):
+        return self._meta(title)[0] or []
+
+    def version(self, title):
+        return self._meta(title)[1]
+
+    def appended_since(self, title, version):
+        return self.changes.appended_since(title, version, self.version(title))
+
+    def has(self, title):
+        return self._meta(title)[0] is not None
+
+    def ensure(self, title, headers=None):
+        with self.lock:
+            if not self.has(title):
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table(title)} (_row INTEGER PRIMARY KEY)")
+                self.conn.execute(
+                    "INSERT INTO sheet_meta (title, headers, version) VALUES (?, '[]', 1)", (title,)
+                )
+            self._add_columns(title, headers or [])
+
+    def _add_columns(self, title, columns):
+        current = self.headers(title)
+        new_cols = [c for c in dict.fromkeys(columns) if c != "" and c not in current]
+        if not new_cols:
+            return current
+        table = self._table(title)
+        for col in new_cols:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {quote_ident(col)} TEXT NOT NULL DEFAULT ''")
+            if col in INDEX_COLUMNS:
+                index = quote_ident(f"ix:{title}:{col}")
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({quote_ident(col)})")
+        headers = current + new_cols
+        self.conn.execute(
+            "UPDATE sheet_meta SET headers = ? WHERE title = ?",
+            (json.dumps(headers, ensure_ascii=False), title),
+        )
+        return headers
+
+    def _bump(self, title, appended_from=None):
+        self.conn.execute("UPDATE sheet_meta SET version = version + 1 WHERE title = ?", (title,))
+        self.changes.record(title, self.version(title), appended_from)
+
+    # ---- 読み込み ----
+    def read_many(self, titles):
+        return {t: self._read(t) for t in titles}
+
+    def _read(self, title):
+        with self.lock:
+            headers, version = self._meta(title)
+            if headers is None:
+                return pd.DataFrame()
+            cached = self.frames.get(title)
+            if cached and cached[0] == version:
+                return cached[1]
+            cols = ", ".join(quote_ident(h) for h in headers) or "_row"
+            sql = f"SELECT {cols} FROM {self._table(title)} ORDER BY _row"
+            start = self.changes.appended_since(title, cached[0], version) if cached and headers else None
+            if start is not None and start == len(cached[1]):
+                # 追加だけなら追加された行だけ読んで継ぎ足す
+                rows = self.conn.execute(sql + " LIMIT -1 OFFSET ?", (start,)).fetchall()
+                df = pd.concat([cached[1], pd.DataFrame(rows, columns=headers)], ignore_index=True)
+            else:
+                rows = self.conn.execute(sql).fetchall()
+                df = pd.DataFrame(rows, columns=headers) if headers else pd.DataFrame()
+            self.frames[title] = (version, df)
+            return df
+
+    def find(self, title, filters):
+        with self.lock:
+            headers = self.headers(title)
+            if not headers:
+                return pd.DataFrame()
+            if not set(filters).issubset(headers):
+                return pd.DataFrame(columns=headers)
+            where, params = [], []
+            for col, value in filters.items():
+                values = [to_text(v) for v in value] if isinstance(value, (list, tuple, set)) else [to_text(value)]
+                where.append(f"{quote_ident(col)} IN ({', '.join('?' * len(values))})" if values else "0")
+                params += values
+            cols = ", ".join(quote_ident(h) for h in headers)
+            sql = f"SELECT {cols} FROM {self._table(title)} WHERE {' AND '.join(where) or '1'} ORDER BY _row"
+            return pd.DataFrame(self.conn.execute(sql, params).fetchall(), columns=headers)
+
+    # ---- 書き込み ----
+    @contextlib.contextmanager
+    def hold(self, titles):
+        with self.lock:  # 書き込みはすべて self.lock の中（batch）
+            yield
+
+    @contextlib.contextmanager
+    def batch(self):
+        with self.lock:
+            if getattr(self.local, "stats", None) is not None:
+                yield self.local.stats
+                return
+            stats = self.local.stats = ApiStats()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield stats
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            finally:
+                self.local.stats = None
+
+    def _insert(self, title, headers, records):
+        if not records:
+            return
+        cols = ", ".join(quote_ident(h) for h in headers)
+        self.conn.executemany(
+            f"INSERT INTO {self._table(title)} ({cols}) VALUES ({', '.join('?' * len(headers))})",
+            [[to_text(r.get(h)) for h in headers] for r in records],
+        )
+
+    def append(self, title, rows):
+        records = to_records(rows)
+        with self.batch():
+            headers = self.headers(title)
+            self.ensure(title, columns_of(records))
+            start = None
+            if headers and self.headers(title) == headers:
+                start = self.conn.execute(f"SELECT COUNT(*) FROM {self._table(title)}").fetchone()[0]
+            self._insert(title, self.headers(title), records)
+            self._bump(title, start)
+
+    def delete(self, title, key_cols, keys):
+        if not self.has(title) or not set(key_cols).issubset(self.headers(title)):
+            return
+        where = " AND ".join(f"{quote_ident(c)} = ?" for c in key_cols)
+        with self.batch():
+            deleted = self.conn.executemany(
+                f"DELETE FROM {self._table(title)} WHERE {where}",
+                [[to_text(v) for v in key] for key in keys],
+            ).rowcount
+            if deleted > 0:  # 消えた行がなければバージョンはそのまま（追加だけの版として継ぎ足せるように）
+                self._bump(title)
+
+    def upsert(self, title, rows, key_cols):
+        records = to_records(rows)
+        with self.batch():
+            self.ensure(title, list(key_cols) + columns_of(records))
+            headers = self.headers(title)
+            table = self._table(title)
+            where = " AND ".join(f"{quote_ident(c)} = ?" for c in key_cols)
+            for record in records:
+                cols = [c for c in record if c in headers and c not in key_cols]
+                key = [to_text(record.get(c)) for c in key_cols]
+                changed = 0
+                if cols:
+                    sets = ", ".join(f"{quote_ident(c)} = ?" for c in cols)
+                    changed = self.conn.execute(
+                        f"UPDATE {table} SET {sets} WHERE {where}",
+                        [to_text(record[c]) for c in cols] + key,
+                    ).rowcount
+                elif self.conn.execute(f"SELECT 1 FROM {table} WHERE {where} LIMIT 1", key).fetchone():
+                    changed = 1
+                if not changed:
+                    self._insert(title, headers, [record])
+            self._bump(title)
+
+    def patch(self, title, key_cols, changes):
+        if not self.has(title) or not set(key_cols).issubset(self.headers(title)):
+            return
+        headers = self.headers(title)
+        table = self._table(title)
+        where = " AND ".join(f"{quote_ident(c)} = ?" for c in key_cols)
+        with self.batch():
+            for record in to_records(changes):
+                cols = [c for c in record if c in headers and c not in key_cols]
+                if cols:
+                    sets = ", ".join(f"{quote_ident(c)} = ?" for c in cols)
+                    self.conn.execute(
+                        f"UPDATE {table} SET {sets} WHERE {where}",
+                        [to_text(record[c]) for c in cols] + [to_text(record.get(c)) for c in key_cols],
+                    )
+            self._bump(title)
+
+    def replace(self, title, rows, columns=None):
+        records = to_records(rows)
+        if columns is None:
+            columns = rows.columns.tolist() if isinstance(rows, pd.DataFrame) else columns_of(records)
+        with self.batch():
+            version = self.version(title)
+            if self.has(title):
+                self.conn.execute(f"DROP TABLE {self._table(title)}")
+                self.conn.execute("DELETE FROM sheet_meta WHERE title = ?", (title,))
+            self.ensure(title, columns)
+            self._insert(title, self.headers(title), records)
+            # 作り直しても版数は前より進める（キャッシュの取り違え防止）
+            self.conn.execute("UPDATE sheet_meta SET version = ? WHERE title = ?", (version + 1, title))
@@ -0,0 +1,37 @@
+# ━━━━━ テスト共通：メモリ上の gspread 代替につないだ保存先 ━━━━━
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_gspread import FakeSpreadsheet  # noqa: E402
+from mirror import SheetMirror  # noqa: E402
+from scheduler import SheetsScheduler  # noqa: E402
+from sheets import SheetsClient  # noqa: E402
+from storage import GoogleSheetsStorage, SQLiteStorage  # noqa: E402
+
+
+def unlimited():
+    return SheetsScheduler(reads_per_minute=10 ** 9, writes_per_minute=10 ** 9, burst=10 ** 9)
+
+
+@pytest.fixture
+def sheets_store(tmp_path):
+    """make(data) → (GoogleSheetsStorage, FakeSpreadsheet)。data: シート名 → 値の二次元リスト"""
+    def make(data):
+        spreadsheet = FakeSpreadsheet(data)
+        store = GoogleSheetsStorage(SheetsClient(spreadsheet, unlimited()), SheetMirror(str(tmp_path / "mirror.sqlite3")))
+        return store, spreadsheet
+    return make
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return SQLiteStorage(str(tmp_path / "measuring.sqlite3"))
+
+
+def sheet_rows(spreadsheet, title):
+    """シートの実際の値（ヘッダーを除く）"""
+    return [list(r) for r in spreadsheet.sheets[title].rows[1:]]
@@ -0,0 +1,31 @@
+# ━━━━━ 採寸結果 → 採寸アーカイブ の移動 ━━━━━
+from datetime import datetime
+
+from archive import ArchiveCheckpoint, migrate
+from conftest import sheet_rows
+from partitions import ArchiveCatalog
+
+HEADER = ["日付", "商品管理番号", "サイズ", "肩幅"]
+RESULTS = [HEADER] + [[f"2026-08-0{i}", f"P{i}", "S", "40"] for i in range(1, 6)] + [["2026-10-17", "P9", "S", "44"]]
+
+
+def archived(store):
+    rows = []
+    for title in ArchiveCatalog(store).entries():
+        rows += store.read(title).values.tolist()
+    return sorted(rows)
+
+
+def test_migrate_moves_middle_row_edits(sheets_store, tmp_path):
+    store, spreadsheet = sheets_store({"採寸結果": [list(r) for r in RESULTS]})
+    store.read("採寸結果")
+    # ミラーを作った後に途中の行が直された（差分同期では見えない）
+    spreadsheet.sheets["採寸結果"].rows[3][3] = "41.5"
+
+    job = migrate(store, ArchiveCheckpoint(str(tmp_path / "archive.sqlite3")), days=30, today=datetime(2026, 10, 18))
+
+    assert job["status"] == "done"
+    assert sheet_rows(spreadsheet, "採寸結果") == [["2026-10-17", "P9", "S", "44"]]
+    moved = [list(r) for r in RESULTS[1:6]]
+    moved[2][3] = "41.5"
+    assert archived(store) == moved
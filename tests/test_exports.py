@@ -0,0 +1,23 @@
+# ━━━━━ 検索結果の出力ファイル ━━━━━
+import os
+import time
+
+import pandas as pd
+
+from exports import EXPORT_MAX_AGE, EXPORT_PREFIX, export, sweep
+
+
+def test_export_sweeps_old_files(tmp_path):
+    old = tmp_path / f"{EXPORT_PREFIX}old.csv"
+    other = tmp_path / "other.csv"
+    for path in (old, other):
+        path.write_text("")
+        stale = time.time() - EXPORT_MAX_AGE - 10
+        os.utime(path, (stale, stale))
+
+    path = export(pd.DataFrame({"肩幅": ["45.3"]}), "csv", str(tmp_path))
+
+    assert os.path.basename(path).startswith(EXPORT_PREFIX)
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(path), "other.csv"])
+    sweep(str(tmp_path))
+    assert os.path.exists(path)  # 作ったばかりのものは消さない
@@ -0,0 +1,45 @@
+# ━━━━━ float32 の採寸値の表記（45.3 が 45.29999923706055 にならない） ━━━━━
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from exports import export
+from indexes import MeasurementLookup
+from normalize import normalize, widen
+from search import MeasurementDataset, ResultQuery
+from storage import to_text
+
+RESULTS = pd.DataFrame({
+    "日付": ["2026-10-01", "2026-10-02"],
+    "商品管理番号": ["P1", "P2"],
+    "サイズ": ["S", "M"],
+    "肩幅": ["45.3", "0.1"],
+    "着丈": ["40", ""],
+})
+
+
+def test_to_text_round_trips_float32():
+    for text in ["45.3", "0.1", "40", "123.45"]:
+        assert to_text(np.float32(text)) == text
+    assert widen(np.array([45.3, 0.1, np.nan], dtype="float32")).tolist()[:2] == [45.3, 0.1]
+
+
+def test_lookup_rows_keep_original_text():
+    typed = normalize(RESULTS)
+    assert typed["肩幅"].dtype == np.float32
+    rows = MeasurementLookup(typed).rows("P1", ["S"], ["肩幅", "着丈"])
+    assert rows.loc["S"].tolist() == ["45.3", "40"]
+    assert MeasurementLookup(typed).rows("P2", ["M"], ["肩幅"]).loc["M", "肩幅"] == "0.1"
+
+
+def test_export_keeps_original_text(tmp_path):
+    result = ResultQuery(MeasurementDataset([("採寸結果", normalize(RESULTS))]))
+    frame = result.frame(["商品管理番号", "肩幅"])
+
+    path = export(frame, "csv", str(tmp_path))
+    with open(path, encoding="utf-8-sig") as f:
+        assert f.read().splitlines() == ["商品管理番号,肩幅", "P1,45.3", "P2,0.1"]
+
+    path = export(frame, "xlsx", str(tmp_path))
+    ws = load_workbook(path).active
+    assert [ws["B2"].value, ws["B3"].value] == [45.3, 0.1]
@@ -0,0 +1,138 @@
+# ━━━━━ インポートの差分計算と保存 ━━━━━
+import pandas as pd
+import pytest
+
+from conftest import sheet_rows
+from imports import (PRODUCT_KEYS, STANDARD_KEYS, check_measurements, diff_by_key, replace_by_key, replaced_keys,
+                     save_diff, text_frame)
+
+MASTER = [["管理番号", "サイズ", "商品名", "カラー"], ["P1", "S", "シャツ", "黒"], ["P1", "M", "シャツ", "黒"],
+          ["P2", "1", "パンツ", "白"]]
+STANDARDS = [["商品管理番号", "サイズ", "肩幅"], ["P1", "S", "40"], ["P1", "M", "42"], ["P2", "S", "38"]]
+
+
+def test_replaced_keys_counts_only_existing_keys():
+    current = pd.DataFrame(STANDARDS[1:], columns=STANDARDS[0])
+    incoming = text_frame(pd.DataFrame({"商品管理番号": ["P1", "P3"], "サイズ": ["S", "S"], "肩幅": [41, 30]}))
+    keys, removed, fresh = replaced_keys(current, incoming, STANDARD_KEYS)
+    assert (keys, removed, fresh) == ([("P1", "S")], 1, 1)
+
+
+def test_replace_by_key_replaces_keys_missing_from_stale_mirror(sheets_store):
+    store, spreadsheet = sheets_store({"基準データ": [list(r) for r in STANDARDS]})
+    store.read("基準データ")
+    spreadsheet.sheets["基準データ"].rows.append(["P3", "S", "30"])  # ミラーがまだ知らない行
+
+    incoming = text_frame(pd.DataFrame({"商品管理番号": ["P1", "P3"], "サイズ": ["S", "S"], "肩幅": [41, 31]}))
+    replace_by_key(store, "基準データ", incoming, STANDARD_KEYS)
+
+    assert sheet_rows(spreadsheet, "基準データ") == [["P1", "M", "42"], ["P2", "S", "38"], ["P1", "S", "41"], ["P3", "S", "31"]]
+
+
+def master_frame():
+    return pd.DataFrame(MASTER[1:], columns=MASTER[0])
+
+
+def test_diff_by_key_splits_inserts_updates_and_unchanged():
+    incoming = pd.DataFrame({
+        "管理番号": ["P1", "P1", "P2", "P3", "P3"],
+        "サイズ": ["S", "M", 1.0, "S", "S"],   # Excel 由来の 1.0 は "1" と同じキー
+        "商品名": ["シャツ", "シャツ", "パンツ", "帽子", "キャップ"],
+        "カラー": ["黒", "紺", "白", "赤", "赤"],
+        "備考": ["", "", "", "", ""],
+    })
+    diff = diff_by_key(master_frame(), incoming, PRODUCT_KEYS)
+
+    assert diff.counts() == {"追加": 1, "更新": 1, "変更なし": 2}
+    assert diff.inserted[["管理番号", "商品名"]].values.tolist() == [["P3", "キャップ"]]  # 重なったキーは後の行
+    assert diff.changes == [{"管理番号": "P1", "サイズ": "M", "カラー": "紺"}]  # 変わったセルだけ
+    assert diff.unknown_columns == ["備考"]
+
+
+def test_diff_by_key_against_empty_sheet_inserts_everything():
+    incoming = pd.DataFrame({"管理番号": ["P1"], "サイズ": ["S"]})
+    diff = diff_by_key(pd.DataFrame(), incoming, PRODUCT_KEYS)
+    assert diff.counts() == {"追加": 1, "更新": 0, "変更なし": 0}
+
+
+def test_save_diff_rediffs_against_fresh_sheet(sheets_store):
+    store, spreadsheet = sheets_store({"商品マスタ": [list(r) for r in MASTER]})
+    store.read("商品マスタ")
+    spreadsheet.sheets["商品マスタ"].rows.append(["P3", "S", "帽子", "赤"])  # ミラーがまだ知らない行
+
+    incoming = pd.DataFrame({"管理番号": ["P3", "P4"], "サイズ": ["S", "S"], "商品名": ["帽子", "靴"], "カラー": ["青", "黒"]})
+    saved = save_diff(store, "商品マスタ", incoming, PRODUCT_KEYS)
+
+    assert saved.counts() == {"追加": 1, "更新": 1, "変更なし": 0}
+    assert sheet_rows(spreadsheet, "商品マスタ")[3:] == [["P3", "S", "帽子", "青"], ["P4", "S", "靴", "黒"]]
+
+
+# ━━━━━ 採寸の一括取り込みの検証 ━━━━━
+PRODUCTS = pd.DataFrame(
+    [["P1", "S", "A", "トップス", "シャツ", "黒"], ["P1", "M", "A", "トップス", "シャツ", "黒"],
+     ["P2", "1", "B", "パンツ", "スラックス", "白"], ["P3", "F", "C", "小物", "帽子", "赤"]],
+    columns=["管理番号", "サイズ", "ブランド", "ジャンル", "商品名", "カラー"],
+)
+ITEMS = {"トップス": ["肩幅", "着丈"], "パンツ": ["ウエスト"]}
+
+
+def upload_frame(rows, columns=("商品管理番号", "サイズ", "肩幅", "着丈", "ウエスト")):
+    return pd.DataFrame(rows, columns=list(columns))
+
+
+def test_check_measurements_takes_product_columns_from_master():
+    upload = upload_frame([["P1", "S", "40", "60", ""], ["P2", "1", "", "", "72.5"]])
+    result = check_measurements(upload, PRODUCTS, ITEMS, "2026-01-01")
+    assert result.counts() == {"取り込み": 2, "エラー": 0, "空行": 0}
+    assert result.rows["ブランド"].tolist() == ["A", "B"]
+    assert result.rows["商品名"].tolist() == ["シャツ", "スラックス"]
+    assert result.rows["日付"].tolist() == ["2026-01-01", "2026-01-01"]
+    assert result.master_keys == [("P1", "S"), ("P2", "1")]
+
+
+def test_check_measurements_reports_first_failing_reason_per_row():
+    upload = upload_frame([
+        ["", "S", "40", "", ""],       # 2 行目
+        ["P1", "M", "40", "", ""],     # 3 行目: 後の行と同じ
+        ["P1", "M", "41", "", ""],
+        ["P9", "S", "40", "", ""],     # 5 行目: マスタにない
+        ["P3", "F", "40", "", ""],     # 6 行目: テンプレートのないジャンル
+        ["P1", "S", "40", "", "70"],   # 7 行目: トップスにウエストはない
+        ["P2", "1", "", "", "七十"],    # 8 行目
+    ])
+    result = check_measurements(upload, PRODUCTS, ITEMS, "2026-01-01")
+    assert result.errors["行"].tolist() == [2, 3, 5, 6, 7, 8]
+    assert result.errors["理由"].tolist() == [
+        "商品管理番号・サイズが空",
+        "ファイル内の後の行と同じ商品・サイズ",
+        "商品マスタにない（採寸済み、または未登録）",
+        "ジャンルの採寸テンプレートがない",
+        "テンプレートにない項目: ウエスト",
+        "数値でない値: ウエスト",
+    ]
+    assert result.rows["肩幅"].tolist() == ["41"]
+
+
+def test_check_measurements_dates_blank_rows_and_unknown_columns():
+    upload = pd.DataFrame({
+        "管理番号": ["P1", "P1", "P2"], "サイズ": ["S", "M", "1"], "日付": ["2025/3/4", "", "昨日"],
+        "肩幅": ["40", "", ""], "ウエスト": ["", "", "70"], "メモ": ["x", "", ""],
+    })
+    result = check_measurements(upload, PRODUCTS, ITEMS, "2026-01-01")
+    assert result.counts() == {"取り込み": 1, "エラー": 1, "空行": 1}
+    assert result.rows["日付"].tolist() == ["2025-03-04"]
+    assert result.errors["理由"].tolist() == ["日付が読めない"]
+    assert result.unknown_columns == ["メモ"]
+
+
+def test_check_measurements_requires_key_columns():
+    with pytest.raises(ValueError, match="商品管理番号"):
+        check_measurements(pd.DataFrame({"サイズ": ["S"], "肩幅": ["40"]}), PRODUCTS, ITEMS, "2026-01-01")
+
+
+def test_measurement_import_batches_keep_rows_and_keys_aligned():
+    upload = upload_frame([["P1", "S", "40", "", ""], ["P1", "M", "42", "", ""], ["P2", "1", "", "", "70"]])
+    batches = list(check_measurements(upload, PRODUCTS, ITEMS, "2026-01-01").batches(chunk_rows=2))
+    assert [len(records) for records, _ in batches] == [2, 1]
+    assert [(r["商品管理番号"], r["サイズ"]) for r in batches[0][0]] == batches[0][1]
+    assert batches[1][1] == [("P2", "1")]
@@ -0,0 +1,81 @@
+# ━━━━━ 保存ジャーナル：再送しても行が重複せず、ほかの行には触らない ━━━━━
+import re
+
+from conftest import sheet_rows
+from journal import SAVE_ID, SaveJournal, flush, send
+
+HEADER = ["日付", "商品管理番号", "サイズ", "肩幅"]
+MASTER = [["管理番号", "サイズ"], ["P1", "S"], ["P1", "M"]]
+
+
+def setup(sheets_store, tmp_path):
+    store, spreadsheet = sheets_store({"採寸結果": [HEADER, ["2026-10-18", "P1", "S", "40"]], "商品マスタ": MASTER})
+    return store, spreadsheet, SaveJournal(str(tmp_path / "save_journal.sqlite3"))
+
+
+def measured(spreadsheet):
+    return [r[:4] for r in sheet_rows(spreadsheet, "採寸結果")]
+
+
+def test_first_send_only_appends(sheets_store, tmp_path):
+    store, spreadsheet, journal = setup(sheets_store, tmp_path)
+    key = journal.enqueue([{"日付": "2026-10-18", "商品管理番号": "P1", "サイズ": "S", "肩幅": 41}], [("P1", "S")])
+
+    assert flush(store, journal) == 1
+    # 同じ (日付, 商品管理番号, サイズ) の測り直しでも前の行は残す
+    assert measured(spreadsheet) == [["2026-10-18", "P1", "S", "40"], ["2026-10-18", "P1", "S", "41"]]
+    assert spreadsheet.sheets["採寸結果"].rows[0][-1] == SAVE_ID
+    assert sheet_rows(spreadsheet, "採寸結果")[1][-1] == key
+    assert sheet_rows(spreadsheet, "商品マスタ") == [["P1", "M"]]
+    assert journal.counts() == {"pending": 0, "failed": 0}
+
+
+def test_resend_after_unrecorded_send_does_not_duplicate(sheets_store, tmp_path):
+    store, spreadsheet, journal = setup(sheets_store, tmp_path)
+    journal.enqueue([{"日付": "2026-10-18", "商品管理番号": "P1", "サイズ": "S", "肩幅": 41}], [("P1", "S")])
+    journal.enqueue([{"日付": "2026-10-18", "商品管理番号": "P1", "サイズ": "M", "肩幅": 43}], [("P1", "M")])
+    # 1 件目は送れたが、完了を記録する前に止まった
+    first = journal.due(1)
+    journal.sending([first[0]["id"]])
+    send(store, first)
+    assert journal.counts() == {"pending": 2, "failed": 0}
+
+    assert flush(store, journal) == 2
+    assert measured(spreadsheet) == [
+        ["2026-10-18", "P1", "S", "40"], ["2026-10-18", "P1", "S", "41"], ["2026-10-18", "P1", "M", "43"],
+    ]
+    assert sheet_rows(spreadsheet, "商品マスタ") == []
+
+
+def test_double_save_is_one_job(sheets_store, tmp_path):
+    store, spreadsheet, journal = setup(sheets_store, tmp_path)
+    rows = [{"日付": "2026-10-18", "商品管理番号": "P1", "サイズ": "M", "肩幅": 42}]
+    assert journal.enqueue(rows, [("P1", "M")]) == journal.enqueue(rows, [("P1", "M")])
+
+    flush(store, journal)
+    assert measured(spreadsheet)[1:] == [["2026-10-18", "P1", "M", "42"]]
+
+
+def test_large_jobs_are_sent_one_batch_at_a_time(sheets_store, tmp_path):
+    store, spreadsheet, journal = setup(sheets_store, tmp_path)
+    for size in ["S", "M"]:
+        rows = [{"日付": "2026-10-18", "商品管理番号": f"Q{i}", "サイズ": size, "肩幅": 40} for i in range(3)]
+        journal.enqueue(rows, [])
+
+    assert [len(j["rows"]) for j in journal.due(max_rows=4)] == [3]
+    assert [len(j["rows"]) for j in journal.due(max_rows=6)] == [3, 3]
+
+
+def test_flush_records_api_calls_of_the_batch(sheets_store, tmp_path):
+    store, spreadsheet, journal = setup(sheets_store, tmp_path)
+    assert journal.last_sent() is None
+    journal.enqueue([{"日付": "2026-10-18", "商品管理番号": "P1", "サイズ": "M", "肩幅": 42}], [("P1", "M")])
+    journal.enqueue([{"日付": "2026-10-18", "商品管理番号": "P1", "サイズ": "S", "肩幅": 41}], [("P1", "S")])
+
+    flush(store, journal)
+
+    assert re.fullmatch(r"2 件 / API呼び出し \d+ 回 / \d+\.\d\d 秒", journal.last_sent())
+    # 次のバッチ（保存IDの列は追加済み）：batchGet（ヘッダー＋削除キー列）1 回＋batchUpdate 1 回
+    journal.enqueue([{"日付": "2026-10-18", "商品管理番号": "P1", "サイズ": "L", "肩幅": 44}], [])
+    flush(store, journal)
+    assert journal.last_sent().startswith("1 件 / API呼び出し 2 回 / ")
@@ -0,0 +1,44 @@
+# ━━━━━ ヘッダー初期化：全体を書き直しても保存済みの行を消さない ━━━━━
+import threading
+
+from conftest import sheet_rows
+from maintenance import reinit_headers
+
+HEADER = ["日付", "商品管理番号", "サイズ", "肩幅"]
+RESULTS = [HEADER] + [["2026-10-01", f"P{i}", "S", "40"] for i in range(1, 4)]
+
+
+def test_reinit_keeps_rows_the_mirror_has_not_seen(sheets_store):
+    store, spreadsheet = sheets_store({"採寸結果": [list(r) for r in RESULTS]})
+    store.read("採寸結果")
+    rows = spreadsheet.sheets["採寸結果"].rows
+    rows[2][3] = "41.5"                                 # 途中行の編集（差分同期では見えない）
+    rows.append(["2026-10-02", "P4", "S", "42"])       # ミラーの後の追加
+
+    reinit_headers(store, "採寸結果", HEADER + ["備考"])
+
+    assert spreadsheet.sheets["採寸結果"].rows[0] == HEADER + ["備考"]
+    assert [r[:4] for r in sheet_rows(spreadsheet, "採寸結果")] == [
+        ["2026-10-01", "P1", "S", "40"], ["2026-10-01", "P2", "S", "41.5"],
+        ["2026-10-01", "P3", "S", "40"], ["2026-10-02", "P4", "S", "42"],
+    ]
+
+
+def test_reinit_waits_for_saves_that_land_during_it(sheets_store):
+    store, spreadsheet = sheets_store({"採寸結果": [list(r) for r in RESULTS]})
+    store.read("採寸結果")
+    refresh = store.refresh
+    save = threading.Thread(target=store.append, args=("採寸結果", [{"日付": "2026-10-02", "商品管理番号": "P9",
+                                                                    "サイズ": "S", "肩幅": "44"}]))
+
+    def refresh_then_save(*args, **kwargs):
+        refresh(*args, **kwargs)
+        if save.ident is None:
+            save.start()  # 読み直した直後に保存キューの送信が来る
+            save.join(0.5)
+
+    store.refresh = refresh_then_save
+    reinit_headers(store, "採寸結果", HEADER + ["備考"])
+    save.join()
+
+    assert [r[1] for r in sheet_rows(spreadsheet, "採寸結果")] == ["P1", "P2", "P3", "P9"]
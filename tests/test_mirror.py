@@ -0,0 +1,77 @@
+# ━━━━━ SheetMirror：差分同期と全件再同期 ━━━━━
+from benchmarks.fake_gspread import FakeSpreadsheet
+from conftest import unlimited
+from mirror import SheetMirror
+from sheets import SheetsClient
+
+RESULTS = [["日付", "商品管理番号", "肩幅"]] + [["2026-10-01", f"P{i}", "40"] for i in range(1, 6)]
+
+
+def setup(tmp_path):
+    spreadsheet = FakeSpreadsheet({"採寸結果": [list(r) for r in RESULTS]})
+    sheets = SheetsClient(spreadsheet, unlimited())
+    mirror = SheetMirror(str(tmp_path / "mirror.sqlite3"))
+    mirror.sync_many(sheets, ["採寸結果"])
+    return spreadsheet, sheets, mirror
+
+
+def mirrored(mirror):
+    return mirror.read("採寸結果").values.tolist()
+
+
+def test_delta_sync_fetches_only_appended_rows(tmp_path):
+    spreadsheet, sheets, mirror = setup(tmp_path)
+    version = mirror.version("採寸結果")
+    spreadsheet.sheets["採寸結果"].rows += [["2026-10-02", "P6", "41"], ["2026-10-02", "P7", "42"]]
+    spreadsheet.reset_counters()
+
+    mirror.sync_many(sheets, ["採寸結果"])
+
+    assert mirrored(mirror) == [r for r in spreadsheet.sheets["採寸結果"].rows[1:]]
+    assert mirror.appended_since("採寸結果", version) == 5
+    # ヘッダー行・アンカー行・追加行だけ（全件は読まない）
+    assert spreadsheet.cells_read == 3 + 3 + 6
+
+
+def test_anchor_change_triggers_full_resync(tmp_path):
+    spreadsheet, sheets, mirror = setup(tmp_path)
+    version = mirror.version("採寸結果")
+    del spreadsheet.sheets["採寸結果"].rows[-1]  # 最終行の削除はアンカー行の不一致で分かる
+
+    mirror.sync_many(sheets, ["採寸結果"])
+
+    assert mirrored(mirror) == RESULTS[1:-1]
+    assert mirror.appended_since("採寸結果", version) is None
+
+
+def test_header_change_triggers_full_resync(tmp_path):
+    spreadsheet, sheets, mirror = setup(tmp_path)
+    spreadsheet.sheets["採寸結果"].rows[0] = ["日付", "商品管理番号", "肩幅", "着丈"]
+
+    mirror.sync_many(sheets, ["採寸結果"])
+
+    assert mirror.read("採寸結果").columns.tolist() == ["日付", "商品管理番号", "肩幅", "着丈"]
+
+
+def test_middle_edit_needs_full_resync(tmp_path):
+    spreadsheet, sheets, mirror = setup(tmp_path)
+    spreadsheet.sheets["採寸結果"].rows[2][2] = "41.5"
+
+    mirror.sync_many(sheets, ["採寸結果"])
+    assert mirrored(mirror)[1][2] == "40"  # 途中行の編集は差分同期では見えない
+
+    mirror.invalidate("採寸結果")
+    mirror.sync_many(sheets, ["採寸結果"])
+    assert mirrored(mirror)[1][2] == "41.5"
+
+
+def test_own_deletes_are_applied_without_resync(tmp_path):
+    spreadsheet, sheets, mirror = setup(tmp_path)
+    del spreadsheet.sheets["採寸結果"].rows[2:4]
+    mirror.apply_deletes("採寸結果", [3, 4])
+    spreadsheet.reset_counters()
+
+    mirror.sync_many(sheets, ["採寸結果"])
+
+    assert mirrored(mirror) == [r for r in spreadsheet.sheets["採寸結果"].rows[1:]]
+    assert spreadsheet.cells_read == 3 + 3  # ヘッダー行とアンカー行だけ
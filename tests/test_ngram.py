@@ -0,0 +1,48 @@
+# ━━━━━ キーワード検索の n-gram 転置インデックス ━━━━━
+import pandas as pd
+
+from indexes import NGramIndex, parse_query, row_texts, text_matches
+
+PRODUCTS = pd.DataFrame({
+    "商品名": ["ウールコート", "コットンシャツ", "ｳｰﾙ ニット", "デニムパンツ"],
+    "商品管理番号": ["A100", "A200", "B100", "AB300"],
+    "ブランド": ["BrandX", "BrandY", "brandx", "BrandZ"],
+    "カラー": ["黒", "白", "グレー", "紺"],
+    "備考": ["", "", "", ""],
+})
+
+
+def brute_force(df, query):
+    terms = parse_query(query)
+    return [i for i, text in enumerate(row_texts(df)) if text_matches(text, terms)]
+
+
+def test_parse_query_normalizes_and_reads_prefix_terms():
+    assert parse_query("ＢｒａｎｄX  a1* *") == [("brandx", False), ("a1", True)]
+
+
+def test_search_matches_brute_force():
+    index = NGramIndex()
+    index.add(PRODUCTS)
+    for query in ["ウール", "brandx", "Ｂrand", "a1*", "a*", "b1*", "シャツ 白", "黒 白", "ン", "", "存在しない"]:
+        assert index.search(query).tolist() == brute_force(PRODUCTS, query), query
+
+
+def test_prefix_term_matches_start_of_a_column_only():
+    index = NGramIndex()
+    index.add(PRODUCTS)
+    assert index.search("b*").tolist() == [0, 1, 2, 3]  # ブランドの先頭
+    assert index.search("b1*").tolist() == [2]          # AB300 の途中の B は数えない
+
+
+def test_sync_adds_appended_rows_and_rebuilds_on_other_changes():
+    index = NGramIndex()
+    index.sync(PRODUCTS.iloc[:2])
+    index.sync(PRODUCTS)
+    assert len(index) == 4
+    assert index.search("デニム").tolist() == [3]
+
+    changed = PRODUCTS.assign(商品名=["リネンコート", *PRODUCTS["商品名"].iloc[1:]])
+    index.sync(changed)
+    assert index.search("ウール").tolist() == [2]
+    assert index.search("リネン").tolist() == [0]
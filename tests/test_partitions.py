@@ -0,0 +1,45 @@
+# ━━━━━ 採寸アーカイブの月別パーティションの選択 ━━━━━
+import pandas as pd
+
+from partitions import ARCHIVE, UNDATED, ArchiveCatalog, may_contain, months_of, partition_title
+
+AUGUST = {"件数": "3", "最小日付": "2026-08-01", "最大日付": "2026-08-31", "最小管理番号": "P100", "最大管理番号": "P250"}
+
+
+def test_may_contain_checks_date_and_pid_ranges():
+    assert may_contain(AUGUST, "2026-08-31", "2026-09-30")
+    assert not may_contain(AUGUST, "2026-09-01")
+    assert not may_contain(AUGUST, None, "2026-07-31")
+    assert may_contain(AUGUST, pid_prefix="P2")
+    assert may_contain(AUGUST, pid_prefix="P1")
+    assert not may_contain(AUGUST, pid_prefix="P3")
+    assert not may_contain(AUGUST, pid_prefix="P09")
+
+
+def test_may_contain_reads_unknown_and_skips_split_entries():
+    assert may_contain({}, "2026-01-01", "2026-01-31", "Z")  # 範囲が不明なら読む
+    assert may_contain({"件数": "", "最小日付": "", "最大日付": ""}, "2026-01-01")
+    assert not may_contain({"件数": "0"})
+    assert not may_contain({"件数": "5", "分割済み行数": "5"})  # 旧形式で全部移した
+    assert may_contain({"件数": "5", "分割済み行数": "3"})
+
+
+def test_months_of_marks_unreadable_dates():
+    df = pd.DataFrame({"日付": ["2026-08-31", "", "2026/9/1", "不明"]})
+    assert months_of(df).tolist() == ["2026-08", UNDATED, "2026-09", UNDATED]
+
+
+def test_archive_catalog_selects_partitions(sqlite_store):
+    catalog = ArchiveCatalog(sqlite_store)
+    rows = pd.DataFrame({"日付": ["2026-08-02", "2026-09-10", "2026-09-20", ""],
+                         "商品管理番号": ["P100", "P200", "P300", "P400"], "サイズ": ["S", "S", "M", "L"]})
+    with sqlite_store.batch():
+        catalog.append(rows)
+    sqlite_store.ensure(ARCHIVE, list(rows.columns))  # 目録にない旧形式
+
+    august, september, undated = (partition_title(m) for m in ("2026-08", "2026-09", UNDATED))
+    assert catalog.entries()[september]["件数"] == "2"
+    assert catalog.entries()[september]["最大管理番号"] == "P300"
+    assert catalog.select() == [ARCHIVE, august, september, undated]
+    assert catalog.select("2026-09-01", "2026-09-30") == [ARCHIVE, september, undated]
+    assert catalog.select(pid_prefix="P1") == [ARCHIVE, august]
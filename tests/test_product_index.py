@@ -0,0 +1,53 @@
+# ━━━━━ 採寸入力の選択肢（ProductIndex） ━━━━━
+import pandas as pd
+
+from indexes import ProductIndex, ProductIndexCache
+from normalize import TypedCache
+
+MASTER = pd.DataFrame([
+    ["B", "P10", "S", "シャツ", "白シャツ", "白"],
+    ["A", "P2", "M", "パンツ", "スラックス", "黒"],
+    ["A", "P10", "S", "シャツ", "ネルシャツ", "赤"],
+    ["A", "P2", "L", "パンツ", "スラックス", "黒"],
+    ["A", "X", "F", "小物", "帽子", "青"],
+    ["A", "P1", "F", "小物", "ベルト", "茶"],
+], columns=["ブランド", "管理番号", "サイズ", "ジャンル", "商品名", "カラー"])
+TEMPLATE = pd.DataFrame({"ジャンル": ["パンツ", "パンツ"],
+                         "採寸項目": ["総丈、裾幅（cm）, ウエスト", "無視される 2 行目"]})
+
+
+def test_product_index_orders_brands_and_pids():
+    index = ProductIndex(MASTER, TEMPLATE)
+    assert index.brands == ["B", "A"]  # 商品マスタの並び
+    assert index.pids("A") == ["P1", "P2", "P10", "X"]  # 数字は数値順、数字のない番号は最後
+    assert index.sizes("A", "P2") == ["M", "L"]
+    assert index.product("A", "P10") == {"ジャンル": "シャツ", "商品名": "ネルシャツ", "カラー": "赤"}
+    assert index.pids("C") == [] and index.sizes("A", "P3") == []
+
+
+def test_product_index_hides_measured_sizes():
+    index = ProductIndex(MASTER, TEMPLATE)
+    hidden = {("P2", "M"), ("P1", "F")}
+    assert index.pids("A", hidden) == ["P2", "P10", "X"]  # P2 は L が残る
+    assert index.sizes("A", "P2", hidden) == ["L"]
+
+
+def test_product_index_items_put_custom_order_first():
+    index = ProductIndex(MASTER, TEMPLATE)
+    assert index.items("パンツ") == ["ウエスト", "裾幅", "総丈"]
+    assert index.items("シャツ") == []
+
+
+def test_product_index_without_master():
+    index = ProductIndex(pd.DataFrame(), pd.DataFrame())
+    assert index.brands == [] and index.pids("A") == [] and index.items("パンツ") == []
+
+
+def test_product_index_cache_rebuilds_on_change(sqlite_store):
+    sqlite_store.ensure("商品マスタ", list(MASTER.columns))
+    sqlite_store.append("商品マスタ", MASTER.to_dict("records"))
+    cache = ProductIndexCache(TypedCache(sqlite_store))
+    first = cache.get()
+    assert cache.get() is first
+    sqlite_store.append("商品マスタ", [{"ブランド": "C", "管理番号": "P5", "サイズ": "S"}])
+    assert cache.get().brands == ["B", "A", "C"]
@@ -0,0 +1,71 @@
+# ━━━━━ 採寸データの検索（期間・管理番号での絞り込み、行位置のままの検索結果） ━━━━━
+import numpy as np
+import pandas as pd
+
+from indexes import NGramIndex
+from normalize import normalize
+from search import MeasurementDataset, ResultQuery
+
+RESULTS = pd.DataFrame({
+    "日付": ["2026-10-01", "2025-01-15", "", "不明", "2026-09-30"],
+    "商品管理番号": ["P100", "P100", "P200", "P101", "Q100"],
+    "サイズ": ["S", "M", "S", "S", "S"],
+    "肩幅": ["40", "41", "42", "43", "44"],
+})
+
+
+def dataset():
+    return MeasurementDataset([("採寸結果", normalize(RESULTS))])
+
+
+def test_range_mask_filters_dates_and_pid_prefix():
+    mask = dataset().range_mask("2026-01-01", "2026-12-31", "P1")
+    assert mask.tolist() == [True, False, False, False, False]
+
+
+def test_range_mask_keeps_undated_rows_only_when_asked():
+    data = dataset()
+    assert data.range_mask("2025-10-18", "2026-10-18").tolist() == [True, False, False, False, True]
+    assert data.range_mask("2025-10-18", "2026-10-18", keep_undated=True).tolist() == [True, False, True, True, True]
+
+
+ARCHIVE = pd.DataFrame({
+    "日付": ["2026-08-01", "2026-08-02"],
+    "商品管理番号": ["P300", "P100"],
+    "ブランド": ["BrandY", "BrandX"],
+    "商品名": ["シャツ", "コート"],
+    "サイズ": ["L", "S"],
+    "肩幅": ["9", ""],
+})
+
+
+def combined():
+    results = RESULTS.assign(ブランド=["BrandX", "BrandX", "BrandY", "BrandX", "BrandZ"],
+                             商品名=["コート", "コート", "シャツ", "ニット", "パンツ"])
+    return MeasurementDataset([("採寸結果", results), ("採寸アーカイブ_2026-08", ARCHIVE)],
+                              {"採寸結果": NGramIndex(), "採寸アーカイブ_2026-08": NGramIndex()})
+
+
+def test_result_query_filters_by_positions():
+    query = ResultQuery(combined())
+    assert len(query) == 7
+    assert query.isin("ブランド", ["BrandX"]).positions.tolist() == [0, 1, 3, 6]
+    assert query.keyword("コート").positions.tolist() == [0, 1, 6]  # アーカイブの行は結合後の位置
+    assert query.isin("ブランド", ["BrandX"]).keyword("ニット").positions.tolist() == [3]
+    assert query.where(np.isin(np.arange(7), [0, 2, 5])).values("サイズ") == ["L", "S"]
+
+
+def test_result_query_sorts_numbers_numerically_with_empty_last():
+    query = ResultQuery(combined())
+    ordered = query.sorted("肩幅")
+    assert ordered.page(0, 10, ["肩幅"])["肩幅"].tolist()[:6] == [9.0, 40.0, 41.0, 42.0, 43.0, 44.0]
+    assert np.isnan(ordered.page(0, 10, ["肩幅"])["肩幅"].iloc[6])
+    assert query.sorted("肩幅", ascending=False).positions.tolist()[:2] == [4, 3]
+
+
+def test_result_query_pages_and_nonempty_columns():
+    query = ResultQuery(combined()).isin("ブランド", ["BrandY"])
+    assert query.page(1, 1, ["商品管理番号"])["商品管理番号"].astype(str).tolist() == ["P300"]
+    assert query.frame(["商品名"])["商品名"].tolist() == ["シャツ", "シャツ"]
+    assert query.nonempty_columns(["肩幅", "日付", "存在しない列"]) == ["肩幅", "日付"]
+    assert ResultQuery(combined()).isin("ブランド", ["BrandX"]).keyword("コート").nonempty_columns(["肩幅"]) == ["肩幅"]
@@ -0,0 +1,35 @@
+# ━━━━━ SheetsClient：起動後に追加されたシートのハンドル ━━━━━
+from benchmarks.fake_gspread import FakeWorksheet
+from conftest import sheet_rows
+
+
+def add_by_hand(spreadsheet, title, rows):
+    """画面や他のプロセスからシートが追加された"""
+    spreadsheet.sheets[title] = FakeWorksheet(spreadsheet, title, len(spreadsheet.sheets) + 1, rows)
+
+
+def test_sheet_added_after_startup_is_found(sheets_store):
+    store, spreadsheet = sheets_store({"採寸結果": [["日付"]]})
+    add_by_hand(spreadsheet, "許容差", [["ジャンル", "採寸項目", "許容差"], ["", "", "0.5"]])
+    store.sheets.handles_at = 0  # 前回の取り直しから時間がたった
+
+    assert store.has("許容差")
+    assert store.read("許容差").values.tolist() == [["", "", "0.5"]]
+
+
+def test_missing_sheet_is_not_reloaded_on_every_call(sheets_store):
+    store, spreadsheet = sheets_store({"採寸結果": [["日付"]]})
+    spreadsheet.reset_counters()
+    for _ in range(3):
+        assert not store.has("許容差")
+    assert spreadsheet.calls["worksheets"] == 0  # 起動直後に取ったハンドルを使う
+
+
+def test_ensure_does_not_recreate_sheet_added_elsewhere(sheets_store):
+    store, spreadsheet = sheets_store({"採寸結果": [["日付"]]})
+    add_by_hand(spreadsheet, "採寸アーカイブ_2026-09", [["日付", "商品管理番号"], ["2026-09-01", "P1"]])
+
+    store.append("採寸アーカイブ_2026-09", [{"日付": "2026-09-02", "商品管理番号": "P2"}])
+
+    assert spreadsheet.calls["add_worksheet"] == 0
+    assert sheet_rows(spreadsheet, "採寸アーカイブ_2026-09") == [["2026-09-01", "P1"], ["2026-09-02", "P2"]]
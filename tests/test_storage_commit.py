@@ -0,0 +1,94 @@
+# ━━━━━ GoogleSheetsStorage._commit：キーで探した行番号での削除・上書き ━━━━━
+import threading
+
+from conftest import sheet_rows
+
+MASTER = [
+    ["管理番号", "サイズ", "カラー"],
+    ["P1", "S", "黒"],
+    ["P1", "M", "黒"],
+    ["P2", "S", "白"],
+    ["P3", "S", "赤"],
+    ["P3", "M", "赤"],
+    ["P4", "1", "青"],
+]
+
+
+def test_delete_removes_only_matching_rows(sheets_store):
+    store, spreadsheet = sheets_store({"商品マスタ": MASTER})
+    store.read("商品マスタ")
+    spreadsheet.reset_counters()
+
+    store.delete("商品マスタ", ["管理番号", "サイズ"], [("P1", "M"), ("P3", "S"), ("P3", "M"), ("P9", "S")])
+
+    assert sheet_rows(spreadsheet, "商品マスタ") == [["P1", "S", "黒"], ["P2", "S", "白"], ["P4", "1", "青"]]
+    # キー列の取得 1 回＋batchUpdate 1 回（＋書き込み後のミラーの差分確認）
+    assert spreadsheet.calls["batch_update"] == 1
+    assert store.read("商品マスタ").values.tolist() == sheet_rows(spreadsheet, "商品マスタ")
+
+
+def test_delete_matches_numeric_keys_as_text(sheets_store):
+    store, spreadsheet = sheets_store({"商品マスタ": MASTER})
+    store.delete("商品マスタ", ["管理番号", "サイズ"], [("P4", 1.0)])
+    assert [r[0] for r in sheet_rows(spreadsheet, "商品マスタ")] == ["P1", "P1", "P2", "P3", "P3"]
+
+
+def test_deletes_in_one_batch_use_pre_delete_row_numbers(sheets_store):
+    store, spreadsheet = sheets_store({"商品マスタ": MASTER})
+    with store.batch():
+        store.delete("商品マスタ", ["管理番号", "サイズ"], [("P1", "S")])
+        store.delete("商品マスタ", ["管理番号", "サイズ"], [("P3", "M")])
+        store.append("商品マスタ", [{"管理番号": "P5", "サイズ": "S", "カラー": "緑"}])
+
+    assert sheet_rows(spreadsheet, "商品マスタ") == [
+        ["P1", "M", "黒"], ["P2", "S", "白"], ["P3", "S", "赤"], ["P4", "1", "青"], ["P5", "S", "緑"],
+    ]
+    assert spreadsheet.calls["batch_update"] == 1
+    assert store.read("商品マスタ").values.tolist() == sheet_rows(spreadsheet, "商品マスタ")
+
+
+def test_delete_refetches_key_columns_when_header_moved(sheets_store):
+    store, spreadsheet = sheets_store({"商品マスタ": MASTER})
+    store.read("商品マスタ")
+    # ミラーが知らないうちに列が入れ替わった（キー列の位置がずれた）
+    spreadsheet.sheets["商品マスタ"].rows = [[r[2], r[0], r[1]] for r in MASTER]
+
+    store.delete("商品マスタ", ["管理番号", "サイズ"], [("P2", "S")])
+
+    assert [r[1:] for r in sheet_rows(spreadsheet, "商品マスタ")] == [
+        ["P1", "S"], ["P1", "M"], ["P3", "S"], ["P3", "M"], ["P4", "1"],
+    ]
+
+
+def test_patch_writes_only_changed_cells(sheets_store):
+    store, spreadsheet = sheets_store({"商品マスタ": MASTER})
+    store.read("商品マスタ")
+    store.patch("商品マスタ", ["管理番号", "サイズ"], [{"管理番号": "P2", "サイズ": "S", "カラー": "紺"}])
+
+    assert sheet_rows(spreadsheet, "商品マスタ")[2] == ["P2", "S", "紺"]
+    assert store.read("商品マスタ").values.tolist() == sheet_rows(spreadsheet, "商品マスタ")
+
+
+def test_overlapping_commits_do_not_delete_shifted_rows(sheets_store):
+    """行番号を読んだ後・batchUpdate の前に別の書き込みが行をずらしても、違う行を消さない"""
+    master = [["管理番号", "サイズ"]] + [[f"P{i}", "S"] for i in range(1, 8)]
+    store, spreadsheet = sheets_store({"商品マスタ": master})
+    store.read("商品マスタ")
+
+    sheets = store.sheets
+    original = sheets.values_batch_get
+    other = threading.Thread(target=store.delete, args=("商品マスタ", ["管理番号", "サイズ"], [("P1", "S")]))
+
+    def read_then_interleave(*args, **kwargs):
+        result = original(*args, **kwargs)
+        if other.ident is None:
+            other.start()  # 行番号を読んだ直後に、前の行を消す書き込みが割り込む
+            other.join(0.5)
+        return result
+
+    sheets.values_batch_get = read_then_interleave
+    store.delete("商品マスタ", ["管理番号", "サイズ"], [("P5", "S")])
+    other.join()
+
+    assert [r[0] for r in sheet_rows(spreadsheet, "商品マスタ")] == ["P2", "P3", "P4", "P6", "P7"]
+    assert store.read("商品マスタ").values.tolist() == sheet_rows(spreadsheet, "商品マスタ")
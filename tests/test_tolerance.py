@@ -0,0 +1,79 @@
+# ━━━━━ 基準値との差（許容差の表と DeviationCache の継ぎ足し） ━━━━━
+import numpy as np
+import pandas as pd
+
+import tolerance
+from normalize import normalize
+from search import MeasurementDataset
+from tolerance import DEFAULT_TOLERANCE, DeviationCache, tolerance_matrix
+
+ITEMS = ["肩幅", "着丈", "袖丈"]
+
+
+def test_tolerance_matrix_prefers_specific_rows():
+    tolerances = pd.DataFrame([
+        ["トップス", "肩幅", "0.3"],  # ジャンル＋項目
+        ["", "", "2"],              # 全体
+        ["トップス", "", "1.5"],     # ジャンルの全項目
+        ["", "着丈", "0.8"],         # 全ジャンルの項目
+        ["パンツ", "袖丈", "不明"],   # 数値でない行は無視
+    ], columns=["ジャンル", "採寸項目", "許容差"])
+    genres, table = tolerance_matrix(tolerances, ITEMS)
+    assert genres == ["トップス"]
+    np.testing.assert_allclose(table, [[0.3, 1.5, 1.5], [2, 0.8, 2]])  # 最後の行は指定のないジャンル
+
+
+def test_tolerance_matrix_defaults_without_sheet():
+    genres, table = tolerance_matrix(pd.DataFrame(), ITEMS)
+    assert genres == [] and table.shape == (1, 3) and (table == DEFAULT_TOLERANCE).all()
+
+
+RESULTS = [["日付", "商品管理番号", "サイズ", "ジャンル", "肩幅", "着丈"],
+           ["2026-10-01", "P1", "S", "トップス", "40.5", "60"],   # 肩幅 +0.5
+           ["2026-10-01", "P1", "M", "トップス", "42", "63"],     # 着丈 +2
+           ["2026-10-02", "P9", "S", "トップス", "99", "99"]]     # 基準データにない
+STANDARDS = [["商品管理番号", "サイズ", "肩幅", "着丈"], ["P1", "S", "40", "60"], ["P1", "M", "42", "61"]]
+
+
+def stored(store, title, rows):
+    store.ensure(title, rows[0])
+    store.append(title, [dict(zip(rows[0], r)) for r in rows[1:]])
+
+
+def current(store):
+    return MeasurementDataset([("採寸結果", normalize(store.read("採寸結果")))])
+
+
+def report_of(report):
+    return report.positions.tolist(), report.over.tolist(), report.checked
+
+
+def test_deviation_cache_computes_only_appended_rows(sqlite_store, monkeypatch):
+    stored(sqlite_store, "採寸結果", RESULTS)
+    stored(sqlite_store, "基準データ", STANDARDS)
+    stored(sqlite_store, "許容差", [["ジャンル", "採寸項目", "許容差"], ["", "肩幅", "0.3"]])
+    cache = DeviationCache(sqlite_store)
+    report = cache.get(current(sqlite_store))
+    assert report.items == ["肩幅", "着丈"]
+    assert report_of(report) == ([0, 1], [[True, False], [False, True]], 2)
+
+    computed = []  # compute_deviations に渡った行数
+    compute = tolerance.compute_deviations
+
+    def counting(frame, *args):
+        computed.append(len(frame))
+        return compute(frame, *args)
+
+    monkeypatch.setattr(tolerance, "compute_deviations", counting)
+    sqlite_store.append("採寸結果", [{"日付": "2026-10-03", "商品管理番号": "P1", "サイズ": "S", "ジャンル": "トップス",
+                                  "肩幅": "41", "着丈": "60"}])
+    dataset = current(sqlite_store)
+    report = cache.get(dataset)
+    assert computed == [1]
+    assert report_of(report) == report_of(DeviationCache(sqlite_store).get(dataset)) == (
+        [0, 1, 3], [[True, False], [False, True], [True, False]], 3)
+
+    sqlite_store.replace("許容差", [{"ジャンル": "", "採寸項目": "", "許容差": "5"}])  # 許容差が変われば全体を計算し直す
+    computed.clear()
+    assert report_of(cache.get(current(sqlite_store))) == ([], [], 3)
+    assert computed == [4]
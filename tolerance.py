@@ -0,0 +1,207 @@
+# ━━━━━ 基準値との差（許容差チェック） ━━━━━
+# 採寸結果＋採寸アーカイブの全行を 基準データ と (商品管理番号, サイズ) で突き合わせ、
+# 採寸項目ごとの差（採寸値 − 基準値）を 行×項目 の配列で一度に計算する。
+# 許容差はシート「許容差」（ジャンル・採寸項目・許容差）で決め、指定のないものは DEFAULT_TOLERANCE。
+#   - ジャンルが空の行は全ジャンル、採寸項目が空の行はそのジャンルの全項目に効く（より細かい指定が優先）
+# 結果はシートごとに許容差を超えた行だけを持つ。前回からシートの末尾に行が追加されただけなら、
+# 追加された行だけを計算して継ぎ足す（DeviationCache）。基準データ・許容差が変わったら全体を計算し直す。
+import threading
+
+import numpy as np
+import pandas as pd
+
+from normalize import widened
+
+STANDARDS = "基準データ"
+TOLERANCES = "許容差"
+TOLERANCE_COLUMNS = ["ジャンル", "採寸項目", "許容差"]
+DEFAULT_TOLERANCE = 1.0  # cm
+KEY_COLS = ["商品管理番号", "サイズ"]
+CHUNK_ROWS = 100000  # 一度に 行×項目 の配列にする行数（ピークメモリを抑える）
+REPORT_COLS = ["日付", "商品管理番号", "ブランド", "ジャンル", "商品名", "カラー", "サイズ"]
+
+
+def measurement_items(frame, standards):
+    """採寸値（float32）の列のうち基準データにもある列"""
+    return [c for c in frame.columns
+            if frame[c].dtype == np.float32 and c in standards.columns and c not in KEY_COLS]
+
+
+def standard_matrix(standards, items):
+    """基準データの (商品管理番号, サイズ) の索引と 行×項目 の基準値（同じキーは後の行）"""
+    if standards.empty or not set(KEY_COLS).issubset(standards.columns):
+        return pd.MultiIndex.from_arrays([[], []], names=KEY_COLS), np.empty((0, len(items)), dtype="float32")
+    keys = pd.MultiIndex.from_arrays([standards[c].astype(str).to_numpy() for c in KEY_COLS], names=KEY_COLS)
+    last = ~keys.duplicated(keep="last")
+    values = np.column_stack(
+        [pd.to_numeric(standards[c], errors="coerce").to_numpy(dtype="float32") for c in items]
+    ) if items else np.empty((len(standards), 0), dtype="float32")
+    return keys[last], values[last]
+
+
+def tolerance_matrix(tolerances, items):
+    """
+    (ジャンル一覧, (ジャンル数 + 1)×項目 の許容差)。最後の行は指定のないジャンル用。
+    広い指定（ジャンル空・項目空）から順に上書きする。
+    """
+    rows = []
+    if not tolerances.empty and set(TOLERANCE_COLUMNS).issubset(tolerances.columns):
+        values = pd.to_numeric(tolerances["許容差"], errors="coerce")
+        for genre, item, value in zip(tolerances["ジャンル"].astype(str).str.strip(),
+                                      tolerances["採寸項目"].astype(str).str.strip(), values):
+            if value == value:
+                rows.append((genre, item, float(value)))
+    genres = list(dict.fromkeys(g for g, _, _ in rows if g))
+    table = np.full((len(genres) + 1, len(items)), DEFAULT_TOLERANCE, dtype="float32")
+    columns = {c: j for j, c in enumerate(items)}
+    for wide_genre, wide_item in [(True, True), (True, False), (False, True), (False, False)]:
+        for genre, item, value in rows:
+            if (genre == "") != wide_genre or (item == "") != wide_item:
+                continue
+            target = slice(None) if wide_genre else genres.index(genre)
+            if wide_item:
+                table[target, :] = value
+            elif item in columns:
+                table[target, columns[item]] = value
+    return genres, table
+
+
+class Deviations:
+    """1 つのシート分の計算結果。許容差を超えた行だけを持つ"""
+
+    def __init__(self, positions, deviation, over, checked):
+        self.positions = positions  # シート内の行位置
+        self.deviation = deviation  # 行×項目 の差（採寸値 − 基準値、比べられない項目は NaN）
+        self.over = over            # 行×項目 の許容差超え
+        self.checked = checked      # 基準値と比べられた行数
+
+    def appended(self, other, offset):
+        return Deviations(
+            np.concatenate([self.positions, other.positions + offset]),
+            np.concatenate([self.deviation, other.deviation]),
+            np.concatenate([self.over, other.over]),
+            self.checked + other.checked,
+        )
+
+
+def empty_deviations(n_items):
+    return Deviations(np.empty(0, dtype=np.int64), np.empty((0, n_items), dtype="float32"),
+                      np.empty((0, n_items), dtype=bool), 0)
+
+
+def compute_deviations(frame, items, standard_keys, standard_values, genres, tolerance_table):
+    """frame（型付きの採寸データ）の全行の差をまとめて計算する"""
+    keys = pd.MultiIndex.from_arrays([frame[c] for c in KEY_COLS]) if set(KEY_COLS).issubset(frame.columns) else None
+    found = standard_keys.get_indexer(keys) if keys is not None and len(standard_keys) else np.full(len(frame), -1)
+    rows = np.flatnonzero(found >= 0)
+    measured = frame[items].iloc[rows].to_numpy(dtype="float32") if items else np.empty((len(rows), 0), "float32")
+    deviation = measured - standard_values[found[rows]]
+    genre = frame["ジャンル"].iloc[rows] if "ジャンル" in frame.columns else pd.Series([""] * len(rows))
+    codes = pd.Index(genres, dtype=object).get_indexer(genre.astype(object))  # -1 は最後の行（指定なし）
+    over = np.abs(deviation) > tolerance_table[codes]  # NaN との比較は False
+    hit = over.any(axis=1)
+    checked = int((~np.isnan(deviation)).any(axis=1).sum())
+    return Deviations(rows[hit], deviation[hit], over[hit], checked)
+
+
+class DeviationReport:
+    """データセット全体の許容差チェックの結果（positions は dataset.frame の行位置）"""
+
+    def __init__(self, dataset, items, positions, deviation, over, checked, versions=None):
+        self.dataset = dataset
+        self.versions = versions  # (dataset.versions, 基準データ・許容差のバージョンと採寸項目)
+        self.items = items
+        self.positions = positions
+        self.deviation = deviation
+        self.over = over
+        self.checked = checked
+
+    def __len__(self):
+        return len(self.positions)
+
+    def where(self, mask):
+        """frame と同じ長さの真偽配列で絞る"""
+        keep = np.asarray(mask, dtype=bool)[self.positions]
+        checked = self.checked if keep.all() else None  # 絞ったときの比較行数は数えない
+        return DeviationReport(self.dataset, self.items, self.positions[keep], self.deviation[keep],
+                               self.over[keep], checked, self.versions)
+
+    def summary(self):
+        """ジャンル×採寸項目ごとの許容差超えの件数"""
+        genre = self.dataset.frame["ジャンル"].iloc[self.positions].astype(object).to_numpy()
+        counts = pd.DataFrame(self.over, columns=self.items).groupby(genre).sum()
+        counts = counts.loc[:, counts.any(axis=0)]
+        summary = counts.stack().rename("件数").reset_index()
+        summary.columns = ["ジャンル", "採寸項目", "件数"]
+        return summary[summary["件数"] > 0].sort_values("件数", ascending=False, ignore_index=True)
+
+    def frame(self):
+        """超えた行の一覧（商品の列＋超えた項目＋項目ごとの差。差は許容差を超えた項目だけ）"""
+        base = self.dataset.frame.iloc[self.positions]
+        base = base[[c for c in REPORT_COLS if c in base.columns]].reset_index(drop=True)
+        items = [c for j, c in enumerate(self.items) if self.over[:, j].any()]
+        names = np.array(self.items, dtype=object)
+        base["超過項目"] = [", ".join(names[row]) for row in self.over]
+        excess = np.where(self.over, np.abs(self.deviation), np.nan)
+        base["最大の差"] = np.round(np.nanmax(excess, axis=1), 2) if len(base) else np.empty(0, dtype="float32")
+        shown = np.where(self.over, self.deviation, np.nan)
+        for c in items:
+            base[c] = np.round(shown[:, self.items.index(c)], 2)
+        return widened(base)
+
+
+class DeviationCache:
+    """
+    シートごとの Deviations（プロセスで 1 つ）。キーは 基準データ・許容差のバージョンと採寸項目。
+    シートのバージョンが変わっても末尾への追加だけなら、追加された行だけ計算する。
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.entries = {}  # シート名 → (キー, シートのバージョン, 行数, Deviations)
+        self.prepared = (None, None)  # (キー, 基準値・許容差の配列)
+        self.lock = threading.Lock()
+
+    def get(self, dataset):
+        texts = self.store.read_many([STANDARDS, TOLERANCES])
+        items = measurement_items(dataset.frame, texts[STANDARDS])
+        key = (self.store.version(STANDARDS), self.store.version(TOLERANCES), tuple(items))
+        parts = []
+        for title, offset, length in dataset.sources:
+            version = self.store.version(title)
+            with self.lock:
+                cached = self.entries.get(title)
+            start, result = 0, empty_deviations(len(items))
+            if cached and cached[0] == key:
+                if cached[1] == version and cached[2] == length:
+                    start, result = length, cached[3]
+                elif cached[2] <= length and self.store.appended_since(title, cached[1]) == cached[2]:
+                    start, result = cached[2], cached[3]
+            if start < length:
+                prepared = self._prepare(key, texts, items)
+                for begin in range(start, length, CHUNK_ROWS):
+                    end = min(begin + CHUNK_ROWS, length)
+                    rows = compute_deviations(dataset.frame.iloc[offset + begin:offset + end], items, *prepared)
+                    result = result.appended(rows, begin)
+            with self.lock:
+                self.entries[title] = (key, version, length, result)
+            parts.append((offset, result))
+        parts = parts or [(0, empty_deviations(len(items)))]
+        return DeviationReport(
+            dataset, items,
+            np.concatenate([r.positions + offset for offset, r in parts]).astype(np.int64),
+            np.concatenate([r.deviation for _, r in parts]),
+            np.concatenate([r.over for _, r in parts]),
+            sum(r.checked for _, r in parts),
+            (dataset.versions, key),
+        )
+
+    def _prepare(self, key, texts, items):
+        """基準値の索引・配列と許容差の表（基準データ・許容差が変わるまで使い回す）"""
+        with self.lock:
+            cached_key, prepared = self.prepared
+        if cached_key != key:
+            prepared = standard_matrix(texts[STANDARDS], items) + tolerance_matrix(texts[TOLERANCES], items)
+            with self.lock:
+                self.prepared = (key, prepared)
+        return prepared